@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Headless benchmarks of the image processing and analysis hot paths.
+
+Run with
+    python -m frheed.bench [--output results.json] [--baseline baseline.json]
+
+Results are written as JSON. If a baseline (the output of an earlier run)
+is given, benchmarks that became slower than the tolerance are reported and
+the exit status is 1, so the suite can be used to catch regressions.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import platform
+import json
+import time
+import sys
+
+import numpy as np
+
+from frheed.image_processing import (
+    normalize, apply_cmap, to_grayscale, extend_image, column_to_image,
+    )
+from frheed.roi import get_region_mask, RegionAnalyzer
+from frheed.calcs import calc_fft, detect_peaks
+from frheed.cameras.simulated import SimulatedCamera
+from frheed.utils import sample_array
+
+
+# Frame sizes (width, height) that the image benchmarks run at
+RESOLUTIONS = ((640, 480), (1440, 1080), (2048, 1536))
+
+# Bit depths of the synthetic RHEED frames (12-bit frames are stored as uint16)
+BIT_DEPTHS = (8, 12)
+
+# Numbers of samples in the time series that the FFT benchmarks run on
+SERIES_LENGTHS = (1_000, 10_000, 100_000)
+
+# Width (columns) of the line scan image that extend_image appends to
+LINE_SCAN_WIDTH = 1_000
+
+# Minimum time (s) spent on each benchmark, and minimum number of runs
+MIN_TIME = 0.2
+MIN_RUNS = 5
+
+# Fraction by which a benchmark may be slower than the baseline
+DEFAULT_TOLERANCE = 0.2
+
+# Colormap used by the apply_cmap benchmark
+_CMAP = "Spectral"
+
+
+def timeit(func: Callable[[], object], min_time: float = MIN_TIME, min_runs: int = MIN_RUNS) -> Dict[str, float]:
+    """
+    Time a function until at least min_time has passed and it has run at
+    least min_runs times (after one warm-up call).
+
+    Returns
+    -------
+    dict
+        Number of runs and the median and minimum time per run in ms.
+    """
+    func()
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_runs or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    times = np.array(times) * 1e3
+    return {"runs": len(times), "median_ms": float(np.median(times)), "min_ms": float(times.min())}
+
+
+def rheed_frame(width: int, height: int, bit_depth: int = 8) -> np.ndarray:
+    """ Synthetic RHEED frame from the SimulatedCamera. """
+    with SimulatedCamera(width=width, height=height, bit_depth=bit_depth, fps=None, seed=0) as cam:
+        return cam.get_array()
+
+
+def rheed_series(length: int, fps: float = 30., period: float = 4.) -> Tuple[np.ndarray, np.ndarray]:
+    """ Synthetic specular spot intensity oscillation with noise. """
+    t = np.arange(length) / fps
+    rng = np.random.default_rng(0)
+    y = 100 * (1 - 0.3 * np.cos(2 * np.pi * t / period)) + rng.normal(0, 2, length)
+    return t, y
+
+
+def _image_cases(width: int, height: int, bit_depth: int) -> Dict[str, Callable[[], object]]:
+    """ Benchmarks that run on a (width x height) frame. """
+    frame = rheed_frame(width, height, bit_depth)
+    color = sample_array(width, height, channels=3)
+    normalized = normalize(frame)
+    out = np.empty(frame.shape, dtype=np.uint8)
+    cmap_out = np.empty(frame.shape + (3,), dtype=np.uint8)
+
+    # Regions like the ones drawn on a RHEED pattern: a box around the
+    # specular spot, an ellipse on a streak, a large background box and a
+    # vertical line profile through the spot
+    cx, cy = width // 2, height // 3
+    r = max(width // 40, 2)
+    masks = [
+        get_region_mask("rectangle", (cx - r, cy - r, cx + r, cy + r), frame.shape),
+        get_region_mask("ellipse", (cx + width // 7 - r, cy - 3 * r, cx + width // 7 + r, cy + 3 * r), frame.shape),
+        get_region_mask("rectangle", (0, 0, width // 2, height // 2), frame.shape),
+        ]
+    line = get_region_mask("line", (cx, 0, cx, height - 1), frame.shape)
+    analyzer = RegionAnalyzer()
+    image = np.repeat(column_to_image(line.extract(normalized)), LINE_SCAN_WIDTH, axis=1)
+    column = line.extract(normalized)
+
+    cases = {
+        "normalize": lambda: normalize(frame, out),
+        "normalize_percentiles": lambda: normalize(frame, out, percentiles=(1, 99)),
+        "apply_cmap": lambda: apply_cmap(frame, _CMAP, out=cmap_out),
+        "roi_extract": lambda: [mask.extract(frame) for mask in masks],
+        "roi_analyze": lambda: analyzer.analyze(frame, masks, extrema=False),
+        "line_profile": lambda: line.extract(frame),
+        "extend_image": lambda: extend_image(image, column),
+        }
+
+    # uint8 frames are returned unchanged by normalize (unless percentiles
+    # are given), so only deeper frames are scaled
+    if frame.dtype == np.uint8:
+        del cases["normalize"]
+
+    # Color conversion only applies to the 3-channel sample frames
+    if bit_depth == 8:
+        cases["to_grayscale"] = lambda: to_grayscale(color)
+    return cases
+
+
+def _series_cases(length: int) -> Dict[str, Callable[[], object]]:
+    """ Benchmarks that run on a time series with 'length' samples. """
+    t, y = rheed_series(length)
+    freq, psd = calc_fft(t, y)
+    return {
+        "calc_fft": lambda: calc_fft(t, y),
+        "detect_peaks": lambda: detect_peaks(freq, psd),
+        }
+
+
+def run(
+        resolutions: Tuple[Tuple[int, int], ...] = RESOLUTIONS,
+        bit_depths: Tuple[int, ...] = BIT_DEPTHS,
+        lengths: Tuple[int, ...] = SERIES_LENGTHS,
+        select: Optional[str] = None,
+        min_time: float = MIN_TIME,
+        verbose: bool = True
+        ) -> dict:
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    resolutions : Tuple[Tuple[int, int], ...], optional
+        Frame sizes (width, height). The default is RESOLUTIONS.
+    bit_depths : Tuple[int, ...], optional
+        Bit depths of the frames. The default is BIT_DEPTHS.
+    lengths : Tuple[int, ...], optional
+        Time series lengths. The default is SERIES_LENGTHS.
+    select : Optional[str], optional
+        Only run benchmarks whose name contains this string. The default
+        of None runs all benchmarks.
+    min_time : float, optional
+        Minimum time (s) spent on each benchmark. The default is 0.2.
+    verbose : bool, optional
+        Print every result. The default is True.
+
+    Returns
+    -------
+    dict
+        The system information and a list of results, where each result has
+        a unique "key" made of the benchmark name and its parameters.
+
+    """
+    results = []
+
+    def measure(name: str, func: Callable[[], object], **params) -> None:
+        if select is not None and select not in name:
+            return
+        key = "/".join([name] + [str(v) for v in params.values()])
+        result = {"key": key, "name": name, **params, **timeit(func, min_time)}
+        results.append(result)
+        if verbose:
+            print(f"{key:<40} {result['median_ms']:10.3f} ms  (min {result['min_ms']:.3f} ms)")
+
+    for width, height in resolutions:
+        for bit_depth in bit_depths:
+            for name, func in _image_cases(width, height, bit_depth).items():
+                measure(name, func, shape=f"{width}x{height}", bit_depth=bit_depth)
+    for length in lengths:
+        for name, func in _series_cases(length).items():
+            measure(name, func, length=length)
+
+    return {
+        "system": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+        "results": results,
+        }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[dict]:
+    """
+    Compare results to a baseline run.
+
+    Returns
+    -------
+    List[dict]
+        The benchmarks whose median time exceeds the baseline by more than
+        the tolerance, with the baseline time and the ratio.
+    """
+    previous = {r["key"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results["results"]:
+        old = previous.get(result["key"])
+        if old is None or old["median_ms"] <= 0:
+            continue
+        ratio = result["median_ms"] / old["median_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append({**result, "baseline_ms": old["median_ms"], "ratio": ratio})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m frheed.bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", help="save the results to this .json file")
+    parser.add_argument("-b", "--baseline", help="compare to the results in this .json file")
+    parser.add_argument("-t", "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown relative to the baseline (default %(default)s)")
+    parser.add_argument("-k", "--select", help="only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true",
+                        help="only run the smallest frame size and series length")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help="minimum time (s) per benchmark (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    resolutions, lengths = RESOLUTIONS, SERIES_LENGTHS
+    if args.quick:
+        resolutions, lengths = resolutions[:1], lengths[:1]
+    results = run(resolutions, BIT_DEPTHS, lengths, args.select, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent="\t")
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['key']}: {r['median_ms']:.3f} ms "
+                  f"vs {r['baseline_ms']:.3f} ms ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+"""
+Array buffers for frames and data that are produced during an acquisition.
+"""
+
+from typing import Union, Optional, Tuple, List
+from multiprocessing import shared_memory
+import threading
+import time
+
+import numpy as np
+
+
+# Number of columns allocated when a buffer is first created
+_INITIAL_CAPACITY = 256
+
+# Number of frames held by a FrameRing by default
+_DEFAULT_SLOTS = 16
+
+
+class LineScanBuffer:
+    """
+    A 2D line scan image (kymograph) that grows by one column at a time.
+
+    Columns are stored as rows of a preallocated (capacity x height) array
+    whose capacity doubles when it fills up, so appending a column is O(1)
+    amortized instead of copying the entire image on every frame as
+    np.append does. The image is exposed as a zero-copy view of the filled
+    columns with shape (height, width), where the first element of each
+    column is at the bottom of the image (same as column_to_image).
+
+    Benchmark results (height = 512, uint8, see __main__ block):
+        LineScanBuffer.append:  ~1 µs per column, flat up to 100,000 columns
+        extend_image:           grows linearly with width (~380 µs at 10,000 columns)
+
+    """
+
+    def __init__(
+            self,
+            height: Optional[int] = None,
+            dtype: Union[str, np.dtype, None] = None,
+            capacity: int = _INITIAL_CAPACITY
+            ):
+        """
+        Parameters
+        ----------
+        height : Optional[int], optional
+            Number of pixels in each column. If the default of None is used,
+            the height is taken from the first appended column.
+        dtype : Union[str, np.dtype, None], optional
+            Data type of the image. If the default of None is used, the
+            data type is taken from the first appended column.
+        capacity : int, optional
+            Number of columns to preallocate. The default is 256.
+        """
+        self._dtype = np.dtype(dtype) if dtype is not None else None
+        self._capacity = max(int(capacity), 1)
+        self._width = 0
+        self._data: Optional[np.ndarray] = None
+        if height is not None and dtype is not None:
+            self._allocate(height, self._capacity)
+
+    def __len__(self) -> int:
+        return self._width
+
+    @property
+    def width(self) -> int:
+        """ Number of columns that have been appended. """
+        return self._width
+
+    @property
+    def height(self) -> int:
+        """ Number of pixels in each column (0 if no columns allocated). """
+        return 0 if self._data is None else self._data.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        """ Number of columns that fit before the buffer has to grow. """
+        return self._capacity
+
+    @property
+    def dtype(self) -> Union[np.dtype, None]:
+        return self._dtype
+
+    @property
+    def nbytes(self) -> int:
+        """ Number of bytes currently allocated. """
+        return 0 if self._data is None else self._data.nbytes
+
+    @property
+    def image(self) -> Union[np.ndarray, None]:
+        """
+        Zero-copy (height x width) view of the filled columns,
+        or None if nothing has been appended yet.
+        """
+        if self._data is None or self._width == 0:
+            return None
+
+        # Reverse the columns so the first pixel is in the bottom left
+        # https://stackoverflow.com/a/44772452/10342097
+        return self._data[:self._width, ::-1].T
+
+    @property
+    def columns(self) -> np.ndarray:
+        """ Zero-copy (width x height) view of the columns in the order appended. """
+        if self._data is None:
+            return np.empty((0, 0), dtype=self._dtype)
+        return self._data[:self._width]
+
+    @property
+    def last_column(self) -> Union[np.ndarray, None]:
+        """ View of the most recently appended column (in original order). """
+        if self._width == 0:
+            return None
+        return self._data[self._width - 1]
+
+    def append(self, column: Union[np.ndarray, list]) -> bool:
+        """
+        Append a column onto the right side of the image. If the column
+        height does not match the image height (e.g. a line region was 
+        resized), the image is restarted from the new column.
+
+        Returns
+        -------
+        bool
+            True if the image was restarted, so the new column is the only
+            one left.
+
+        """
+        column = np.asarray(column).ravel()
+
+        # Restart the image if the height has changed
+        restarted = column.size != self.height
+        if restarted:
+            self._dtype = self._dtype or column.dtype
+            self._allocate(column.size, self._capacity)
+
+        # Double the capacity when the buffer is full
+        elif self._width == self._capacity:
+            self._grow(2 * self._capacity)
+
+        # Store the column
+        self._data[self._width] = column
+        self._width += 1
+        return restarted
+
+    def clear(self) -> None:
+        """ Remove all columns but keep the allocated memory. """
+        self._width = 0
+
+    def trim(self, keep: int) -> None:
+        """ Discard the oldest columns so that at most 'keep' remain. """
+        drop = self._width - max(int(keep), 0)
+        if drop <= 0:
+            return
+        
+        # Copy into a new array so views handed out earlier are not modified
+        data = np.empty_like(self._data)
+        data[:self._width - drop] = self._data[drop:self._width]
+        self._data = data
+        self._width -= drop
+
+    def _allocate(self, height: int, capacity: int) -> None:
+        self._data = np.empty((capacity, height), dtype=self._dtype)
+        self._capacity = capacity
+        self._width = 0
+
+    def _grow(self, capacity: int) -> None:
+        # NOTE: The previous array is not modified, so views handed out by
+        # 'image' before growing remain valid
+        data = np.empty((capacity, self.height), dtype=self._dtype)
+        data[:self._width] = self._data[:self._width]
+        self._data = data
+        self._capacity = capacity
+
+
+class LatestFrameBuffer:
+    """
+    Holds only the most recent frame (or frame sequence number) from a 
+    producer thread.
+    
+    A consumer that is slower than the producer (e.g. the display) always 
+    takes the newest frame, and frames that were replaced before being 
+    taken are counted as dropped instead of queueing up.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame: object = None
+        self._count = 0
+        self._taken_count = 0
+        self._taken = 0
+        self._dropped = 0
+        
+    @property
+    def count(self) -> int:
+        """ Number of frames that have been put into the buffer. """
+        return self._count
+    
+    @property
+    def taken(self) -> int:
+        """ Number of frames that have been taken from the buffer. """
+        return self._taken
+    
+    @property
+    def dropped(self) -> int:
+        """ Number of frames that were replaced before they were taken. """
+        return self._dropped
+        
+    def put(self, frame: object) -> None:
+        """ Replace the current frame with a newer one. """
+        with self._lock:
+            self._frame = frame
+            self._count += 1
+            
+    def take(self) -> object:
+        """ Get the newest frame, or None if there is no new frame. """
+        with self._lock:
+            if self._count == self._taken_count:
+                return None
+            self._dropped += self._count - self._taken_count - 1
+            self._taken_count = self._count
+            self._taken += 1
+            return self._frame
+        
+    def clear(self) -> None:
+        """ Remove the current frame and reset the counters. """
+        with self._lock:
+            self._frame = None
+            self._count = self._taken_count = self._taken = self._dropped = 0
+
+
+class FrameRing:
+    """
+    A fixed number of preallocated frame slots that are reused in order.
+    
+    The producer (camera) writes each frame into the next slot, ideally in 
+    place (see claim), and commits it with a timestamp to get its sequence 
+    number. Consumers read frames by sequence number as zero-copy views. A 
+    frame stays available until it is overwritten num_slots frames later,
+    so memory is bounded and no array is allocated per frame. A slot is 
+    invalidated before it is written and its new sequence number is only 
+    published afterwards (like a seqlock), so consumers that may fall 
+    behind can use is_valid() after reading a frame to check that it was 
+    not overwritten, even partially, while they were reading it.
+    """
+    
+    def __init__(self, num_slots: int = _DEFAULT_SLOTS):
+        """
+        Parameters
+        ----------
+        num_slots : int, optional
+            Number of frames to keep. The default is 16.
+        """
+        self._num_slots = max(int(num_slots), 2)
+        self._data: Optional[np.ndarray] = None
+        self._times = np.zeros(self._num_slots, dtype=np.float64)
+        self._seqs = np.zeros(self._num_slots, dtype=np.int64)
+        self._latest = 0
+        self._first = 1
+        
+    def __len__(self) -> int:
+        """ Number of frames that can currently be read. """
+        return self._latest - self.oldest + 1 if self._latest >= self._first else 0
+        
+    @property
+    def num_slots(self) -> int:
+        return self._num_slots
+    
+    @property
+    def shape(self) -> Union[Tuple[int, ...], None]:
+        """ Shape of each frame, or None if nothing has been written yet. """
+        return None if self._data is None else self._data.shape[1:]
+    
+    @property
+    def dtype(self) -> Union[np.dtype, None]:
+        return None if self._data is None else self._data.dtype
+    
+    @property
+    def nbytes(self) -> int:
+        """ Number of bytes allocated for frames. """
+        return 0 if self._data is None else self._data.nbytes
+    
+    @property
+    def latest(self) -> int:
+        """ Sequence number of the newest frame (0 if there are no frames). """
+        return self._latest
+    
+    @property
+    def oldest(self) -> int:
+        """ Sequence number of the oldest frame that can still be read. """
+        if self._latest < self._first:
+            return 0
+        return max(self._latest - self._num_slots + 1, self._first)
+    
+    def allocate(self, shape: Tuple[int, ...], dtype: Union[str, np.dtype]) -> None:
+        """ Allocate the slots for frames of a given shape and dtype. """
+        self._data = np.empty((self._num_slots, *shape), dtype=dtype)
+        
+        # Frames stored in the previous slots are no longer available
+        self._seqs[:] = 0
+        self._first = self._latest + 1
+        
+    def claim(self) -> Union[np.ndarray, None]:
+        """
+        Get the slot that the next frame will be stored in, so it can be 
+        written in place (e.g. with cv2.VideoCapture.read(image=slot)).
+        Returns None if the frame shape is not known yet.
+        """
+        if self._data is None:
+            return None
+        idx = self._latest % self._num_slots
+        
+        # Invalidate the old frame in the slot before it is overwritten, so
+        # readers that check is_valid() after reading it see that it changed
+        self._seqs[idx] = 0
+        return self._data[idx]
+    
+    def commit(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """
+        Publish the next frame.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            The frame. If it was not written into the claimed slot, it is
+            copied into it (and the slots are reallocated if the shape or 
+            dtype of the frames has changed).
+        timestamp : Optional[float], optional
+            Acquisition time of the frame. The default of None uses the 
+            current time.
+
+        Returns
+        -------
+        int
+            Sequence number of the frame.
+
+        """
+        if self._data is None or frame.shape != self.shape or frame.dtype != self.dtype:
+            self.allocate(frame.shape, frame.dtype)
+        idx = self._latest % self._num_slots
+        slot = self._data[idx]
+        if frame.ctypes.data != slot.ctypes.data:
+            self._seqs[idx] = 0
+            np.copyto(slot, frame)
+        # Publish the sequence number only after the frame has been written
+        self._times[idx] = time.time() if timestamp is None else timestamp
+        self._seqs[idx] = self._latest + 1
+        
+        # Make the frame visible to consumers once it has been stored
+        self._latest += 1
+        return self._latest
+    
+    def is_valid(self, seq: int) -> bool:
+        """ Whether a frame can be read (has been written and not overwritten). """
+        return 0 < seq and self._seqs[(seq - 1) % self._num_slots] == seq and seq <= self._latest
+    
+    def get(self, seq: int) -> Union[np.ndarray, None]:
+        """ Zero-copy view of a frame, or None if it is not available. """
+        if not self.is_valid(seq):
+            return None
+        return self._data[(seq - 1) % self._num_slots]
+    
+    def timestamp(self, seq: int) -> Union[float, None]:
+        """ Acquisition time of a frame, or None if it is not available. """
+        if not self.is_valid(seq):
+            return None
+        return float(self._times[(seq - 1) % self._num_slots])
+    
+    def clear(self) -> None:
+        """ Forget all frames but keep the allocated slots. """
+        self._seqs[:] = 0
+        self._latest = 0
+        self._first = 1
+
+
+# Shared memory of closed rings that is still used by frames handed out by
+# get(), and is unmapped once they have been released
+_RETIRED_MEMORY: List[shared_memory.SharedMemory] = []
+
+def _close_retired_memory() -> None:
+    """ Unmap the shared memory of closed rings whose frames are no longer used. """
+    for shm in list(_RETIRED_MEMORY):
+        try:
+            shm.close()
+        except BufferError:
+            continue
+        _RETIRED_MEMORY.remove(shm)
+
+
+class SharedFrameRing(FrameRing):
+    """
+    A FrameRing whose slots live in shared memory, so frames written by a
+    camera in another process can be read without copying.
+    
+    The producer process creates the ring and publishes frames with 
+    commit() as usual. The consumer process attaches to it by name and 
+    learns about new frames by their sequence numbers (e.g. over a pipe).
+    The sequence numbers, timestamps and the newest sequence number are 
+    also stored in the shared memory, so is_valid(), get() and timestamp() 
+    behave the same in both processes. The consumer reports the last frame
+    that it has handled in 'consumed', which lets a producer that must not 
+    skip frames (e.g. a recording) wait for it.
+    
+    Since the shared memory has a fixed size, the frame shape and dtype 
+    cannot change after the ring has been created.
+    
+    Layout: int64 header [latest, consumed], float64 timestamps, int64 
+    sequence numbers, then the frames.
+    """
+    
+    def __init__(
+            self, 
+            shape: Tuple[int, ...], 
+            dtype: Union[str, np.dtype], 
+            num_slots: int = _DEFAULT_SLOTS, 
+            name: Optional[str] = None
+            ):
+        """
+        Parameters
+        ----------
+        shape : Tuple[int, ...]
+            Shape of each frame.
+        dtype : Union[str, np.dtype]
+            Data type of the frames.
+        num_slots : int, optional
+            Number of frames to keep. The default is 16.
+        name : Optional[str], optional
+            Name of the shared memory to attach to. The default of None 
+            creates a new ring.
+        """
+        num_slots = max(int(num_slots), 2)
+        dtype = np.dtype(dtype)
+        shape = tuple(int(n) for n in shape)
+        frame_offset = 8 * (2 + 2 * num_slots)
+        size = frame_offset + num_slots * int(np.prod(shape)) * dtype.itemsize
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        
+        # Set up the views before FrameRing.__init__ uses them
+        # NOTE: np.frombuffer keeps the buffer exported while a view of it 
+        # exists, so the memory cannot be unmapped under frames in use 
+        # (unlike np.ndarray(buffer=...))
+        buf = self._shm.buf
+        self._header = np.frombuffer(buf, dtype=np.int64, count=2)
+        super().__init__(num_slots)
+        self._times = np.frombuffer(buf, dtype=np.float64, count=num_slots, offset=16)
+        self._seqs = np.frombuffer(buf, dtype=np.int64, count=num_slots, offset=16 + 8 * num_slots)
+        self._data = np.frombuffer(buf, dtype=dtype, count=num_slots * int(np.prod(shape)),
+                                   offset=frame_offset).reshape((num_slots, *shape))
+        if self._owner:
+            self._times[:] = 0
+            self._seqs[:] = 0
+            self._header[:] = 0
+            
+    @property
+    def _latest(self) -> int:
+        # A closed ring has no frames
+        return 0 if self._header is None else int(self._header[0])
+    
+    @_latest.setter
+    def _latest(self, latest: int) -> None:
+        # Only the producer publishes frames (FrameRing.__init__ also sets this)
+        if self._owner:
+            self._header[0] = latest
+    
+    @property
+    def name(self) -> str:
+        """ Name of the shared memory, used to attach to the ring. """
+        return self._shm.name
+    
+    @property
+    def closed(self) -> bool:
+        # Also closed if the shared memory could not be created or attached
+        return getattr(self, "_header", None) is None
+    
+    @property
+    def consumed(self) -> int:
+        """ Sequence number of the last frame handled by the consumer. """
+        return 0 if self.closed else int(self._header[1])
+    
+    @consumed.setter
+    def consumed(self, seq: int) -> None:
+        if not self.closed:
+            self._header[1] = seq
+            
+    # NOTE: The ring may be closed by another thread while a frame is read,
+    # so the arrays are only looked up once
+    
+    def is_valid(self, seq: int) -> bool:
+        """ Whether a frame can be read (never after the ring has been closed). """
+        seqs = self._seqs
+        return (seqs is not None and 0 < seq 
+                and seqs[(seq - 1) % self._num_slots] == seq and seq <= self._latest)
+    
+    def get(self, seq: int) -> Union[np.ndarray, None]:
+        data = self._data
+        if data is None or not self.is_valid(seq):
+            return None
+        return data[(seq - 1) % self._num_slots]
+    
+    def timestamp(self, seq: int) -> Union[float, None]:
+        times = self._times
+        if times is None or not self.is_valid(seq):
+            return None
+        return float(times[(seq - 1) % self._num_slots])
+        
+    def allocate(self, shape: Tuple[int, ...], dtype: Union[str, np.dtype]) -> None:
+        """ Shared slots cannot be reallocated, so frames must keep their shape and dtype. """
+        if self._data is not None:
+            raise ValueError(f"Frame {shape} {np.dtype(dtype)} does not fit the shared "
+                             f"frame ring {self.shape} {self.dtype}")
+        super().allocate(shape, dtype)
+        
+    def close(self) -> None:
+        """ 
+        Unmap the shared memory. Frames can no longer be read from the ring,
+        but views that were handed out by get() keep the memory mapped until
+        they are released.
+        """
+        if self.closed:
+            return
+        self._seqs = self._data = self._times = self._header = None
+        _RETIRED_MEMORY.append(self._shm)
+        _close_retired_memory()
+        
+    def __del__(self) -> None:
+        # Release the views before SharedMemory unmaps the memory
+        self.close()
+        
+    def unlink(self) -> None:
+        """ Free the shared memory once every process has closed it (producer only). """
+        if self._owner:
+            self._shm.unlink()
+
+
+if __name__ == "__main__":
+
+    import time
+
+    from frheed.image_processing import extend_image, column_to_image
+
+    def benchmark(num_cols: int = 100_000, height: int = 512, every: int = 10_000) -> None:
+        """ Compare per-column append cost of LineScanBuffer and extend_image. """
+        col = (np.random.rand(height) * 255).astype(np.uint8)
+
+        # LineScanBuffer stays flat as the image grows
+        buf = LineScanBuffer(dtype=np.uint8)
+        t0 = time.perf_counter()
+        for i in range(1, num_cols + 1):
+            buf.append(col)
+            if i % every == 0:
+                t1 = time.perf_counter()
+                print(f"LineScanBuffer {i:>7,} columns: {(t1 - t0) / every * 1e6:8.2f} µs/column")
+                t0 = t1
+
+        # extend_image copies the whole image on every frame
+        img = column_to_image(col)
+        t0 = time.perf_counter()
+        for i in range(1, num_cols // 10 + 1):
+            img = extend_image(img, col)
+            if i % (every // 10) == 0:
+                t1 = time.perf_counter()
+                print(f"extend_image   {i:>7,} columns: {(t1 - t0) / (every // 10) * 1e6:8.2f} µs/column")
+                t0 = t1
+
+    benchmark()
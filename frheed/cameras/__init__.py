@@ -1,18 +1,137 @@
 # -*- coding: utf-8 -*-
 
 from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import time
+
+# Maximum time (seconds) to wait for a camera backend to list its cameras
+DISCOVERY_TIMEOUT = 3.
+
+# Time (seconds) for which discovered cameras are reused before probing again
+DISCOVERY_TTL = 60.
 
 class CameraError(Exception):
     pass
-    
-def find_available_cameras():
-    # Find available camera classes which inherit from CameraObject
-    cameras = []
-    for the_class in CameraObject.__subclasses__():
-        for src, name in the_class.get_available_cameras().items():
-            cameras.append((the_class(src), name))
-    return(cameras)
-    
+
+
+@dataclass(frozen=True)
+class CameraInfo:
+    """ A discovered camera, which is only opened when it is used. """
+    backend: type
+    src: object
+    name: str
+
+    def open(self) -> "CameraObject":
+        """ Create the camera object. """
+        return self.backend(self.src)
+
+
+class CameraDiscovery:
+    """
+    Finds the cameras of every backend (CameraObject subclass).
+
+    Backends are probed concurrently in a thread pool, and backends that do
+    not answer within the timeout are skipped (their cameras are added to
+    the cache if they answer later). The result is cached, so opening the
+    camera selection again does not probe the hardware until the cache
+    expires or a refresh is requested.
+    """
+
+    def __init__(self, timeout: float = DISCOVERY_TIMEOUT, ttl: float = DISCOVERY_TTL):
+        """
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time (seconds) to wait for the backends. The default is 3.
+        ttl : float, optional
+            Time (seconds) for which results are reused. The default is 60.
+        """
+        self.timeout = timeout
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cameras: Dict[type, List[CameraInfo]] = {}
+        self._time: Optional[float] = None
+        self._generation = 0
+
+    @property
+    def backends(self) -> List[type]:
+        """ Camera classes that have been imported. """
+        return CameraObject.__subclasses__()
+
+    @property
+    def expired(self) -> bool:
+        return self._time is None or time.monotonic() - self._time > self.ttl
+
+    def invalidate(self) -> None:
+        """ Probe the backends again on the next discovery. """
+        with self._lock:
+            self._time = None
+
+    def discover(self, refresh: bool = False) -> List[CameraInfo]:
+        """ Get the available cameras, probing the backends if needed. """
+        with self._lock:
+            if not (refresh or self.expired):
+                return self.cameras
+            self._cameras = {}
+            self._generation += 1
+            generation = self._generation
+
+        # Probe all backends at the same time
+        pool = ThreadPoolExecutor(max_workers=max(len(self.backends), 1),
+                                  thread_name_prefix="CameraDiscovery")
+        futures = {}
+        for backend in self.backends:
+            future = pool.submit(self._probe, backend)
+            future.add_done_callback(
+                lambda future, backend=backend: self._store(backend, future, generation))
+            futures[future] = backend
+        done, not_done = wait(futures, timeout=self.timeout)
+        for future in done:
+            self._store(futures[future], future, generation)
+        for future in not_done:
+            print(f"{futures[future].__name__} did not list its cameras within {self.timeout} s")
+
+        # Don't wait for backends that timed out
+        pool.shutdown(wait=False)
+
+        with self._lock:
+            self._time = time.monotonic()
+            return self.cameras
+
+    @property
+    def cameras(self) -> List[CameraInfo]:
+        """ Cameras found by the last discovery, in backend order. """
+        return [info for backend in self.backends for info in self._cameras.get(backend, [])]
+
+    @staticmethod
+    def _probe(backend: type) -> List[CameraInfo]:
+        try:
+            cameras = backend.get_available_cameras()
+        except Exception as ex:
+            print(f"{backend.__name__} failed to list its cameras: {ex}")
+            return []
+        return [CameraInfo(backend, src, name) for src, name in cameras.items()]
+
+    def _store(self, backend: type, future, generation: int) -> None:
+        # Ignore results from a discovery that has been replaced
+        with self._lock:
+            if generation == self._generation:
+                self._cameras[backend] = future.result()
+
+
+_DISCOVERY = CameraDiscovery()
+
+def discover_cameras(refresh: bool = False) -> List[CameraInfo]:
+    """ Get the available cameras (cached, see CameraDiscovery). """
+    return _DISCOVERY.discover(refresh=refresh)
+
+def find_available_cameras(refresh: bool = False):
+    # Open every available camera as a list of (camera, name)
+    return [(info.open(), info.name) for info in discover_cameras(refresh=refresh)]
+
 class CameraObject(ABC):
     """
     The CameraObject class acts as an abstract interface for connecting to a camera. 
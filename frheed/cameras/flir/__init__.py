@@ -4,11 +4,15 @@ Connecting to FLIR cameras.
 Adapted from simple_pyspin: https://github.com/klecknerlab/simple_pyspin
 """
 
-from typing import Tuple, Union
+from typing import Tuple, Union, Optional, Dict, List, Iterator
 import time
+from collections import deque
+from collections.abc import Mapping
 import numpy as np
 
 from frheed.cameras import CameraError
+from frheed.utils import get_logger
+from frheed import settings
 
 # Make sure PySpin is installed
 from frheed.cameras.flir.install_pyspin import install_pyspin
@@ -67,15 +71,40 @@ _GUI_FUNCTIONS = {
     "SerialReceiveQueueClear":      "Clear Serial Port",
     }
 
+# Driver-side statistics to read from the transport layer stream node map
+_STREAM_STATISTICS = (
+    "StreamTotalBufferCount",
+    "StreamFailedBufferCount",
+    "StreamBufferUnderrunCount",
+    "StreamDroppedFrameCount",
+    "StreamLostFrameCount",
+    "StreamIncompleteFrameCount",
+    )
+
+# Chunk data values returned by get_array(get_chunk=True), with their getters
+_CHUNK_FIELDS = {
+    "timestamp":                    "GetTimestamp",  # ns
+    "frame_id":                     "GetFrameID",
+    "exposure_time":                "GetExposureTime",  # µs
+    "gain":                         "GetGain",  # dB
+    }
+
+# Number of frame times used to calculate the frame rate
+_FPS_FRAMES = 60
+
 _DEBUG = (__name__ == "__main__")
 
+logger = get_logger("flir")
+
 _SYSTEM = None
 
 
-def list_cameras() -> PySpin.CameraList:
+def list_cameras(update: bool = True) -> PySpin.CameraList:
     """
     Return a list of Spinnaker cameras. Also initializes the PySpin
     'System', if needed. (See PySpin documentation for more info.)
+    If update is False, the cameras found by the last search are returned
+    without searching the interfaces again.
     """
 
     global _SYSTEM
@@ -83,7 +112,7 @@ def list_cameras() -> PySpin.CameraList:
     if _SYSTEM is None:
         _SYSTEM = PySpin.System.GetInstance()
 
-    return _SYSTEM.GetCameras()
+    return _SYSTEM.GetCameras(update, update)
 
 def get_available_cameras() -> dict:
     """ Get available cameras as a dictionary of {source: name}. """
@@ -104,6 +133,146 @@ def get_available_cameras() -> dict:
     return available
 
 
+class NodeCache:
+    """
+    GenICam nodes of a camera node map that are resolved when they are first
+    accessed instead of all at once when the camera is initialized.
+    
+    Resolved nodes (including names that are not nodes) and the static 
+    metadata of each node (description, unit and enumeration entries) are 
+    cached, so only volatile values (access mode, value, min/max) are read
+    from the camera again. The node map is only walked completely if every
+    node is needed, e.g. when iterating over the attributes of a camera.
+    """
+    
+    # Node interface types that are wrapped as attributes
+    _attr_types = {
+        PySpin.intfIFloat:          PySpin.CFloatPtr,
+        PySpin.intfIBoolean:        PySpin.CBooleanPtr,
+        PySpin.intfIInteger:        PySpin.CIntegerPtr,
+        PySpin.intfIEnumeration:    PySpin.CEnumerationPtr,
+        PySpin.intfIString:         PySpin.CStringPtr,
+        }
+
+    _attr_type_names = {
+        PySpin.intfIFloat:          "float",
+        PySpin.intfIBoolean:        "bool",
+        PySpin.intfIInteger:        "int",
+        PySpin.intfIEnumeration:    "enum",
+        PySpin.intfIString:         "string",
+        PySpin.intfICommand:        "command",
+        }
+    
+    def __init__(self, node_map):
+        self._node_map = node_map
+        
+        # {name: (type name, "attribute" or "method" or None, pointer) or None}
+        self._nodes: Dict[str, Union[tuple, None]] = {}
+        self._names: Optional[List[str]] = None
+        self._metadata: Dict[str, dict] = {}
+        
+        # Lazy views with the same interface as dictionaries
+        self.attributes = _NodeView(self, "attribute")
+        self.methods = _NodeView(self, "method")
+        self.types = _NodeView(self, None)
+        
+    def __len__(self) -> int:
+        return len(self._nodes)
+        
+    def node(self, name: str) -> Union[tuple, None]:
+        """ Get the (type name, kind, pointer) of a node, or None if there is no such node. """
+        try:
+            return self._nodes[name]
+        except KeyError:
+            pass
+        
+        # GenICam node names never start with an underscore
+        node = None if name.startswith("_") else self._node_map.GetNode(name)
+        self._nodes[name] = self._wrap(node) if node is not None else None
+        return self._nodes[name]
+        
+    def names(self) -> List[str]:
+        """ Names of all nodes (walks the entire node map the first time). """
+        if self._names is None:
+            t0 = time.perf_counter()
+            names = []
+            for node in self._node_map.GetNodes():
+                name = node.GetName()
+                if self._nodes.get(name) is None:
+                    self._nodes[name] = self._wrap(node)
+                names.append(name)
+            self._names = names
+            logger.info(f"Enumerated {len(names)} camera nodes in "
+                        f"{(time.perf_counter() - t0) * 1e3:.1f} ms")
+        return self._names
+    
+    def metadata(self, name: str) -> dict:
+        """ Static information about a node (description, unit, entries). """
+        if name in self._metadata:
+            return self._metadata[name]
+        
+        node = self.node(name)[2]
+        metadata = {}
+        for attr in ("description", "unit"):
+            f = getattr(node, "Get" + attr.capitalize(), None)
+            if f:
+                metadata[attr] = f()
+        if hasattr(node, "GetEntries"):
+            entries = []
+            entry_desc = []
+            has_desc = False
+            for entry in node.GetEntries():
+                entries.append(entry.GetName().split("_")[-1])
+                entry_desc.append(entry.GetDescription().strip())
+                if entry_desc[-1]: has_desc = True
+            metadata["entries"] = entries
+            if has_desc:
+                metadata["entry_descriptions"] = entry_desc
+                
+        self._metadata[name] = metadata
+        return metadata
+    
+    def _wrap(self, node) -> tuple:
+        pit = node.GetPrincipalInterfaceType()
+        type_name = self._attr_type_names.get(pit, pit)
+        if pit == PySpin.intfICommand:
+            return (type_name, "method", PySpin.CCommandPtr(node))
+        elif pit in self._attr_types:
+            return (type_name, "attribute", self._attr_types[pit](node))
+        return (type_name, None, node)
+
+
+class _NodeView(Mapping):
+    """ Read-only mapping of the nodes of one kind in a NodeCache. """
+    
+    def __init__(self, cache: NodeCache, kind: Optional[str]):
+        self._cache = cache
+        self._kind = kind
+        
+    def _get(self, name: str) -> Union[tuple, None]:
+        node = self._cache.node(name) if isinstance(name, str) else None
+        if node is None or (self._kind is not None and node[1] != self._kind):
+            return None
+        return node
+        
+    def __contains__(self, name: object) -> bool:
+        return self._get(name) is not None
+        
+    def __getitem__(self, name: str) -> object:
+        node = self._get(name)
+        if node is None:
+            raise KeyError(name)
+        
+        # The type view maps names to type names, the others to pointers
+        return node[0] if self._kind is None else node[2]
+    
+    def __iter__(self) -> Iterator[str]:
+        return (name for name in self._cache.names() if name in self)
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
 class FlirCamera:
     """
     A class used to encapsulate a PySpin camera.
@@ -112,13 +281,13 @@ class FlirCamera:
     cam : PySpin Camera
     running : bool
         True if acquiring images
-    camera_attributes : dictionary
+    camera_attributes : mapping
         Contains links to all of the camera nodes which are settable
-        attributes.
-    camera_methods : dictionary
+        attributes (resolved on first access, see NodeCache).
+    camera_methods : mapping
         Contains links to all of the camera nodes which are executable
         functions.
-    camera_node_types : dictionary
+    camera_node_types : mapping
         Contains the type (as a string) of each camera node.
     lock : bool
         If True, attribute access is locked down; after the camera is
@@ -164,24 +333,13 @@ class FlirCamera:
         PySpin.NA: "not available"
         }
 
-    _attr_types = {
-        PySpin.intfIFloat:          PySpin.CFloatPtr,
-        PySpin.intfIBoolean:        PySpin.CBooleanPtr,
-        PySpin.intfIInteger:        PySpin.CIntegerPtr,
-        PySpin.intfIEnumeration:    PySpin.CEnumerationPtr,
-        PySpin.intfIString:         PySpin.CStringPtr,
-        }
-
-    _attr_type_names = {
-        PySpin.intfIFloat:          "float",
-        PySpin.intfIBoolean:        "bool",
-        PySpin.intfIInteger:        "int",
-        PySpin.intfIEnumeration:    "enum",
-        PySpin.intfIString:         "string",
-        PySpin.intfICommand:        "command",
-        }
-
-    def __init__(self, src: Union[int, str] = 0, lock: bool = False):
+    def __init__(
+            self, 
+            src: Union[int, str] = 0, 
+            lock: bool = False,
+            buffer_handling_mode: str = settings.FLIR_BUFFER_HANDLING_MODE,
+            buffer_count: Optional[int] = settings.FLIR_BUFFER_COUNT
+            ):
         """
         Parameters
         ----------
@@ -191,6 +349,12 @@ class FlirCamera:
         lock : bool (default: False)
             If True, setting new attributes after initialization results in
             an error.
+        buffer_handling_mode : str (default: settings.FLIR_BUFFER_HANDLING_MODE)
+            StreamBufferHandlingMode of the driver, e.g. "NewestOnly" to 
+            always get the newest frame or "OldestFirst" to get every frame.
+        buffer_count : int or None (default: settings.FLIR_BUFFER_COUNT)
+            Number of driver stream buffers (StreamBufferCountManual). 
+            If None, the driver default is used.
         """
         super().__setattr__("camera_attributes", {})
         super().__setattr__("camera_methods", {})
@@ -198,29 +362,40 @@ class FlirCamera:
         super().__setattr__("_initialized", False)
         super().__setattr__("lock", lock)
 
-        cam_list = list_cameras()
-        
-        if _DEBUG: 
-            print(f"Found {cam_list.GetSize()} FLIR camera(s)")
-
         self._src_type = type(src)            
         self._src = src
-            
-        if not cam_list.GetSize():
-            raise CameraError("No FLIR cameras detected.")
-            
-        if isinstance(src, int):
-            self._cam = cam_list.GetByIndex(src)
-            
-        elif isinstance(src, str):
-            self._cam = cam_list.GetBySerial(src)
-            
-        cam_list.Clear()
+        
+        # Look the camera up among the cameras found by the last search (e.g.
+        # by the camera discovery) and only search again if it isn't there
+        cam = self._find_camera(src, update=False)
+        if cam is None:
+            cam = self._find_camera(src, update=True)
+        if cam is None:
+            raise CameraError(f"FLIR camera {src!r} not detected.")
+        self._cam = cam
         
         # Other attributes which may be accessed later
         self._running = False
-        self._frame_times = []
+        self._frame_times = deque(maxlen=_FPS_FRAMES)
         self._incomplete_image_count = 0
+        self._last_timestamp = None
+        self._buffer_handling_mode = buffer_handling_mode
+        self._buffer_count = buffer_count
+
+    @staticmethod
+    def _find_camera(src: Union[int, str], update: bool) -> Union[PySpin.CameraPtr, None]:
+        """ Get a camera by index or serial number, or None if it isn't found. """
+        cam_list = list_cameras(update)
+        try:
+            if isinstance(src, int):
+                if not 0 <= src < cam_list.GetSize():
+                    return None
+                cam = cam_list.GetByIndex(src)
+            else:
+                cam = cam_list.GetBySerial(str(src))
+        finally:
+            cam_list.Clear()
+        return cam if cam.IsValid() else None
 
     def __getattr__(self, attr: str) -> object:
         # Add this in so @property decorator works as expected
@@ -312,6 +487,53 @@ class FlirCamera:
     @property
     def incomplete_image_count(self) -> int:
         return self._incomplete_image_count
+    
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """ Camera timestamp (s) of the most recent frame from get_array """
+        return self._last_timestamp
+    
+    @property
+    def buffer_handling_mode(self) -> str:
+        """ StreamBufferHandlingMode of the driver (applied while not running) """
+        return self._buffer_handling_mode
+    
+    @buffer_handling_mode.setter
+    def buffer_handling_mode(self, mode: str) -> None:
+        self._buffer_handling_mode = mode
+        if self.initialized and not self.running:
+            self._configure_stream()
+    
+    @property
+    def buffer_count(self) -> Union[int, None]:
+        """ Number of driver stream buffers (applied while not running) """
+        return self._buffer_count
+    
+    @buffer_count.setter
+    def buffer_count(self, count: Union[int, None]) -> None:
+        self._buffer_count = count
+        if self.initialized and not self.running:
+            self._configure_stream()
+    
+    @property
+    def stream_statistics(self) -> dict:
+        """ Driver-side stream statistics (e.g. dropped frames, underruns) """
+        stats = {}
+        if not self.initialized:
+            return stats
+        node_map = self.cam.GetTLStreamNodeMap()
+        for name in _STREAM_STATISTICS:
+            node = PySpin.CIntegerPtr(node_map.GetNode(name))
+            if PySpin.IsAvailable(node) and PySpin.IsReadable(node):
+                stats[name] = node.GetValue()
+        return stats
+    
+    @property
+    def dropped_frame_count(self) -> int:
+        """ Number of frames dropped or lost by the driver """
+        stats = self.stream_statistics
+        return (stats.get("StreamDroppedFrameCount", 0) 
+                + stats.get("StreamLostFrameCount", 0))
 
     @property
     def model(self) -> str:
@@ -363,13 +585,13 @@ class FlirCamera:
             return 0.
         
         # When fewer than 60 frames have been captured in this acquisition
-        elif len(self._frame_times) < 60:
+        elif len(self._frame_times) < _FPS_FRAMES:
             dt = (self._frame_times[-1] - self._frame_times[0])
             return len(self._frame_times) / max(dt, 1)
         
         # Return the average frame time of the last 60 frames
         else:
-            return 60 / (self._frame_times[-1] - self._frame_times[-60])
+            return (_FPS_FRAMES - 1) / (self._frame_times[-1] - self._frame_times[0])
 
     @property
     def width(self) -> int:
@@ -414,18 +636,55 @@ class FlirCamera:
         using a 'with' clause.
         """
 
+        t0 = time.perf_counter()
         self.cam.Init()
 
-        for node in self.cam.GetNodeMap().GetNodes():
-            pit = node.GetPrincipalInterfaceType()
-            name = node.GetName()
-            self.camera_node_types[name] = self._attr_type_names.get(pit, pit)
-            if pit == PySpin.intfICommand:
-                self.camera_methods[name] = PySpin.CCommandPtr(node)
-            if pit in self._attr_types:
-                self.camera_attributes[name] = self._attr_types[pit](node)
+        # Nodes are resolved when they are first used
+        nodes = NodeCache(self.cam.GetNodeMap())
+        super().__setattr__("_nodes", nodes)
+        super().__setattr__("camera_attributes", nodes.attributes)
+        super().__setattr__("camera_methods", nodes.methods)
+        super().__setattr__("camera_node_types", nodes.types)
 
         self._initialized = True
+        
+        # Configure the driver stream buffers
+        self._configure_stream()
+        logger.info(f"Initialized {self.name} in {(time.perf_counter() - t0) * 1e3:.1f} ms")
+        
+    def _configure_stream(self) -> None:
+        """ 
+        Apply the stream buffer settings (only possible before acquisition).
+        Settings that the camera or driver does not support are skipped with
+        a warning, so the camera can still be opened with the driver defaults.
+        """
+        node_map = self.cam.GetTLStreamNodeMap()
+        
+        # Set the buffer handling mode
+        if self._buffer_handling_mode is not None:
+            node = PySpin.CEnumerationPtr(node_map.GetNode("StreamBufferHandlingMode"))
+            if not (PySpin.IsAvailable(node) and PySpin.IsWritable(node)):
+                logger.warning(f"{self.name} does not support setting the stream buffer "
+                               "handling mode, using the driver default")
+            else:
+                entry = node.GetEntryByName(self._buffer_handling_mode)
+                if not (PySpin.IsAvailable(entry) and PySpin.IsReadable(entry)):
+                    logger.warning("Unknown stream buffer handling mode "
+                                   f"'{self._buffer_handling_mode}', using the driver default")
+                else:
+                    node.SetIntValue(entry.GetValue())
+        
+        # Set the number of buffers
+        if self._buffer_count is not None:
+            mode = PySpin.CEnumerationPtr(node_map.GetNode("StreamBufferCountMode"))
+            if PySpin.IsAvailable(mode) and PySpin.IsWritable(mode):
+                mode.SetIntValue(mode.GetEntryByName("Manual").GetValue())
+            node = PySpin.CIntegerPtr(node_map.GetNode("StreamBufferCountManual"))
+            if not (PySpin.IsAvailable(node) and PySpin.IsWritable(node)):
+                logger.warning(f"{self.name} does not support setting the number of stream "
+                               "buffers, using the driver default")
+            else:
+                node.SetValue(max(min(int(self._buffer_count), node.GetMax()), node.GetMin()))
 
     def start(self, continuous: bool = True) -> None:
         """
@@ -464,7 +723,7 @@ class FlirCamera:
         
         if self.running:
             self.cam.EndAcquisition()
-        self._frame_times = []
+        self._frame_times.clear()
         self._incomplete_image_count = 0
         self._running = False
         
@@ -481,16 +740,20 @@ class FlirCamera:
         except AttributeError:
             pass
         
-        # Reset attributes
-        self.camera_attributes = {}
-        self.camera_methods = {}
-        self.camera_node_types = {}
+        # Reset attributes (without looking them up in the closed node map)
+        super().__setattr__("camera_attributes", {})
+        super().__setattr__("camera_methods", {})
+        super().__setattr__("camera_node_types", {})
+        super().__setattr__("_nodes", None)
         self._initialized = False
         # self.system.ReleaseInstance()
 
     def get_image(self, wait: bool = True) -> PySpin.ImagePtr:
         """
-        Get an image from the camera.
+        Get an image from the camera. The image must be released with 
+        img.Release() once it is no longer needed, otherwise the driver
+        runs out of stream buffers.
+        
         Parameters
         ----------
         wait : bool (default: True)
@@ -513,17 +776,15 @@ class FlirCamera:
         if image_ptr.IsIncomplete():
             self._incomplete_image_count += 1
         
-        # Release the image pointer to free memory (I think this reduces performance?)
-        # image_ptr.Release()  # free memory in the camera buffer
-        
         return image_ptr
 
     def get_array(
             self, 
             wait: bool = True, 
             get_chunk: bool = False, 
-            complete_frames_only: bool = False
-            ) -> Union[np.ndarray, Tuple[np.ndarray, PySpin.PySpin.ChunkData]]:
+            complete_frames_only: bool = False,
+            out: Optional[np.ndarray] = None
+            ) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, Union[int, float, None]]]]:
         
         """
         Get an image from the camera, and convert it to a numpy array.
@@ -534,31 +795,69 @@ class FlirCamera:
             If True, waits for the next image.  Otherwise throws an exception
             if there isn"t one ready.
         get_chunk : bool (default: False)
-            If True, returns chunk data from image frame.
+            If True, also returns the chunk data of the image frame.
         complete_frames_only : bool (default: True)
             If True, only return complete frames.
+        out : numpy.ndarray (default: None)
+            If provided, the image is copied into this array (e.g. a FrameRing
+            slot) as long as it has the same shape and dtype. Otherwise the 
+            image is copied into a new array. Either way, the camera buffer
+            is released before returning.
             
         Returns
         -------
         img : numpy.ndarray
-        chunk : PySpin.PySpin.ChunkData (only if get_chunk == True)
+        chunk : dict (only if get_chunk == True)
+            The chunk data values in _CHUNK_FIELDS (None if unavailable), 
+            copied before the image is released.
         """
 
         # Get image pointer
         img = self.get_image(wait=wait)
-        
-        # Ensure complete image is returned if option is chosen
-        if complete_frames_only and img.IsIncomplete():
-            return self.get_array(wait, get_chunk, complete_frames_only)
+        try:
             
-        # Store frame time for real FPS calculation
-        self._frame_times.append(time.time())
-
-        if get_chunk:
-            return img.GetNDArray(), img.GetChunkData()
-        else:
+            # Ensure complete image is returned if option is chosen
+            if complete_frames_only and img.IsIncomplete():
+                img.Release()
+                img = None
+                return self.get_array(wait, get_chunk, complete_frames_only, out)
+                
+            # Store frame time for real FPS calculation
             self._frame_times.append(time.time())
-            return img.GetNDArray()
+            
+            # Device timestamp (ns), the same clock as the chunk data timestamp
+            self._last_timestamp = img.GetTimeStamp() * 1e-9
+    
+            # Copy out of the camera buffer so it can be released
+            array = img.GetNDArray()
+            if out is not None and out.shape == array.shape and out.dtype == array.dtype:
+                np.copyto(out, array)
+                array = out
+            else:
+                array = array.copy()
+                
+            # The chunk data belongs to the camera buffer, so copy its values
+            if get_chunk:
+                return array, self._copy_chunk_data(img)
+            else:
+                return array
+            
+        finally:
+            # Give the buffer back to the driver
+            if img is not None:
+                img.Release()
+
+    @staticmethod
+    def _copy_chunk_data(img: PySpin.ImagePtr) -> Dict[str, Union[int, float, None]]:
+        """ Read the chunk data values of an image that has not been released yet. """
+        chunk = img.GetChunkData()
+        values = {}
+        for name, getter in _CHUNK_FIELDS.items():
+            try:
+                values[name] = getattr(chunk, getter)()
+            except (AttributeError, PySpin.SpinnakerException):
+                values[name] = None
+        return values
 
     def get_info(self, name: str) -> dict:
         """
@@ -598,22 +897,13 @@ class FlirCamera:
 
         # print(info)
         if info.get("access") != 0:
-            for attr in ("description", "unit", "min", "max"):
+            # Description, unit and entries don't change, so they are cached
+            info.update(self._nodes.metadata(name))
+            for attr in ("min", "max"):
                 fname = "Get" + attr.capitalize()
                 f = getattr(node, fname, None)
                 if f:
                     info[attr] = f()
-            if hasattr(node, "GetEntries"):
-                entries = []
-                entry_desc = []
-                has_desc = False
-                for entry in node.GetEntries():
-                    entries.append(entry.GetName().split("_")[-1])
-                    entry_desc.append(entry.GetDescription().strip())
-                    if entry_desc[-1]: has_desc = True
-                info["entries"] = entries
-                if has_desc:
-                    info["entry_descriptions"] = entry_desc
 
         return info
 
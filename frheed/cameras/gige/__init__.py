@@ -6,11 +6,14 @@ Connecting to GigE Vision cameras.
 import os
 from typing import Union, Optional, List, Tuple
 import time
+import threading
+from collections import deque
 import vimba
 import cv2
 import numpy as np
 
 from frheed.cameras import CameraError, CameraObject
+from frheed import settings
 
 from vimba.c_binding import VmbCameraInfo, call_vimba_c, byref, sizeof
 from vimba.error import VimbaFeatureError
@@ -19,6 +22,18 @@ from vimba.error import VimbaFeatureError
 
 _DEBUG = (__name__ == "__main__")
 
+# Number of frame buffers queued to the driver while streaming
+DEFAULT_BUFFER_COUNT = 10
+
+# Number of frame timestamps used to calculate the frame rate
+_FPS_FRAMES = 60
+
+# Maximum time (seconds) to wait for a frame while streaming
+_FRAME_TIMEOUT = 2.0
+
+# Supported monochrome pixel formats (12 and 16-bit frames are uint16)
+PIXEL_FORMATS = ("Mono8", "Mono12", "Mono16")
+
 
 class GigECamera(CameraObject):
     """ 
@@ -47,14 +62,40 @@ class GigECamera(CameraObject):
                 cam_dict[cam_id] = f'GigE Camera {cam_num}'
         return(cam_dict)
     
-    def __init__(self, src, vimba_camera_id = None, lock = False):
+    def __init__(
+            self, 
+            src, 
+            vimba_camera_id = None, 
+            lock = False, 
+            streaming: bool = True, 
+            buffer_count: int = DEFAULT_BUFFER_COUNT,
+            pixel_format: str = settings.GIGE_PIXEL_FORMAT
+            ):
         """
         Parameters
         ----------
+        src : str
+            Vimba ID of the camera.
+        streaming : bool, optional
+            If True, frames are acquired asynchronously by a Vimba frame 
+            handler. Otherwise, every call to get_array() acquires a single 
+            frame. The default is True.
+        buffer_count : int, optional
+            Number of frame buffers queued to the driver while streaming.
+            Received frames stay in their buffer until they are read, so up
+            to buffer_count - 1 frames are kept. The default is 10.
+        pixel_format : str, optional
+            "Mono8", "Mono12" or "Mono16". The default is 
+            settings.GIGE_PIXEL_FORMAT.
         """
         super().__init__()
             
         self.gige_camera_id = src
+        self.streaming = streaming
+        self.buffer_count = max(int(buffer_count), 1)
+        if pixel_format not in PIXEL_FORMATS:
+            raise CameraError(f"Unsupported pixel format {pixel_format}, must be one of {PIXEL_FORMATS}")
+        self.pixel_format = pixel_format
         
         self.name = f"GigE{self.gige_camera_id}"
         self.camera_type = "GigE"
@@ -65,11 +106,21 @@ class GigECamera(CameraObject):
         
         # Other attributes which may be accessed later
           # camera is running as soon as you connect to it
-        self._frame_times = []
+        self._frame_times = deque(maxlen=_FPS_FRAMES)
         self.incomplete_image_count = 0
         
+        # Frames lost by the camera or driver (gaps in the frame IDs) or
+        # given back to the driver because they were not read in time
+        self.dropped_frame_count = 0
         
-        
+        # Received frames that have not been read yet (their buffers are
+        # requeued once they have been copied out)
+        self._pending = deque()
+        self._max_pending = max(self.buffer_count - 1, 1)
+        self._frame_ready = threading.Condition()
+        self._last_frame_id = None
+        self._tick_frequency = None
+        self._last_timestamp = None
     
     def __enter__(self):
         super().__enter__()
@@ -82,20 +133,31 @@ class GigECamera(CameraObject):
         self.vim_cam = self.vim.get_camera_by_id(self.gige_camera_id)
         self.vim_cam.__enter__()
         
-        ### TODO: Allow use of Mono16 Pixel format
-        self.vim_cam.set_pixel_format(vimba.frame.PixelFormat.Mono12)
+        # Frames are kept at the full bit depth for analysis
+        self.vim_cam.set_pixel_format(getattr(vimba.frame.PixelFormat, self.pixel_format))
+
+        # Start streaming into the driver buffers
+        if self.streaming:
+            self._start_streaming()
 
         self.running = True
         
         return(self)
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
+        if getattr(self, "vim_cam", None) is None:
+            return
+        if self.streaming and self.vim_cam.is_streaming():
+            self.vim_cam.stop_streaming()
+            self._pending.clear()
         self.vim_cam.__exit__(exc_type, exc_value, exc_traceback)
         self.vim.__exit__(exc_type, exc_value, exc_traceback)
         super().__exit__(exc_type, exc_value, exc_traceback)
         
-        self._frame_times = []
+        self.vim_cam = None
+        self._frame_times.clear()
         self.incomplete_image_count = 0
+        self.dropped_frame_count = 0
         self.running = False
     
     def __del__(self) -> None:
@@ -120,11 +182,30 @@ class GigECamera(CameraObject):
     
     @property
     def real_fps(self) -> float:
-        """ Get the real frames per second (Hz) """
-        if len(self._frame_times) <= 60:
+        """ 
+        Get the real frames per second (Hz), from the camera timestamps
+        while streaming or from the time frames were received otherwise.
+        """
+        if len(self._frame_times) < 2:
             return 0.
-        else:
-            return 60 / (self._frame_times[-1] - self._frame_times[-60])
+        dt = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / dt if dt > 0 else 0.
+    
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """ Camera timestamp (s) of the most recent frame returned by get_array. """
+        return self._last_timestamp
+    
+    @property
+    def tick_frequency(self) -> float:
+        """ Frequency (Hz) of the camera timestamp clock. """
+        if self._tick_frequency is None:
+            try:
+                self._tick_frequency = float(self.vim_cam.GevTimestampTickFrequency.get())
+            except (AttributeError, VimbaFeatureError):
+                # Vimba timestamps are in nanoseconds if the camera doesn't say
+                self._tick_frequency = 1e9
+        return self._tick_frequency
     
     @property
     def width(self) -> int:
@@ -138,15 +219,84 @@ class GigECamera(CameraObject):
     def shape(self) -> Tuple[int, int]:
         return((self.width, self.weight))
         
-    def get_array(self):
+    def get_array(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.streaming:
+            return self._get_streamed_array(out)
+        
         # Grab and retrieve the camera array
         frame = self.vim_cam.get_frame()
         array = frame.as_numpy_ndarray()
+        self._last_timestamp = frame.get_timestamp() / self.tick_frequency
+        
+        # Copy into the output array if possible (e.g. a FrameRing slot)
+        if out is not None and out.shape == array.shape and out.dtype == array.dtype:
+            np.copyto(out, array)
+            array = out
+        
         # Store frame time for real FPS calculation
         self._frame_times.append(time.time())
         
         return(array)
     
+    def _start_streaming(self) -> None:
+        self._pending.clear()
+        self._last_frame_id = None
+        self.vim_cam.start_streaming(self._frame_handler, buffer_count=self.buffer_count)
+    
+    def _frame_handler(self, cam, frame) -> None:
+        """ Called by Vimba (in its own thread) for every received frame. """
+        kept = False
+        try:
+            # Detect frames that were lost by the camera or driver (incomplete
+            # frames were received, so they are not counted as lost)
+            frame_id = frame.get_id()
+            if self._last_frame_id is not None and frame_id > self._last_frame_id + 1:
+                self.dropped_frame_count += frame_id - self._last_frame_id - 1
+            self._last_frame_id = frame_id
+            
+            if frame.get_status() != vimba.FrameStatus.Complete:
+                self.incomplete_image_count += 1
+                return
+            
+            # Keep the frame in its driver buffer until it is read, so it is
+            # only copied once (into the output array of get_array)
+            timestamp = frame.get_timestamp() / self.tick_frequency
+            with self._frame_ready:
+                self._pending.append((frame, timestamp))
+                kept = True
+                self._frame_times.append(timestamp)
+                
+                # Give the oldest buffer back if the reader has fallen behind,
+                # so the driver always has a buffer to fill
+                if len(self._pending) > self._max_pending:
+                    oldest, _ = self._pending.popleft()
+                    self.dropped_frame_count += 1
+                    cam.queue_frame(oldest)
+                self._frame_ready.notify_all()
+            
+        finally:
+            # Give other buffers back to the driver as soon as possible
+            if not kept:
+                cam.queue_frame(frame)
+            
+    def _get_streamed_array(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """ Get the next streamed frame, waiting for it if necessary. """
+        with self._frame_ready:
+            if not self._frame_ready.wait_for(lambda: self._pending, timeout=_FRAME_TIMEOUT):
+                raise CameraError(f"No frame received from {self} in {_FRAME_TIMEOUT} s")
+            frame, self._last_timestamp = self._pending.popleft()
+        
+        # Copy the frame out of the driver buffer (directly into 'out' if
+        # possible, e.g. a FrameRing slot) and give the buffer back
+        try:
+            array = frame.as_numpy_ndarray()
+            if out is not None and out.shape == array.shape and out.dtype == array.dtype:
+                np.copyto(out, array)
+                return out
+            return array.copy()
+        finally:
+            self.vim_cam.queue_frame(frame)
+    
     def disable_auto_exposure(self) -> None:### IMPLEMENT PROPERLY!!!
         pass
      #   self.CAP_PROP_EXPOSURE = 0.25
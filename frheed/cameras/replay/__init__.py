@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Replaying recorded frames as a camera, e.g. to reanalyze a growth run with
+different regions of interest.
+"""
+
+import os
+from typing import Union, Optional, Tuple
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from frheed.cameras import CameraError, CameraObject
+
+
+_DEBUG = (__name__ == "__main__")
+
+# Suffix of the file that stores the timestamps of a frame stack
+TIMESTAMPS_SUFFIX = "_timestamps.npy"
+
+# Frame rate assumed for recordings without timestamps
+_DEFAULT_FPS = 30.
+
+# Number of frame times used to calculate the frame rate
+_FPS_FRAMES = 60
+
+# File extensions of frame stacks (anything else is opened as a video)
+_STACK_EXTENSIONS = (".npy",)
+
+
+def timestamps_path(path: str) -> str:
+    """ Path of the timestamps that belong to a frame stack. """
+    return os.path.splitext(path)[0] + TIMESTAMPS_SUFFIX
+
+
+def save_recording(
+        path: str,
+        frames: np.ndarray,
+        timestamps: Optional[np.ndarray] = None
+        ) -> None:
+    """
+    Save a stack of frames so it can be replayed by a ReplayCamera.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .npy file to save the frames (shape (N, H, W) or
+        (N, H, W, C)) to.
+    frames : np.ndarray
+        The frames.
+    timestamps : Optional[np.ndarray], optional
+        Acquisition time (s) of every frame, saved next to the frames.
+        The default is None.
+
+    """
+    np.save(path, np.asarray(frames))
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(timestamps) != len(frames):
+            raise ValueError(f"Got {len(timestamps)} timestamps for {len(frames)} frames")
+        np.save(timestamps_path(path), timestamps)
+
+
+class ReplayCamera(CameraObject):
+    """
+    A camera that replays a recording: a frame stack saved with
+    save_recording (memory-mapped, so it does not have to fit in memory),
+    an array of frames or a video file.
+
+    Frames are returned with their recorded timestamps, either paced at the
+    recorded frame rate (optionally sped up) or as fast as they are read.
+    Since a recording can wait, the CameraWorker does not let a ReplayCamera
+    get ahead of the analysis, so no frames are skipped (see live).
+
+    Attributes
+    ----------
+    realtime : bool
+        If True, frames are returned at the recorded times
+    speed : float
+        Playback speed when realtime is True
+    loop : bool
+        If True, the recording restarts after the last frame
+
+    """
+
+    # The source can wait for its consumers
+    live = False
+
+    @staticmethod
+    def get_available_cameras() -> dict:
+        """ Recordings are opened by path, so there is nothing to discover. """
+        return {}
+
+    def __init__(
+            self,
+            src: Union[str, np.ndarray],
+            timestamps: Optional[np.ndarray] = None,
+            realtime: bool = False,
+            speed: float = 1.,
+            loop: bool = False,
+            fps: float = _DEFAULT_FPS
+            ):
+        """
+        Parameters
+        ----------
+        src : Union[str, np.ndarray]
+            Path to a frame stack (.npy) or video file, or an array of frames.
+        timestamps : Optional[np.ndarray], optional
+            Acquisition time (s) of every frame. If the default of None is
+            used, the timestamps are loaded from the recording if possible
+            and otherwise calculated from fps.
+        realtime : bool, optional
+            If True, frames are returned at the recorded times. Otherwise
+            they are returned as fast as they are read. The default is False.
+        speed : float, optional
+            Playback speed when realtime is True. The default is 1.
+        loop : bool, optional
+            If True, the recording restarts after the last frame.
+            The default is False.
+        fps : float, optional
+            Frame rate of recordings without timestamps. The default is 30.
+        """
+        super().__init__()
+        self._src = src
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.camera_type = "Replay"
+
+        self._frames: Optional[np.ndarray] = None
+        self._video: Optional[cv2.VideoCapture] = None
+
+        # Frame stack (memory-mapped) or video
+        if isinstance(src, np.ndarray):
+            self._frames = src
+            num_frames = len(src)
+        elif not os.path.exists(src):
+            raise CameraError(f"Recording {src} does not exist")
+        elif os.path.splitext(src)[1].lower() in _STACK_EXTENSIONS:
+            self._frames = np.load(src, mmap_mode="r")
+            num_frames = len(self._frames)
+            if timestamps is None and os.path.exists(timestamps_path(src)):
+                timestamps = np.load(timestamps_path(src))
+        else:
+            self._video = cv2.VideoCapture(src)
+            if not self._video.isOpened():
+                raise CameraError(f"Unable to open video {src}")
+            num_frames = int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = self._video.get(cv2.CAP_PROP_FPS) or fps
+
+        # Timestamps of every frame (the timestamps of a video are estimated
+        # until its frames are read, since they don't have to be regular)
+        self._read_timestamps = self._video is not None and timestamps is None
+        if timestamps is None:
+            timestamps = np.arange(num_frames) / fps
+        self._timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(self._timestamps) != num_frames:
+            raise CameraError(f"Got {len(self._timestamps)} timestamps for {num_frames} frames")
+
+        # Other attributes which may be accessed later
+        self.running = False
+        self.incomplete_image_count = 0
+        self._position = 0
+        self._anchor: Optional[Tuple[float, float]] = None
+        self._last_timestamp = None
+        self._frame_times = deque(maxlen=_FPS_FRAMES)
+
+    def __enter__(self) -> "ReplayCamera":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.stop()
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def __str__(self) -> str:
+        if isinstance(self._src, str):
+            return f"Replay ({os.path.basename(self._src)})"
+        return "Replay"
+
+    @property
+    def name(self) -> str:
+        return str(self)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """
+        Recorded timestamps (s) of every frame. Frames of a video that have 
+        not been read yet have timestamps estimated from the frame rate.
+        """
+        return self._timestamps
+
+    @property
+    def position(self) -> int:
+        """ Index of the next frame. """
+        return self._position
+
+    @property
+    def finished(self) -> bool:
+        """ Whether every frame has been returned (never True when looping). """
+        return not self.loop and self._position >= len(self)
+
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """ Recorded timestamp (s) of the most recent frame. """
+        return self._last_timestamp
+
+    @property
+    def real_fps(self) -> float:
+        """ Get the real frames per second (Hz) """
+        if len(self._frame_times) < 2:
+            return 0.
+        dt = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / dt if dt > 0 else 0.
+
+    @property
+    def width(self) -> int:
+        if self._frames is not None:
+            return self._frames.shape[2]
+        return int(self._video.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+    @property
+    def height(self) -> int:
+        if self._frames is not None:
+            return self._frames.shape[1]
+        return int(self._video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.width, self.height)
+
+    def start(self, continuous: bool = True) -> None:
+        self._anchor = None
+        self._frame_times.clear()
+        self.running = True
+
+    def stop(self) -> None:
+        self.running = False
+
+    def close(self) -> None:
+        self.stop()
+        if self._video is not None:
+            self._video.release()
+
+    def seek(self, index: int) -> None:
+        """ Continue replaying from a frame index (negative counts from the end). """
+        if index < 0:
+            index += len(self)
+        self._position = min(max(int(index), 0), len(self))
+        if self._video is not None:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, self._position)
+
+        # Pace the following frames from the new position
+        self._anchor = None
+
+    def seek_time(self, t: float) -> None:
+        """ Continue replaying from the first frame recorded at or after time t (s). """
+        self.seek(int(np.searchsorted(self._timestamps, t)))
+
+    def get_array(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        if self._position >= len(self):
+            if not self.loop:
+                raise CameraError(f"End of recording {self}")
+            self.seek(0)
+
+        # Read the frame (into the output array if possible)
+        if self._frames is not None:
+            frame = self._frames[self._position]
+            if out is None or out.shape != frame.shape or out.dtype != frame.dtype:
+                out = np.empty(frame.shape, dtype=frame.dtype)
+            np.copyto(out, frame)
+        else:
+            success, out = self._video.read(image=out)
+            if not success:
+                raise CameraError(f"Unable to read frame {self._position} of {self}")
+
+            # Use the recorded time of the frame that was just read
+            if self._read_timestamps:
+                self._timestamps[self._position] = self._video.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        timestamp = float(self._timestamps[self._position])
+
+        # Wait until the recorded time of the frame
+        if self.realtime:
+            now = time.monotonic()
+            if self._anchor is None:
+                self._anchor = (now, timestamp)
+            delay = self._anchor[0] + (timestamp - self._anchor[1]) / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self._position += 1
+        self._last_timestamp = timestamp
+        self._frame_times.append(time.monotonic())
+
+        return out
+
+    def get_info(self, name: str) -> dict:
+        return {"name": name}
+
+
+if __name__ == "__main__":
+
+    import tempfile
+
+    def replay_test(num_frames: int = 2000, shape: Tuple[int, int] = (480, 640)) -> None:
+        """ Measure how fast a saved recording is replayed. """
+        rng = np.random.default_rng(0)
+        frames = rng.integers(0, 255, (num_frames, *shape), dtype=np.uint8)
+        timestamps = np.cumsum(rng.uniform(0.009, 0.011, num_frames))
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "recording.npy")
+            save_recording(path, frames, timestamps)
+
+            with ReplayCamera(path) as cam:
+                out = np.empty(shape, dtype=np.uint8)
+                t0 = time.perf_counter()
+                for i in range(num_frames):
+                    cam.get_array(out=out)
+                fps = num_frames / (time.perf_counter() - t0)
+                print(f"Replayed {num_frames} frames at {fps:.0f} fps")
+
+                # Real time playback at 10x speed
+                cam.realtime, cam.speed = True, 10.
+                cam.seek(0)
+                t0 = time.perf_counter()
+                for i in range(200):
+                    cam.get_array(out=out)
+                print(f"Real time at 10x: {time.perf_counter() - t0:.3f} s "
+                      f"(recorded {(timestamps[199] - timestamps[0]) / 10:.3f} s)")
+                del cam._frames  # release the memory map before cleanup
+
+    replay_test()
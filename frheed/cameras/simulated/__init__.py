@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+A simulated RHEED camera for testing and benchmarking without hardware.
+"""
+
+from typing import Union, Optional, Tuple
+import time
+from collections import deque
+
+import numpy as np
+
+from frheed.cameras import CameraError, CameraObject
+from frheed import settings
+
+
+_DEBUG = (__name__ == "__main__")
+
+# Number of precomputed noisy background frames that are cycled through
+_NOISE_FRAMES = 8
+
+# Number of frame times used to calculate the frame rate
+_FPS_FRAMES = 60
+
+# Supported bit depths (10 to 16 bit frames are stored as uint16)
+_BIT_DEPTHS = (8, 10, 12, 14, 16)
+
+
+class SimulatedCamera(CameraObject):
+    """
+    A camera that generates RHEED-like frames: a specular spot whose
+    intensity oscillates like layer-by-layer growth, diffraction streaks
+    and a diffuse background with Kikuchi-like lines, all with Poisson noise.
+
+    Everything that does not change between frames is precomputed when
+    the camera is started, as a few noisy background frames that are cycled
+    through. Generating a frame only copies a background into the output
+    and adds the (noisy) specular spot inside its bounding box, so the
+    camera can produce hundreds of frames per second to drive the pipeline.
+
+    Attributes
+    ----------
+    running : bool
+        True if acquiring images
+    fps : float or None
+        Target frame rate (Hz), or None to generate frames as fast as possible
+    period : float
+        Period (s) of the specular spot intensity oscillation
+
+    """
+
+    @staticmethod
+    def get_available_cameras() -> dict:
+        """ Get available cameras as a dictionary of {source: name}. """
+        if not settings.SIMULATED_CAMERA:
+            return {}
+        return {0: "Simulated RHEED camera"}
+
+    def __init__(
+            self,
+            src: int = 0,
+            width: int = 640,
+            height: int = 480,
+            bit_depth: int = 8,
+            fps: Optional[float] = 30.,
+            period: float = 2.,
+            depth: float = 0.6,
+            gain: float = 4.,
+            seed: Optional[int] = None
+            ):
+        """
+        Parameters
+        ----------
+        src : int, optional
+            Camera number, only used for the name. The default is 0.
+        width : int, optional
+            Width of the frames. The default is 640.
+        height : int, optional
+            Height of the frames. The default is 480.
+        bit_depth : int, optional
+            Bit depth of the frames, 8 (uint8) or 10 to 16 (uint16).
+            The default is 8.
+        fps : Optional[float], optional
+            Frame rate (Hz). If None, frames are generated as fast as
+            possible. The default is 30.
+        period : float, optional
+            Period (s) of the specular spot intensity oscillation.
+            The default is 2.
+        depth : float, optional
+            Fraction of the specular spot intensity that oscillates.
+            The default is 0.6.
+        gain : float, optional
+            Number of photons per gray level, which sets the amount of
+            Poisson noise (lower is noisier). The default is 4.
+        seed : Optional[int], optional
+            Seed for the random noise. The default is None.
+        """
+        super().__init__()
+        if bit_depth not in _BIT_DEPTHS:
+            raise CameraError(f"Unsupported bit depth {bit_depth}, must be one of {_BIT_DEPTHS}")
+
+        self._src = src
+        self._width = int(width)
+        self._height = int(height)
+        self._bit_depth = int(bit_depth)
+        self.fps = fps
+        self.period = period
+        self.depth = depth
+        self.gain = gain
+        self.camera_type = "Simulated"
+
+        self._rng = np.random.default_rng(seed)
+        self._backgrounds: Optional[np.ndarray] = None
+        self._spot: Optional[np.ndarray] = None
+        self._spot_bbox: Tuple[slice, slice] = (slice(0), slice(0))
+
+        # Other attributes which may be accessed later
+        self.running = False
+        self.incomplete_image_count = 0
+        self._frame_count = 0
+        self._start_time = 0.
+        self._last_timestamp = None
+        self._frame_times = deque(maxlen=_FPS_FRAMES)
+
+    def __enter__(self) -> "SimulatedCamera":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.stop()
+
+    def __str__(self) -> str:
+        return f"Simulated (Camera {self._src})"
+
+    @property
+    def name(self) -> str:
+        return str(self)
+
+    @property
+    def initialized(self) -> bool:
+        return self._backgrounds is not None
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.width, self.height)
+
+    @property
+    def bit_depth(self) -> int:
+        return self._bit_depth
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.uint8 if self._bit_depth == 8 else np.uint16)
+
+    @property
+    def max_value(self) -> int:
+        return 2 ** self._bit_depth - 1
+
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """ Simulated camera timestamp (s) of the most recent frame. """
+        return self._last_timestamp
+
+    @property
+    def real_fps(self) -> float:
+        """ Get the real frames per second (Hz) """
+        if len(self._frame_times) < 2:
+            return 0.
+        dt = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / dt if dt > 0 else 0.
+
+    def init(self) -> None:
+        """ Precompute the frame templates. """
+        h, w = self._height, self._width
+        y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+
+        # Specular spot in the upper middle of the screen, with the first
+        # order streaks on either side of it
+        cx, cy = w / 2, h / 3
+        spot_sigma = max(w / 80, 1.)
+        streak_sigma = max(w / 160, 1.)
+        spacing = w / 7
+
+        # Diffuse background that decays away from the specular spot
+        r2 = ((x - cx) ** 2 + (y - cy) ** 2) / (0.4 * w) ** 2
+        background = 0.08 + 0.12 * np.exp(-r2)
+
+        # Kikuchi-like lines (thin, faint, at a few angles through the pattern)
+        for angle, offset in ((75, -0.15), (105, 0.15), (60, -0.3), (120, 0.3)):
+            theta = np.deg2rad(angle)
+            dist = (x - cx - offset * w) * np.sin(theta) - (y - cy) * np.cos(theta)
+            background += 0.05 * np.exp(-0.5 * (dist / (0.004 * w)) ** 2)
+
+        # Vertical streaks along the zeroth Laue zone, fading with order
+        for order in (-3, -2, -1, 0, 1, 2, 3):
+            weight = 0.35 / (1 + abs(order))
+            background += weight * (np.exp(-0.5 * ((x - cx - order * spacing) / streak_sigma) ** 2)
+                                    * np.exp(-0.5 * ((y - cy) / (0.15 * h)) ** 2))
+            
+        # Nothing reaches the screen below the shadow edge of the sample
+        background *= 1 / (1 + np.exp((y - 0.85 * h) / (0.01 * h)))
+
+        # Precompute noisy backgrounds (Poisson noise on the photon counts)
+        scale = 0.9 * self.max_value
+        counts = np.clip(background, 0, 1) * scale * self.gain
+        self._backgrounds = np.empty((_NOISE_FRAMES, h, w), dtype=self.dtype)
+        for frame in self._backgrounds:
+            noisy = self._rng.poisson(counts) / self.gain
+            np.minimum(noisy, self.max_value, out=noisy)
+            frame[...] = noisy
+
+        # Specular spot (photon counts) inside its bounding box
+        r = int(np.ceil(4 * spot_sigma))
+        rows = slice(max(int(cy) - r, 0), min(int(cy) + r + 1, h))
+        cols = slice(max(int(cx) - r, 0), min(int(cx) + r + 1, w))
+        spot = np.exp(-0.5 * (((x[rows, cols] - cx) ** 2 + (y[rows, cols] - cy) ** 2)
+                              / spot_sigma ** 2))
+        self._spot = (0.55 * scale * self.gain * spot).astype(np.float64)
+        self._spot_bbox = (rows, cols)
+
+        if _DEBUG:
+            print(f"Precomputed {_NOISE_FRAMES} backgrounds, "
+                  f"{self._backgrounds.nbytes / 1e6:.1f} MB")
+
+    def start(self, continuous: bool = True) -> None:
+        if not self.initialized:
+            self.init()
+        self._frame_count = 0
+        self._start_time = time.monotonic()
+        self._frame_times.clear()
+        self.running = True
+
+    def stop(self) -> None:
+        self._frame_times.clear()
+        self.running = False
+
+    def close(self) -> None:
+        self.stop()
+        self._backgrounds = None
+
+    def intensity(self, t: float) -> float:
+        """ Relative intensity of the specular spot at time t (s). """
+        return 1 - self.depth * 0.5 * (1 - np.cos(2 * np.pi * t / self.period))
+
+    def get_array(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        if not self.initialized:
+            self.start()
+
+        # Wait for the next frame time, or use the elapsed time if free-running
+        if self.fps:
+            t = self._frame_count / self.fps
+            delay = self._start_time + t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            t = time.monotonic() - self._start_time
+
+        # Write into the output array if possible (e.g. a FrameRing slot)
+        background = self._backgrounds[self._frame_count % _NOISE_FRAMES]
+        if out is None or out.shape != background.shape or out.dtype != background.dtype:
+            out = np.empty_like(background)
+        np.copyto(out, background)
+
+        # Add the specular spot with its own Poisson noise
+        rows, cols = self._spot_bbox
+        spot = self._rng.poisson(self._spot * self.intensity(t)) / self.gain
+        spot += background[rows, cols]
+        np.minimum(spot, self.max_value, out=spot)
+        out[rows, cols] = spot
+
+        self._frame_count += 1
+        self._last_timestamp = t
+        self._frame_times.append(time.monotonic())
+
+        return out
+
+    def get_info(self, name: str) -> dict:
+        return {"name": name}
+
+
+if __name__ == "__main__":
+
+    def benchmark(duration: float = 2.) -> None:
+        """ Measure how fast frames can be generated at a few resolutions. """
+        for (w, h), bit_depth in (((640, 480), 8), ((1024, 768), 8),
+                                  ((1440, 1080), 8), ((2048, 1536), 12)):
+            with SimulatedCamera(width=w, height=h, bit_depth=bit_depth, fps=None) as cam:
+                out = np.empty((h, w), dtype=cam.dtype)
+                n = 0
+                t0 = time.perf_counter()
+                while time.perf_counter() - t0 < duration:
+                    cam.get_array(out=out)
+                    n += 1
+                fps = n / (time.perf_counter() - t0)
+            print(f"{w}x{h} {bit_depth}-bit: {fps:7.1f} fps")
+
+    def oscillation_test(period: float = 1., fps: float = 100.) -> None:
+        """ Show the frequency of the spot intensity oscillation. """
+        with SimulatedCamera(fps=fps, period=period, seed=0) as cam:
+            rows, cols = cam._spot_bbox
+            means = [cam.get_array()[rows, cols].mean() for _ in range(int(4 * period * fps))]
+        spectrum = np.abs(np.fft.rfft(means - np.mean(means)))
+        freq = np.fft.rfftfreq(len(means), 1 / fps)[np.argmax(spectrum)]
+        print(f"Oscillation frequency {freq:.2f} Hz (expected {1 / period:.2f} Hz)")
+
+    benchmark()
+    oscillation_test()
@@ -41,6 +41,9 @@ _GUI_INFO = {
 # Backend for cameras
 _DEFAULT_BACKEND = cv2.CAP_DSHOW  # cv2.CAP_DSHOW or cv2.CAP_MSMF
 
+# Highest camera index to probe (probing stops at the first index without a camera)
+_MAX_INDEX = 10
+
 
 
 class UsbCamera(CameraObject):
@@ -97,13 +100,13 @@ class UsbCamera(CameraObject):
         # Add camera indices until list is exhausted
         cam_list = []
         
-        for idx in range(100):
+        for idx in range(_MAX_INDEX):
             cap = cv2.VideoCapture(idx, _DEFAULT_BACKEND)
-            if not cap.read()[0]:
-                break
-            else:
-                cam_list.append(idx)
+            found = cap.isOpened() and cap.read()[0]
             cap.release()
+            if not found:
+                break
+            cam_list.append(idx)
         
         # This seems to help fix FPS when using backend CAP_DSHOW
         cv2.destroyAllWindows()
@@ -113,20 +116,9 @@ class UsbCamera(CameraObject):
     @staticmethod
     def get_available_cameras() -> dict:
         """ Get available cameras as a dictionary of {source: name}. """
-        cams = UsbCamera.list_cameras()
-        available = {}
-        
-        for src in cams:
-            try:
-                with UsbCamera(src=src) as cam:
-                    if cam.initialized:
-                        available[src] = str(cam)
-                    else:
-                        print(f"USB camera {src} is not available")
-            except CameraError:
-                print("No USB cameras detected")
-                
-        return available
+        # NOTE: list_cameras already read a frame from every camera, so they
+        # don't have to be opened again
+        return {src: f"USB (Port {src})" for src in UsbCamera.list_cameras()}
     
     def __init__(
             self, 
@@ -150,13 +142,6 @@ class UsbCamera(CameraObject):
         super().__setattr__("camera_methods", {})
         super().__setattr__("lock", lock)
         
-        cam_list = UsbCamera.list_cameras()
-        if (__name__ == "__main__"):
-            print(f"Found {len(cam_list)} USB camera(s)")
-        
-        if not cam_list:
-            raise CameraError("No USB cameras detected.")
-        
         self._src_type = type(src)
         self._src = src
         
@@ -176,6 +161,7 @@ class UsbCamera(CameraObject):
         self._running = True  # camera is running as soon as you connect to it
         self._frame_times = []
         self._incomplete_image_count = 0
+        self._last_timestamp = None
         
     def __getattr__(self, attr: str) -> object:
         # Add this in so @property decorator works as expected
@@ -253,6 +239,11 @@ class UsbCamera(CameraObject):
     def incomplete_image_count(self) -> int:
         return self._incomplete_image_count
     
+    @property
+    def last_timestamp(self) -> Union[float, None]:
+        """ Capture time (s, monotonic clock) of the most recent frame """
+        return self._last_timestamp
+    
     @property
     def real_fps(self) -> float:
         """ Get the real frames per second (Hz) """
@@ -303,9 +294,15 @@ class UsbCamera(CameraObject):
         self.stop()
         self.cam.release()
         
-    def get_array(self, complete_frames_only: bool = True) -> np.ndarray:
+    def get_array(
+            self, 
+            complete_frames_only: bool = True, 
+            out: Optional[np.ndarray] = None
+            ) -> np.ndarray:
         # Grab and retrieve the camera array
-        is_complete, array = self.cam.read()
+        # NOTE: If 'out' has the right shape and dtype, cv2 reads into it
+        is_complete, array = self.cam.read(image=out)
+        timestamp = time.monotonic()
         
         # Increment incomplete image count if full image is not retrieved
         if not is_complete:
@@ -313,10 +310,11 @@ class UsbCamera(CameraObject):
             
         # Ensure complete image is returned if option is chosen
         if complete_frames_only and not is_complete:
-            return self.get_array(complete_frames_only)
+            return self.get_array(complete_frames_only, out)
         
         # Store frame time for real FPS calculation
         self._frame_times.append(time.time())
+        self._last_timestamp = timestamp
         
         return array
     
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+The acquisition and analysis pipeline without Qt (camera -> frame ring ->
+region analysis -> storage), which the GUI is built on and which can also
+run headless, e.g. on an acquisition PC or in benchmarks.
+"""
+
+from frheed.roi import Region
+from frheed.engine.analysis import FrameAnalyzer
+from frheed.engine.process import CameraProcess
+from frheed.engine.pipeline import AcquisitionEngine
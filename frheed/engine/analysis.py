@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Analysis of the regions of interest in camera frames.
+"""
+
+from typing import Dict, Optional, Sequence, Union
+import time
+
+import numpy as np
+
+from frheed.image_processing import to_grayscale
+from frheed.timeseries import TimeSeriesStore, FIELDS, EXTREMA_FIELDS
+from frheed.roi import Region, RegionAnalyzer
+from frheed import settings
+
+
+class FrameAnalyzer:
+    """
+    Computes the region intensities of camera frames and stores them as
+    time series.
+
+    Frame times are taken from the camera clock when a timestamp is given
+    and mapped onto the system clock with the offset measured at the first
+    frame, so the sample times do not depend on when a frame is analyzed.
+    Times are stored relative to start_time.
+
+    Attributes
+    ----------
+    data : TimeSeriesStore
+        Stored region data
+    start_time : float or None
+        System time that sample times are relative to (set from the first
+        analyzed frame if None)
+    clock_offset : float or None
+        Offset (s) from the camera clock to the system clock
+    frames_analyzed : int
+        Number of frames that have been analyzed
+    extrema : bool
+        Whether the minimum and maximum of area regions are stored
+
+    """
+
+    def __init__(
+            self,
+            max_bytes: Optional[int] = None,
+            extrema: bool = settings.REGION_EXTREMA
+            ):
+        """
+        Parameters
+        ----------
+        max_bytes : Optional[int], optional
+            Approximate memory limit of the stored data (see TimeSeriesStore).
+            The default of None keeps everything.
+        extrema : bool, optional
+            Also store the "min" and "max" of area regions. The default is
+            REGION_EXTREMA.
+        """
+        self.extrema = extrema
+        fields = FIELDS + EXTREMA_FIELDS if extrema else FIELDS
+        self.data = TimeSeriesStore(max_bytes=max_bytes, fields=fields)
+
+        # Computes the statistics of all area regions in one pass
+        self.analyzer = RegionAnalyzer()
+        self.start_time: Optional[float] = None
+        self.clock_offset: Optional[float] = None
+        self.frames_analyzed = 0
+
+    def reset_clock(self) -> None:
+        """ Forget the camera clock offset (e.g. when the camera restarts). """
+        self.clock_offset = None
+
+    def analyze(
+            self,
+            frame: np.ndarray,
+            regions: Sequence[Region],
+            timestamp: Optional[float] = None
+            ) -> Dict[str, dict]:
+        """
+        Analyze the regions of interest in a frame and store the results.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            The raw camera frame.
+        regions : Sequence[Region]
+            Regions to analyze, in raw frame coordinates.
+        timestamp : Optional[float], optional
+            Acquisition time of the frame on the camera clock. The default
+            of None uses the time the frame is analyzed.
+
+        Returns
+        -------
+        Dict[str, dict]
+            The data of each region that was stored for this frame.
+
+        """
+        results = self.measure(frame, regions)
+        self.store(results, timestamp)
+        return results
+
+    def measure(self, frame: np.ndarray, regions: Sequence[Region]) -> Dict[str, dict]:
+        """
+        Get the data of each region in a frame without storing it, e.g. to
+        check that the frame was not overwritten while it was measured
+        before storing the results (see store).
+        """
+        # Analyze the full-resolution frame, so the results do not depend
+        # on the zoom or the display interpolation
+        frame = to_grayscale(frame)
+
+        # Get pixel intensities under regions of interest
+        results = {}
+        areas = []
+        for region in regions:
+
+            # Get the cached mask of the region (only touches pixels in its
+            # bounding box)
+            mask = region.mask(frame.shape)
+
+            results[region.name] = {"kind": region.kind}
+
+            # Store line profile
+            if region.kind == "line":
+                results[region.name]["profile"] = mask.extract(frame)
+            else:
+                areas.append((region.name, mask))
+
+        # Reduce all area regions in a single pass (unless extrema are
+        # stored, many rectangles are summed from an integral image)
+        if areas:
+            masks = [mask for _, mask in areas]
+            stats = self.analyzer.analyze(frame, masks, extrema=self.extrema)
+            for (name, _), row in zip(areas, stats):
+
+                # Regions without pixels are stored as NaN
+                if row["count"] != 0:
+                    results[name]["sum"] = row["sum"]
+                    results[name]["average"] = row["mean"]
+                    if self.extrema:
+                        results[name]["min"] = row["min"]
+                        results[name]["max"] = row["max"]
+        return results
+
+    def store(self, results: Dict[str, dict], timestamp: Optional[float] = None) -> None:
+        """ Store the measured data of a frame as an analyzed frame (see measure). """
+        self.frames_analyzed += 1
+
+        # Get time of data collection relative to start, using the camera
+        # timestamp so that the sample times do not depend on when the frame
+        # is analyzed
+        t = self.frame_time(timestamp)
+        if self.start_time is None or len(results) == 0:
+            self.start_time = t
+        t -= self.start_time
+
+        # Store the data
+        if results:
+            self.data.append(t, results)
+
+    def frame_time(self, timestamp: Union[float, None]) -> float:
+        """ System time of a frame with a camera timestamp (or now if None). """
+        if timestamp is None:
+            return time.time()
+        if self.clock_offset is None:
+            self.clock_offset = time.time() - timestamp
+        return timestamp + self.clock_offset
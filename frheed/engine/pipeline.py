@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition and analysis of camera frames with plain threads.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Union
+import inspect
+import threading
+import time
+
+from frheed.cameras import CameraObject
+from frheed.buffers import FrameRing, LatestFrameBuffer, SharedFrameRing
+from frheed.timeseries import TimeSeriesStore
+from frheed.roi import Region
+from frheed.instrumentation import span
+from frheed.engine.analysis import FrameAnalyzer
+from frheed.engine.process import CameraProcess
+from frheed import settings
+
+
+_DEBUG = (__name__ == "__main__")
+
+# Maximum time (s) the analysis thread waits for a frame before checking
+# whether acquisition has stopped
+_POLL_INTERVAL = 0.1
+
+
+def _call(callbacks: List[Callable], *args) -> None:
+    for callback in callbacks:
+        callback(*args)
+
+
+class AcquisitionEngine:
+    """
+    The camera -> frame ring -> region analysis -> storage pipeline.
+
+    Frames are acquired into a FrameRing by acquire(), which blocks until
+    stop() is called (or a recording has been replayed), and analyzed by
+    sequence number with analyze_sequence() or analyze_pending(). Nothing
+    here depends on a Qt event loop: start() runs acquisition and analysis
+    in two threading.Threads, so the engine can run headless at the full
+    camera rate. The GUI instead calls acquire() and analyze_sequence() from
+    its own worker threads and forwards the callbacks as Qt signals.
+
+    The camera can also be a CameraProcess, which acquires in a separate
+    process. Its frames are then read from shared memory (see
+    SharedFrameRing) and acquisition does not compete for the GIL.
+
+    Callbacks are called in the thread that produced the event:
+        ready_callbacks():          the camera has been opened (acquisition thread)
+        frame_callbacks(seq):       a frame has been stored (acquisition thread)
+        data_callbacks(snapshot):   frames have been analyzed (analysis thread,
+                                    only when started with start())
+        error_callbacks(exception): a frame could not be acquired
+
+    Usage
+    -----
+        engine = AcquisitionEngine(camera, regions=[Region("spot", "rectangle", (300, 100, 340, 140))])
+        engine.run(duration=10.)
+        t, average = engine.data.series("spot")
+
+    """
+
+    def __init__(
+            self,
+            camera: Union[CameraObject, CameraProcess, None] = None,
+            regions: Sequence[Region] = (),
+            num_slots: int = settings.FRAME_RING_SLOTS,
+            max_bytes: Optional[int] = settings.DATA_MEMORY_LIMIT,
+            extrema: bool = settings.REGION_EXTREMA
+            ):
+        """
+        Parameters
+        ----------
+        camera : Union[CameraObject, CameraProcess, None], optional
+            The camera, or a camera in a separate process. It can also be
+            set later. The default is None.
+        regions : Sequence[Region], optional
+            Regions to analyze. The default is no regions.
+        num_slots : int, optional
+            Number of frames kept in memory. The default is FRAME_RING_SLOTS.
+        max_bytes : Optional[int], optional
+            Memory limit of the stored data. The default is DATA_MEMORY_LIMIT.
+        extrema : bool, optional
+            Also store the minimum and maximum of area regions. The default
+            is REGION_EXTREMA.
+        """
+        self.camera = camera
+        self.regions = list(regions)
+
+        # Preallocated frames that consumers read by sequence number (replaced
+        # by the shared ring of a CameraProcess while it is acquiring)
+        self._local_frames = FrameRing(num_slots)
+        self.frames = self._local_frames
+
+        # Sequence number of the newest frame for consumers that may be
+        # slower than the camera (e.g. a display)
+        self.latest_frame = LatestFrameBuffer()
+
+        self.analyzer = FrameAnalyzer(max_bytes=max_bytes, extrema=extrema)
+        self.acquiring = False
+        self.camera_online = False
+        self.frames_missed = 0
+
+        # Whether the camera is live (may overwrite frames that have not been
+        # analyzed) or waits for the analysis, like a recording
+        self.live = True
+
+        # Sequence number of the last frame that was handled by the analysis
+        self._last_sequence = 0
+
+        # Sequence number of the last frame received from a camera process
+        self._received = 0
+
+        self.ready_callbacks: List[Callable[[], None]] = []
+        self.frame_callbacks: List[Callable[[int], None]] = []
+        self.data_callbacks: List[Callable[[dict], None]] = []
+        self.error_callbacks: List[Callable[[Exception], None]] = []
+
+        self._new_frame = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def data(self) -> TimeSeriesStore:
+        return self.analyzer.data
+
+    @property
+    def frames_analyzed(self) -> int:
+        return self.analyzer.frames_analyzed
+
+    @property
+    def last_sequence(self) -> int:
+        """ Sequence number of the last frame that was handled by the analysis. """
+        return self._last_sequence
+
+    @last_sequence.setter
+    def last_sequence(self, seq: int) -> None:
+        self._last_sequence = seq
+
+        # Let a camera process that must not skip frames wait for the analysis
+        if isinstance(self.frames, SharedFrameRing):
+            self.frames.consumed = seq
+
+    @property
+    def latest_sequence(self) -> int:
+        """ Sequence number of the newest frame that has been acquired. """
+        # A camera process writes frames into the shared ring before they
+        # are received, so only the received frames are analyzed (and counted)
+        if isinstance(self.frames, SharedFrameRing):
+            return self._received
+        return self.frames.latest
+
+    @property
+    def oldest_safe(self) -> int:
+        """
+        Sequence number of the oldest frame that is worth analyzing. For a
+        live camera, the oldest frames in the ring are the next ones to be
+        overwritten, so an analysis that falls behind skips ahead to the
+        newer half of the ring instead of analyzing frames that are likely
+        to be overwritten while it reads them.
+        """
+        if not self.live:
+            return self.frames.oldest
+        return max(self.frames.oldest, self.frames.latest - self.frames.num_slots // 2 + 1)
+
+    @property
+    def running(self) -> bool:
+        """ Whether the engine threads (see start) are running. """
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        """ Number of frames acquired, analyzed and missed by the analysis. """
+        return {
+            "acquired": self.latest_frame.count,
+            "analyzed": self.frames_analyzed,
+            "missed":   self.frames_missed,
+            }
+
+    def reset_counters(self) -> None:
+        self.analyzer.frames_analyzed = 0
+        self.frames_missed = 0
+        self.last_sequence = 0
+
+    def acquire(self) -> None:
+        """ Acquire frames into the frame ring until stopped (blocking). """
+        # Set before opening the camera, so stopping while it opens is not undone
+        self.acquiring = True
+        try:
+            with self.camera as camera:
+                _call(self.ready_callbacks)
+                self.camera_online = True
+                self.latest_frame.clear()
+                self.live = getattr(camera, "live", True)
+                if isinstance(camera, CameraProcess):
+                    self._receive_frames(camera)
+                else:
+                    self._acquire_frames(camera)
+        finally:
+            self.camera_online = False
+            self.acquiring = False
+
+            # Let the analysis thread finish the remaining frames
+            with self._new_frame:
+                self._new_frame.notify_all()
+
+    def _acquire_frames(self, camera: CameraObject) -> None:
+        """ Copy (or write in place) frames from a camera in this process. """
+        self._use_frames(self._local_frames)
+        self.frames.clear()
+
+        # Let the camera write directly into the ring if it supports it
+        in_place = "out" in inspect.signature(camera.get_array).parameters
+
+        # Sources that can wait (e.g. recordings) are not allowed to get
+        # ahead of the analysis, so no frames are skipped
+        live = getattr(camera, "live", True)
+
+        while self.acquiring and not getattr(camera, "finished", False):
+            try:
+                if not live:
+                    self.wait_for_analysis()
+                slot = self.frames.claim()
+                with span("acquisition"):
+                    if in_place:
+                        frame = camera.get_array(out=slot)
+                    else:
+                        frame = camera.get_array()
+
+                # Keep the camera's own timestamp of the frame if it
+                # provides one, otherwise the time it was received
+                timestamp = getattr(camera, "last_timestamp", None)
+                self._publish(self.frames.commit(frame, timestamp=timestamp))
+            except Exception as ex:
+                _call(self.error_callbacks, ex)
+
+    def _receive_frames(self, camera: CameraProcess) -> None:
+        """ Read the frames that a camera process writes into shared memory. """
+        # The frames are read from the shared ring without copying
+        self._use_frames(camera.frames)
+        self.frames.consumed = self.last_sequence
+        self._received = 0
+
+        while self.acquiring and not camera.finished:
+            try:
+                seq = camera.receive(timeout=_POLL_INTERVAL)
+                if seq is not None:
+                    self._received = seq
+                    self._publish(seq)
+            except Exception as ex:
+                _call(self.error_callbacks, ex)
+
+    def _use_frames(self, frames: FrameRing) -> None:
+        """ Switch to another frame ring, releasing a previous shared ring. """
+        previous, self.frames = self.frames, frames
+
+        # Consumers that still hold the previous ring see that its frames 
+        # are no longer valid
+        if isinstance(previous, SharedFrameRing) and previous is not frames:
+            previous.close()
+
+    def _publish(self, seq: int) -> None:
+        """ Tell the consumers about a new frame. """
+        self.latest_frame.put(seq)
+        with self._new_frame:
+            self._new_frame.notify_all()
+        _call(self.frame_callbacks, seq)
+
+    def stop_acquisition(self) -> None:
+        self.acquiring = False
+
+    def wait_for_analysis(self) -> None:
+        """ Wait until the next frame will not overwrite a frame that has not been analyzed. """
+        while (self.acquiring
+               and self.frames.latest - self.last_sequence >= self.frames.num_slots - 1):
+            time.sleep(0.001)
+
+    def analyze_sequence(self, seq: int, regions: Optional[Sequence[Region]] = None) -> Union[dict, None]:
+        """
+        Analyze a frame from the frame ring by sequence number.
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame.
+        regions : Optional[Sequence[Region]], optional
+            Regions to analyze. The default of None uses self.regions.
+
+        Returns
+        -------
+        Union[dict, None]
+            The data of each region, or None if the frame was overwritten
+            before it could be analyzed.
+
+        """
+        frame = self.frames.get(seq)
+        timestamp = self.frames.timestamp(seq)
+
+        # Skip frames that were overwritten, or are about to be overwritten,
+        # before they could be analyzed
+        if frame is None or seq < self.oldest_safe:
+            self.frames_missed += 1
+            self.last_sequence = seq
+            return None
+        with span("analysis"):
+            results = self.analyzer.measure(frame, self.regions if regions is None else regions)
+
+        # Only store the results if the frame was not overwritten (even
+        # partially) while it was being analyzed
+        self.last_sequence = seq
+        if not self.frames.is_valid(seq):
+            self.frames_missed += 1
+            return None
+        self.analyzer.store(results, timestamp)
+        return results
+
+    def analyze_pending(self) -> int:
+        """ Analyze every frame acquired since the last one that was analyzed. """
+        latest = self.latest_sequence
+        if latest <= self.last_sequence:
+            return 0
+
+        # Frames that have been or are about to be overwritten are skipped
+        # (a camera process may have overwritten every received frame)
+        first = min(max(self.last_sequence + 1, self.oldest_safe), latest + 1)
+        self.frames_missed += first - self.last_sequence - 1
+        if first > latest:
+            self.last_sequence = latest
+            return 0
+        for seq in range(first, latest + 1):
+            self.analyze_sequence(seq)
+        return latest - first + 1
+
+    def start(self) -> None:
+        """ Start acquiring and analyzing frames in background threads. """
+        if self.running:
+            return
+        self.reset_counters()
+        self.analyzer.reset_clock()
+        self.analyzer.start_time = None
+
+        # Don't let the analysis thread read the frames of the previous run
+        self._use_frames(self._local_frames)
+        self.frames.clear()
+        self.acquiring = True
+        self._threads = [
+            threading.Thread(target=self.acquire, name="Acquisition", daemon=True),
+            threading.Thread(target=self._analyze_until_stopped, name="Analysis", daemon=True),
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """ Stop acquiring and wait for the remaining frames to be analyzed. """
+        self.stop_acquisition()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """ Acquire and analyze for a duration (s), or until a recording ends. """
+        self.start()
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while self.camera_online or self.acquiring:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                time.sleep(0.01)
+        finally:
+            self.stop()
+
+    def _analyze_until_stopped(self) -> None:
+        while True:
+            with self._new_frame:
+                self._new_frame.wait_for(
+                    lambda: self.latest_sequence > self.last_sequence or not self.camera_online,
+                    timeout=_POLL_INTERVAL
+                    )
+            done = not (self.acquiring or self.camera_online)
+            if self.analyze_pending() and self.data_callbacks:
+                _call(self.data_callbacks, self.data.snapshot())
+            if done and self.latest_sequence <= self.last_sequence:
+                break
+
+
+if __name__ == "__main__":
+
+    from frheed.cameras.simulated import SimulatedCamera
+
+    def throughput_test(duration: float = 3., shape=(1536, 2048), bit_depth: int = 12) -> None:
+        """ Run the headless pipeline as fast as the simulated camera can go. """
+        height, width = shape
+        camera = SimulatedCamera(width=width, height=height, bit_depth=bit_depth, fps=None, seed=0)
+        cx, cy, r = width // 2, height // 3, width // 40
+        regions = [
+            Region("spot", "rectangle", (cx - r, cy - r, cx + r, cy + r)),
+            Region("streak", "ellipse", (cx + width // 7 - r, cy - 3 * r, cx + width // 7 + r, cy + 3 * r)),
+            Region("background", "rectangle", (0, 0, width // 2, height // 2)),
+            Region("profile", "line", (cx, 0, cx, height - 1)),
+            ]
+        engine = AcquisitionEngine(camera, regions)
+        camera.init()  # precompute the frames before timing
+        engine.run(duration)
+        counters = engine.counters
+        print(f"{width}x{height} {bit_depth}-bit for {duration:.0f} s: "
+              + ", ".join(f"{k} {v} ({v / duration:.0f} fps)" for k, v in counters.items()))
+
+    def replay_test(num_frames: int = 500) -> None:
+        """ Measure how fast a recording is replayed. """
+        import numpy as np
+        from frheed.cameras.replay import ReplayCamera
+        frames = np.random.default_rng(0).integers(0, 4096, (num_frames, 480, 640), dtype=np.uint16)
+        engine = AcquisitionEngine(ReplayCamera(frames), [Region("all", "rectangle", (0, 0, 639, 479))])
+        t0 = time.perf_counter()
+        engine.run()
+        fps = num_frames / (time.perf_counter() - t0)
+        print(f"Replayed {num_frames} frames at {fps:.0f} fps: {engine.counters}")
+
+    throughput_test()
+    replay_test()
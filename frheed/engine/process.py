@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition in a separate process, with frames passed through shared memory.
+"""
+
+from typing import Callable, Optional, Union
+import multiprocessing as mp
+import traceback
+import inspect
+import time
+
+from frheed.cameras import CameraError
+from frheed.buffers import SharedFrameRing
+from frheed import settings
+
+
+_DEBUG = (__name__ == "__main__")
+
+# Maximum time (s) to wait for the camera process to open the camera
+CAMERA_PROCESS_TIMEOUT = 30.
+
+# Message sent by the camera process when it has stopped
+_FINISHED = None
+
+
+def _run_camera(
+        conn,
+        factory: Callable,
+        args: tuple,
+        kwargs: dict,
+        num_slots: int,
+        stop
+        ) -> None:
+    """
+    Acquire frames into a SharedFrameRing until stopped (camera process).
+
+    The ring is created from the first frame and announced with a "ready"
+    message, after which only the sequence number of each frame is sent.
+    Errors are sent as ("error", message) and the end of acquisition as
+    _FINISHED.
+    """
+    ring = None
+    try:
+        with factory(*args, **kwargs) as camera:
+            frame = camera.get_array()
+            ring = SharedFrameRing(frame.shape, frame.dtype, num_slots)
+            live = getattr(camera, "live", True)
+            conn.send(("ready", {
+                "name":         ring.name,
+                "shape":        frame.shape,
+                "dtype":        frame.dtype.str,
+                "num_slots":    ring.num_slots,
+                "width":        getattr(camera, "width", frame.shape[1]),
+                "height":       getattr(camera, "height", frame.shape[0]),
+                "live":         live,
+                }))
+
+            # Wait for the ring to be attached before publishing frames
+            conn.recv()
+            conn.send(ring.commit(frame, timestamp=getattr(camera, "last_timestamp", None)))
+
+            # Let the camera write directly into the ring if it supports it
+            in_place = "out" in inspect.signature(camera.get_array).parameters
+
+            while not stop.is_set() and not getattr(camera, "finished", False):
+                try:
+
+                    # Sources that can wait (e.g. recordings) are not allowed
+                    # to get ahead of the analysis, so no frames are skipped
+                    while (not live and not stop.is_set()
+                           and ring.latest - ring.consumed >= ring.num_slots - 1):
+                        time.sleep(0.001)
+                    if in_place:
+                        frame = camera.get_array(out=ring.claim())
+                    else:
+                        frame = camera.get_array()
+                    conn.send(ring.commit(frame, timestamp=getattr(camera, "last_timestamp", None)))
+                except (BrokenPipeError, EOFError):
+                    raise
+                except Exception as ex:
+                    conn.send(("error", f"{type(ex).__name__}: {ex}"))
+    except (BrokenPipeError, EOFError):
+
+        # The GUI or engine process has gone away
+        return
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        try:
+            conn.send(_FINISHED)
+        except (BrokenPipeError, OSError):
+            pass
+
+        # The consumer keeps its mapping of the frames until it closes the ring
+        if ring is not None:
+            ring.close()
+            ring.unlink()
+
+
+class CameraProcess:
+    """
+    Runs a camera in a separate process, so acquisition does not compete
+    with the display and analysis for the GIL and is never blocked by them.
+
+    The camera process writes the frames into a SharedFrameRing and only
+    sends their sequence numbers over a pipe, so frames are read from the
+    ring without copying. The camera is created in the camera process from
+    a picklable factory (e.g. the camera class and its arguments), since
+    camera objects and their driver handles cannot be shared between
+    processes. The process is started when the camera is opened (with
+    statement) and stopped when it is closed.
+
+    AcquisitionEngine recognizes a CameraProcess and reads its ring
+    directly instead of copying frames from get_array().
+
+    Usage
+    -----
+        with CameraProcess(SimulatedCamera, width=2048, height=1536) as camera:
+            seq = camera.receive()
+            frame = camera.frames.get(seq)
+
+    """
+
+    def __init__(
+            self,
+            factory: Callable,
+            *args,
+            num_slots: int = settings.FRAME_RING_SLOTS,
+            timeout: float = CAMERA_PROCESS_TIMEOUT,
+            **kwargs
+            ):
+        """
+        Parameters
+        ----------
+        factory : Callable
+            Picklable callable that creates the camera, e.g. a CameraObject
+            subclass.
+        *args, **kwargs
+            Arguments of the factory.
+        num_slots : int, optional
+            Number of frames in the shared ring. The default is FRAME_RING_SLOTS.
+        timeout : float, optional
+            Maximum time (s) to wait for the camera to open. The default is 30.
+        """
+        self.factory = factory
+        self.args = args
+        self.kwargs = kwargs
+        self.num_slots = num_slots
+        self.timeout = timeout
+        self.camera_type = getattr(getattr(factory, "func", factory), "__name__", type(factory).__name__)
+
+        # The camera settings are not available in this process
+        self.gui_settings = {}
+
+        # Set when the camera is opened
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.live = True
+        self.frames: Optional[SharedFrameRing] = None
+        self._finished = False
+        self._process = None
+        self._conn = None
+        self._stop = None
+
+    def __enter__(self) -> "CameraProcess":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    @property
+    def finished(self) -> bool:
+        """ Whether the camera process has stopped sending frames. """
+        return self._finished
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def consumed(self) -> int:
+        """ Sequence number of the last frame handled by the analysis. """
+        return 0 if self.frames is None else self.frames.consumed
+
+    @consumed.setter
+    def consumed(self, seq: int) -> None:
+        if self.frames is not None:
+            self.frames.consumed = seq
+
+    def open(self) -> None:
+        """ Start the camera process and attach to its frame ring. """
+
+        # Forking a process that runs Qt and driver threads is not safe
+        ctx = mp.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._stop = ctx.Event()
+        self._finished = False
+        self._process = ctx.Process(
+            target=_run_camera,
+            args=(child_conn, self.factory, self.args, self.kwargs, self.num_slots, self._stop),
+            name=f"{self.camera_type} process",
+            daemon=True
+            )
+        self._process.start()
+        child_conn.close()
+
+        # Wait for the camera to open
+        if not self._conn.poll(self.timeout):
+            self.close()
+            raise CameraError(f"{self.camera_type} did not open within {self.timeout} s")
+        message = self._conn.recv()
+        if not (isinstance(message, tuple) and message[0] == "ready"):
+            self.close()
+            raise CameraError(f"{self.camera_type} could not be opened:\n{message and message[1]}")
+        info = message[1]
+
+        # NOTE: The previous ring is closed by its consumer once it has 
+        # switched to the new one (see AcquisitionEngine)
+        self.frames = SharedFrameRing(info["shape"], info["dtype"], info["num_slots"], name=info["name"])
+        self.width, self.height, self.live = info["width"], info["height"], info["live"]
+        self._conn.send("attached")
+
+        if _DEBUG:
+            print(f"Attached to {self.frames.name} ({self.frames.nbytes / 1024 ** 2:.1f} MB)")
+
+    def receive(self, timeout: Optional[float] = None) -> Union[int, None]:
+        """
+        Wait for the next frame.
+
+        Parameters
+        ----------
+        timeout : Optional[float], optional
+            Maximum time (s) to wait. The default of None waits until a
+            frame arrives or the camera process stops.
+
+        Raises
+        ------
+        CameraError
+            If the camera process could not acquire a frame.
+
+        Returns
+        -------
+        Union[int, None]
+            Sequence number of the frame in 'frames', or None if no frame
+            arrived in time or the camera process has stopped.
+
+        """
+        if self._finished or not self._conn.poll(timeout):
+            return None
+        try:
+            message = self._conn.recv()
+        except EOFError:
+            message = _FINISHED
+        if message is _FINISHED:
+            self._finished = True
+            return None
+        if isinstance(message, tuple):
+            raise CameraError(message[1])
+        return message
+
+    def close(self) -> None:
+        """ Stop the camera process. The ring stays readable until the next open(). """
+        if self._process is None:
+            return
+        self._stop.set()
+
+        # Read the remaining messages, so the camera process is not blocked
+        # on a full pipe while stopping
+        deadline = time.monotonic() + self.timeout
+        while not self._finished and time.monotonic() < deadline:
+            try:
+                self.receive(timeout=0.1)
+            except CameraError:
+                pass
+            if not self._process.is_alive() and not self._conn.poll():
+                break
+        self._process.join(self.timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self._process = self._conn = self._stop = None
+        self._finished = True
+
+
+if __name__ == "__main__":
+
+    from frheed.cameras.simulated import SimulatedCamera
+    from frheed.roi import Region
+
+    # The camera process has to import its target from the module itself,
+    # not from __main__
+    from frheed.engine import AcquisitionEngine, CameraProcess
+
+    def throughput_test(duration: float = 3., shape=(1536, 2048), bit_depth: int = 12) -> None:
+        """ Compare acquisition in a thread and in a process while the frames are analyzed. """
+        height, width = shape
+        cx, cy, r = width // 2, height // 3, width // 40
+        regions = [
+            Region("spot", "rectangle", (cx - r, cy - r, cx + r, cy + r)),
+            Region("background", "rectangle", (0, 0, width // 2, height // 2)),
+            Region("profile", "line", (cx, 0, cx, height - 1)),
+            ]
+        kwargs = dict(width=width, height=height, bit_depth=bit_depth, fps=None, seed=0)
+        for name, camera in (("thread", SimulatedCamera(**kwargs)),
+                             ("process", CameraProcess(SimulatedCamera, **kwargs))):
+            engine = AcquisitionEngine(camera, regions)
+            engine.start()
+
+            # Only time the acquisition once the camera has been opened
+            while not engine.camera_online:
+                time.sleep(0.01)
+            before = engine.counters
+            time.sleep(duration)
+            engine.stop()
+            counters = engine.counters
+            print(f"Acquisition in a {name:<7}: " + ", ".join(
+                f"{k} {(v - before[k]) / duration:.0f} fps" for k, v in counters.items()))
+
+    def replay_test(num_frames: int = 300) -> None:
+        """ Measure how fast a recording is replayed from a process. """
+        import numpy as np
+        from frheed.cameras.replay import ReplayCamera
+        frames = np.random.default_rng(0).integers(0, 4096, (num_frames, 480, 640), dtype=np.uint16)
+        engine = AcquisitionEngine(CameraProcess(ReplayCamera, frames),
+                                   [Region("all", "rectangle", (0, 0, 639, 479))])
+        t0 = time.perf_counter()
+        engine.run()
+        fps = num_frames / (time.perf_counter() - t0)
+        print(f"Replayed {num_frames} frames from a process at {fps:.0f} fps: {engine.counters}")
+
+    throughput_test()
+    replay_test()
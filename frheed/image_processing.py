@@ -3,7 +3,9 @@
 Assorted image processing operations.
 """
 
-from typing import Union, List
+from typing import Union, List, Tuple, Optional, Dict
+from functools import lru_cache
+from collections import OrderedDict
 
 import numpy as np
 import cmapy
@@ -11,43 +13,213 @@ import cv2
 import matplotlib as mpl
 from PyQt5.QtGui import QImage, QPixmap
 
+
+# Maximum number of colormap lookup tables to keep in memory
+CMAP_CACHE_SIZE = 16
+
+# Maximum number of window/level lookup tables to keep in memory
+WINDOW_CACHE_SIZE = 16
+
+# Pixel spacing of the grid that percentiles are computed on (see contrast_limits)
+PERCENTILE_STEP = 8
+
+# Maximum number of buffer types (shape and dtype) with their own display
+# buffer pool, e.g. windowed grayscale frames and their colormapped version
+DISPLAY_POOL_TYPES = 4
+
 # https://stackoverflow.com/a/1735122/10342097
-def normalize(arr: np.ndarray) -> np.ndarray:
+def normalize(
+        arr: np.ndarray, 
+        out: Optional[np.ndarray] = None,
+        percentiles: Optional[Tuple[float, float]] = None
+        ) -> np.ndarray:
     """
     Normalize a numpy array between 0 and 255 as uint8.
     
+    uint16 arrays take an integer path: the maximum is found with 
+    cv2.minMaxLoc and the array is scaled and saturated to uint8 in a 
+    single cv2.convertScaleAbs pass, without a float32 copy. Other types 
+    are scaled in float32. A per-maximum 65536-entry lookup table was also
+    tried for uint16, but indexing it is slower than the cv2 path.
+    
     Parameters
     ----------
     arr : np.ndarray
         The array to normalize.
+    out : Optional[np.ndarray], optional
+        Reusable uint8 output buffer. If it does not match the input, a new
+        array is allocated instead. The default is None.
+    percentiles : Optional[Tuple[float, float]], optional
+        Lower and upper percentiles that are mapped to 0 and 255 (see 
+        contrast_limits). If the default of None is used, 0 to the maximum
+        of the array is mapped to 0 to 255.
     
-    %timeit results (1536 x 2048, float32):
-        6.41 ms ± 248 µs per loop (mean ± std. dev. of 7 runs, 100 loops each)
+    %timeit results (1536 x 2048):
+        float32:                      ~3.0 ms
+        uint16 (previous float path): ~2.9 ms
+        uint16 (integer path):        ~0.85 ms
+        uint16, percentiles=(1, 99):  ~2.6 ms
+        
+    Returns
+    -------
+    np.ndarray
+        The uint8 array ('out' if it could be used). uint8 arrays are 
+        returned unchanged unless percentiles are provided.
         
     """
     
     # Return if array is already uint8
     dtype = arr.dtype
-    if dtype == np.uint8:
+    if dtype == np.uint8 and percentiles is None:
         return arr
+    if out is not None and (out.shape != arr.shape or out.dtype != np.uint8):
+        out = None
     
-    # Cast to floating point if it isn't already
-    # https://stackoverflow.com/a/1168729/10342097
-    if dtype.kind in ("u", "i"):
-        
-        # Warning: copy=False means the original input is modified!
-        arr = arr.astype(np.float32, copy=True)
+    # Range that is mapped to 0-255
+    if percentiles is not None:
+        low, high = contrast_limits(arr, percentiles)
+    else:
+        low, high = 0, _max_value(arr)
+    
+    # Scale and saturate integer images in cv2 (rounds to the nearest value)
+    if dtype in (np.uint8, np.uint16):
+        return _window_level(arr, low, high, out)
         
-    # Normalize between 0 and 255
-    arr *= 255 / arr.max()
+    # Scale other types in floating point (truncates like the cast to uint8)
+    # https://stackoverflow.com/a/1168729/10342097
+    if low:
+        arr = np.subtract(arr, low, dtype=np.float32)
+    scaled = np.multiply(arr, 255 / ((high - low) or 1), dtype=np.float32)
+    if percentiles is not None:
+        np.clip(scaled, 0, 255, out=scaled)
     
     # Convert back to uint8
-    return arr.astype(np.uint8, copy=True)
+    if out is None:
+        return scaled.astype(np.uint8)
+    out[...] = scaled
+    return out
+    
+def contrast_limits(
+        arr: np.ndarray, 
+        percentiles: Tuple[float, float] = (1., 99.),
+        step: int = PERCENTILE_STEP
+        ) -> Tuple[float, float]:
+    """
+    Get the values at the lower and upper percentiles of an image, e.g. to 
+    ignore a few hot pixels when setting the contrast. The percentiles are 
+    computed on every 'step'-th pixel along both axes, which is ~50x faster 
+    than the full image for step = 8 and accurate enough for display.
+    Small images are sampled more densely, so at least 64 pixels are used 
+    along each axis. Integer images get integer limits (floor of the lower 
+    and ceiling of the upper limit).
+    """
+    axes = arr.shape[:2]
+    step = max(min(step, *(n // 64 for n in axes)), 1)
+    sample = arr[tuple(slice(None, None, step) for _ in axes)]
+    low, high = np.percentile(sample, percentiles)
+    if arr.dtype.kind in ("u", "i"):
+        return int(np.floor(low)), int(np.ceil(high))
+    return float(low), float(high)
+    
+def _max_value(arr: np.ndarray) -> Union[int, float]:
+    # cv2.minMaxLoc only accepts single-channel images, so view the channels
+    # of a contiguous image as columns
+    if arr.dtype != np.uint16 or not arr.flags.c_contiguous:
+        return arr.max()
+    return int(cv2.minMaxLoc(arr.reshape(arr.shape[0], -1))[1])
+    
+@lru_cache(maxsize=WINDOW_CACHE_SIZE)
+def window_level_lut(low: int, high: int, bit_depth: int = 16) -> np.ndarray:
+    """
+    Get the lookup table that maps every integer value of the given bit 
+    depth to uint8, where values at or below 'low' map to 0, values at or 
+    above 'high' map to 255 and the values in between are scaled linearly.
+    The table is built with the same operations as apply_window_level, so
+    both give identical results.
+    """
+    values = np.arange(2 ** bit_depth, dtype=np.uint8 if bit_depth <= 8 else np.uint16)
+    lut = _window_level(values[np.newaxis], low, high)[0]
+    
+    # The cached table is shared, so make sure it is not modified
+    lut.flags.writeable = False
+    return lut
+
+def _window_level(arr: np.ndarray, low: int, high: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Values below the window saturate at 0 when subtracting, then the window
+    # is scaled to 0-255 and saturated as uint8 in a single cv2 pass
+    scale = 255 / max(high - low, 1)
+    if low:
+        arr = cv2.subtract(arr, low)
+    return cv2.convertScaleAbs(arr, out, scale)
+
+def apply_window_level(
+        arr: np.ndarray, 
+        low: Optional[int] = None, 
+        high: Optional[int] = None,
+        out: Optional[np.ndarray] = None
+        ) -> np.ndarray:
+    """
+    Convert an 8 or 16-bit integer image to a uint8 display image using a 
+    window/level, without floating point intermediates.
+    
+    uint8 images are mapped with cv2.LUT and a cached window_level_lut. For
+    uint16 images a 65536-entry table lookup in numpy is slower than 
+    scaling in float32, so the same mapping is computed with a saturating 
+    cv2.subtract and cv2.convertScaleAbs.
+    
+    %timeit results (1536 x 2048, 12-bit values in uint16):
+        scaling in float32:             ~3.3 ms
+        np.take(window_level_lut(...)): ~8.3 ms
+        apply_window_level:             ~1.4 ms
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        The image (uint8 or uint16). Other types are normalized instead.
+    low : Optional[int], optional
+        Value that is shown as black. The default of None uses 0.
+    high : Optional[int], optional
+        Value that is shown as white. The default of None uses the 
+        maximum of the image.
+    out : Optional[np.ndarray], optional
+        Reusable uint8 output buffer. If it does not match the input, a new
+        array is allocated instead. The default is None.
+
+    Returns
+    -------
+    np.ndarray
+        The uint8 display image ('out' if it could be used).
+
+    """
+    if arr.dtype not in (np.uint8, np.uint16):
+        return normalize(arr)
+    low = 0 if low is None else int(low)
+    high = int(arr.max()) if high is None else int(high)
+    if out is not None and (out.shape != arr.shape or out.dtype != np.uint8):
+        out = None
+    
+    # 8-bit images only need a 256-entry table
+    if arr.dtype == np.uint8:
+        return cv2.LUT(arr, window_level_lut(low, high, 8), dst=out)
+    return _window_level(arr, low, high, out)
     
-def apply_cmap(arr: np.ndarray, cmap: str) -> np.ndarray:
+@lru_cache(maxsize=CMAP_CACHE_SIZE)
+def get_cmap_lut(cmap: str) -> np.ndarray:
     """
-    Apply a named colormap to an array. This function uses the cmapy library 
-    to convert matplotlib colormaps to cv2 colormaps, since cv2.applyColormap is
+    Get the 256 x 1 x 3 RGB lookup table of a named colormap, as used by 
+    cv2.applyColorMap. Tables are built once per colormap and the least 
+    recently used tables are evicted once CMAP_CACHE_SIZE is exceeded.
+    """
+    lut = cmapy.cmap(cmap, rgb_order=True)
+    
+    # The cached table is shared, so make sure it is not modified
+    lut.flags.writeable = False
+    return lut
+
+def apply_cmap(arr: np.ndarray, cmap: str, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Apply a named colormap to an array. The colormap is applied as a cached 
+    lookup table (see get_cmap_lut) with cv2.applyColorMap, which is 
     approximately 5x faster than using matplotlib/numpy methods 
     (tested using uint8 2048 x 1536 arrays, ~30ms vs ~6ms).
 
@@ -57,6 +229,9 @@ def apply_cmap(arr: np.ndarray, cmap: str) -> np.ndarray:
         The array to apply the colormap to. The array must be single-channel (not RGB).
     cmap : str
         The name of the colormap to apply (any valid matplotlib colormap).
+    out : Optional[np.ndarray], optional
+        Reusable (h, w, 3) uint8 output buffer. If it does not match the 
+        input, a new array is allocated instead. The default is None.
 
     Returns
     -------
@@ -64,42 +239,288 @@ def apply_cmap(arr: np.ndarray, cmap: str) -> np.ndarray:
         The original array with the colormap applied to it.
         The resulting array will be RGB888 (RGB where each channel is uint8).
         It will have a shape of (h, w, 3) where (h, w) are the height
-        and width of the input array.
+        and width of the input array. This is 'out' if it could be used.
 
     """
-    return cmapy.colorize(normalize(arr), cmap, rgb_order=True)
+    arr = normalize(arr)
+    lut = get_cmap_lut(cmap)
+    if out is None or out.shape != arr.shape[:2] + (3,) or out.dtype != np.uint8:
+        return cv2.applyColorMap(arr, lut)
+    return cv2.applyColorMap(arr, lut, dst=out)
 
-def to_grayscale(array: np.ndarray) -> np.ndarray:
+def to_grayscale(array: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
     # Get number of channels
     shape = array.shape
     channels = 1 if len(shape) == 2 else shape[-1]
     
+    # Only write into the output buffer if it matches the grayscale image
+    if out is not None and (out.shape != shape[:2] or out.dtype != array.dtype):
+        out = None
+    
     # Convert to grayscale if image is 3-channel
     if channels == 3:
-        return cv2.cvtColor(array, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(array, cv2.COLOR_BGR2GRAY, dst=out)
     
     # Convert to grayscale if RGBA
     elif channels == 4:
-        return cv2.cvtColor(array, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(array, cv2.COLOR_RGBA2GRAY, dst=out)
+    
+    # Drop the channel axis of single-channel images (e.g. Vimba frames)
+    elif array.ndim == 3:
+        return array[..., 0]
     
     # Otherwise, assume already grayscale
     return array
 
+def resize_interpolation(shape: Tuple[int, ...], dsize: Tuple[int, int]) -> int:
+    """
+    Get the interpolation for resizing an image of the given shape to 
+    dsize = (width, height): INTER_AREA when shrinking, which averages 
+    the source pixels so the image does not alias, and INTER_LINEAR when 
+    enlarging. Both are cheaper than INTER_CUBIC.
+    """
+    h, w = shape[0:2]
+    if dsize[0] < w or dsize[1] < h:
+        return cv2.INTER_AREA
+    return cv2.INTER_LINEAR
+
+def resize(
+        array: np.ndarray, 
+        dsize: Tuple[int, int], 
+        out: Optional[np.ndarray] = None,
+        interpolation: Optional[int] = None
+        ) -> np.ndarray:
+    """
+    Resize an image to dsize = (width, height).
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The image.
+    dsize : Tuple[int, int]
+        Width and height of the resized image. If they match the image, it 
+        is returned without resizing or copying it.
+    out : Optional[np.ndarray], optional
+        Reusable output buffer. If it does not match the resized image, a 
+        new array is allocated instead. The default is None.
+    interpolation : Optional[int], optional
+        cv2 interpolation flag. If the default of None is used, it is 
+        chosen with resize_interpolation.
+
+    Returns
+    -------
+    np.ndarray
+        The resized image ('out' if it could be used).
+
+    """
+    w, h = int(dsize[0]), int(dsize[1])
+    if array.shape[0:2] == (h, w):
+        return array
+    if interpolation is None:
+        interpolation = resize_interpolation(array.shape, (w, h))
+    if out is not None and (out.shape != (h, w) + array.shape[2:] or out.dtype != array.dtype):
+        out = None
+    return cv2.resize(array, (w, h), dst=out, interpolation=interpolation)
+
 def ndarray_to_qimage(array: np.ndarray) -> QImage:
-    """ Convert a grayscale image to a QImage. """
-    # Copy the array otherwise you could get an error that QImage argument 1
-    # has unexpected type 'memoryview'
-    array = array.copy()
+    """ Convert an RGB888 image to a QImage. """
+    # Only copy the array if it is not C-contiguous, otherwise you could get 
+    # an error that QImage argument 1 has unexpected type 'memoryview'
+    array = np.ascontiguousarray(array)
     
     # Convert to QImage
     h, w = array.shape[0:2]
-    bytes_per_line = array.strides[0]  # assuminng C-contiguous array
-    return QImage(array.data, w, h, bytes_per_line, QImage.Format_RGB888)
+    bytes_per_line = array.strides[0]
+    image = QImage(array.data, w, h, bytes_per_line, QImage.Format_RGB888)
+    
+    # The QImage does not own its data, so keep a reference to the array
+    image.ndarray = array
+    return image
 
 def ndarray_to_qpixmap(array: np.ndarray) -> QPixmap:
     """ Convert a numpy array to a QPixmap. """
     return QPixmap(ndarray_to_qimage(array))
 
+@lru_cache(maxsize=CMAP_CACHE_SIZE)
+def get_cmap_color_table(cmap: str) -> Tuple[int, ...]:
+    """ Get a named colormap as a 256-entry Qt color table (qRgb values). """
+    lut = get_cmap_lut(cmap)[:, 0].astype(np.uint32)
+    table = 0xFF000000 | (lut[:, 0] << 16) | (lut[:, 1] << 8) | lut[:, 2]
+    return tuple(int(color) for color in table)
+
+def ndarray_to_indexed_qimage(array: np.ndarray, cmap: str) -> QImage:
+    """
+    Convert a grayscale image to an Indexed8 QImage whose color table is
+    the colormap, so Qt applies the colormap when the image is converted 
+    for display. This moves 1 byte per pixel instead of the 3 bytes of an 
+    RGB888 image and skips apply_cmap entirely.
+    
+    %timeit results (1536 x 2048, uint8, including conversion to QPixmap):
+        ndarray_to_qpixmap(apply_cmap(array, cmap)):    ~13.8 ms
+        QPixmap(ndarray_to_indexed_qimage(array, cmap)): ~4.2 ms
+    
+    """
+    array = np.ascontiguousarray(normalize(array))
+    h, w = array.shape[0:2]
+    image = QImage(array.data, w, h, array.strides[0], QImage.Format_Indexed8)
+    image.setColorTable(get_cmap_color_table(cmap))
+    
+    # The QImage does not own its data, so keep a reference to the array
+    image.ndarray = array
+    return image
+
+def ndarray_to_indexed_qpixmap(array: np.ndarray, cmap: str) -> QPixmap:
+    """ Convert a grayscale image to a QPixmap with a colormap applied by Qt. """
+    return QPixmap(ndarray_to_indexed_qimage(array, cmap))
+
+class FramePresenter:
+    """
+    Converts display frames to QPixmaps with as few copies as possible.
+    
+    C-contiguous arrays are wrapped directly in a QImage, which keeps a
+    reference to the array for as long as it exists. Other arrays are first
+    copied into a display buffer. Colormapped frames are written into a
+    small pool of reusable display buffers, so the frame that is currently
+    shown is not overwritten by the next one. There is one pool per shape
+    and dtype, so stages that write different buffers for the same frame
+    (e.g. window then colorize) don't reallocate each other's buffers.
+    Every full-frame copy is counted, including the QImage to QPixmap
+    conversion that Qt always performs, which gives the copies_per_frame
+    measurement. Intermediate results (grayscale and resized frames) are
+    written into one reusable buffer per stage (see scratch).
+    """
+    
+    def __init__(self, pool_size: int = 3):
+        """
+        Parameters
+        ----------
+        pool_size : int, optional
+            Number of display buffers of each shape and dtype to cycle 
+            through. The default is 3.
+        """
+        self.pool_size = max(int(pool_size), 1)
+        
+        # {(shape, dtype): [next index, buffers]} in order of last use
+        self._pools: "OrderedDict[tuple, list]" = OrderedDict()
+        self._scratch: Dict[str, np.ndarray] = {}
+        self.frames = 0
+        self.copies = 0
+        
+    @property
+    def copies_per_frame(self) -> float:
+        """ Average number of full-frame copies per presented frame. """
+        return self.copies / max(self.frames, 1)
+    
+    def reset_counters(self) -> None:
+        self.frames = 0
+        self.copies = 0
+        
+    def buffer(self, shape: Tuple[int, ...], dtype: Union[str, np.dtype] = np.uint8) -> np.ndarray:
+        """ Get the next display buffer from the pool of its shape and dtype. """
+        key = (tuple(int(n) for n in shape), np.dtype(dtype))
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = [0, []]
+            
+            # Forget the pools of shapes that are no longer shown (e.g. zoom)
+            while len(self._pools) > DISPLAY_POOL_TYPES:
+                self._pools.popitem(last=False)
+        else:
+            self._pools.move_to_end(key)
+        idx, buffers = pool
+        pool[0] = (idx + 1) % self.pool_size
+        if idx == len(buffers):
+            buffers.append(np.empty(key[0], dtype=key[1]))
+        return buffers[idx]
+    
+    def scratch(self, name: str, shape: Tuple[int, ...], dtype: Union[str, np.dtype] = np.uint8) -> np.ndarray:
+        """
+        Get the intermediate buffer of a processing stage, reallocated if the 
+        shape has changed. Unlike the display buffers, there is one buffer 
+        per stage, which is overwritten by the next frame.
+        """
+        buffer = self._scratch.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = self._scratch[name] = np.empty(shape, dtype=dtype)
+        return buffer
+    
+    def copy(self, array: np.ndarray) -> np.ndarray:
+        """ 
+        Copy a frame into the frame stage buffer, e.g. a FrameRing slot that 
+        may be overwritten by the camera while it is being displayed.
+        """
+        buffer = self.scratch("frame", array.shape, array.dtype)
+        np.copyto(buffer, array)
+        self.copies += 1
+        return buffer
+    
+    def grayscale(self, array: np.ndarray) -> np.ndarray:
+        """ Convert to grayscale into the grayscale stage buffer (see to_grayscale). """
+        return to_grayscale(array, out=self.scratch("grayscale", array.shape[:2], array.dtype))
+    
+    def resize(self, array: np.ndarray, dsize: Tuple[int, int], interpolation: Optional[int] = None) -> np.ndarray:
+        """ Resize into the resize stage buffer (see resize). """
+        shape = (int(dsize[1]), int(dsize[0])) + array.shape[2:]
+        return resize(array, dsize, out=self.scratch("resize", shape, array.dtype), 
+                      interpolation=interpolation)
+    
+    def colorize(self, array: np.ndarray, cmap: str) -> np.ndarray:
+        """ Apply a colormap into the next display buffer. """
+        return apply_cmap(array, cmap, out=self.buffer(array.shape[:2] + (3,)))
+    
+    def window(self, array: np.ndarray, low: Optional[int] = None, high: Optional[int] = None) -> np.ndarray:
+        """ Apply a window/level into the next display buffer (see apply_window_level). """
+        return apply_window_level(array, low, high, out=self.buffer(array.shape[:2]))
+    
+    def to_qimage(self, array: np.ndarray, cmap: Optional[str] = None) -> QImage:
+        """
+        Wrap an array in a QImage without copying it, if possible.
+
+        Parameters
+        ----------
+        array : np.ndarray
+            RGB888 image, or grayscale image if cmap is provided.
+        cmap : Optional[str], optional
+            Colormap used as the color table of a grayscale (Indexed8) image.
+            The default is None.
+
+        Returns
+        -------
+        QImage
+            QImage that references the array.
+
+        """
+        if cmap is not None and array.dtype != np.uint8:
+            array = normalize(array, out=self.buffer(array.shape[:2]))
+        
+        # Copy into a display buffer if the array is not C-contiguous
+        if not array.flags.c_contiguous:
+            buffer = self.buffer(array.shape, array.dtype)
+            buffer[...] = array
+            array = buffer
+            self.copies += 1
+            
+        # Wrap the array
+        h, w = array.shape[0:2]
+        if cmap is not None:
+            image = QImage(array.data, w, h, array.strides[0], QImage.Format_Indexed8)
+            image.setColorTable(get_cmap_color_table(cmap))
+        else:
+            image = QImage(array.data, w, h, array.strides[0], QImage.Format_RGB888)
+            
+        # The QImage does not own its data, so keep a reference to the array
+        image.ndarray = array
+        return image
+    
+    def to_qpixmap(self, array: np.ndarray, cmap: Optional[str] = None) -> QPixmap:
+        """ Convert an array to a QPixmap (see to_qimage). """
+        pixmap = QPixmap(self.to_qimage(array, cmap))
+        
+        # Qt copies (and converts) the image into the pixmap
+        self.copies += 1
+        self.frames += 1
+        return pixmap
+
 def column_to_image(column: Union[np.ndarray, list]) -> np.ndarray:
     # Convert column to ndarray
     column = np.array(column)
@@ -118,15 +539,22 @@ def extend_image(image: np.ndarray, new_col: np.ndarray) -> np.ndarray:
     
     return np.append(image, column_to_image(new_col), axis=1)
 
+@lru_cache(maxsize=None)
+def _valid_colormaps() -> Tuple[str, ...]:
+    # NOTE: mpl.pyplot only exists once pyplot has been imported somewhere
+    import matplotlib.pyplot
+    return tuple(mpl.pyplot.colormaps())
+
 def get_valid_colormaps() -> List[str]:
-    return mpl.pyplot.colormaps()
+    """ Names of all matplotlib colormaps (looked up once). """
+    return list(_valid_colormaps())
 
 
 if __name__ == "__main__":
     
     import time
     
-    from FRHEED.utils import sample_array
+    from frheed.utils import sample_array
     
     class NormTests:
         def norm_0(arr: np.ndarray) -> np.ndarray:
@@ -145,6 +573,36 @@ if __name__ == "__main__":
             arr = 255 * (arr.astype(np.float32, copy=False) / info.max)
             arr = arr.astype(np.uint8, copy=False)
             return arr
+        
+    class CmapTests:
+        def cmap_0(arr: np.ndarray, cmap: str) -> np.ndarray:
+            # Previous path, rebuilds the lookup table on every call
+            # ~3.3 ms per loop (2048 x 1536 uint8, 100 loops)
+            return cmapy.colorize(arr, cmap, rgb_order=True)
+        
+        def cmap_1(arr: np.ndarray, cmap: str, out: np.ndarray) -> np.ndarray:
+            # Cached lookup table and reusable output buffer
+            # ~3.3 ms per loop (2048 x 1536 uint8, 100 loops), since the
+            # lookup itself dominates at this size. The cached table saves
+            # ~20 µs per call, ~12% of a 256 x 500 line scan update.
+            return apply_cmap(arr, cmap, out=out)
+        
+        def cmap_2(arr: np.ndarray, cmap: str, out: np.ndarray) -> np.ndarray:
+            # Fancy indexing into the output buffer is much slower than cv2
+            # ~17 ms per loop (2048 x 1536 uint8, 100 loops)
+            return np.take(get_cmap_lut(cmap)[:, 0], arr, axis=0, out=out)
+        
+        def run(n: int = 100, cmap: str = "Spectral") -> None:
+            arr = sample_array(channels=1, dtype="uint8")
+            out = np.empty(arr.shape + (3,), dtype=np.uint8)
+            for func, args in ((CmapTests.cmap_0, ()), 
+                               (CmapTests.cmap_1, (out,)), 
+                               (CmapTests.cmap_2, (out,))):
+                t0 = time.perf_counter()
+                for _ in range(n):
+                    mapped = func(arr, cmap, *args)
+                dt = (time.perf_counter() - t0) / n
+                print(f"{func.__name__}: {dt * 1e3:.2f} ms per loop")
     
     c = 1
     # arr_uint8 = sample_array(channels=c, dtype="uint8")
@@ -160,4 +618,125 @@ if __name__ == "__main__":
     mapped = apply_cmap(normed, cmap)
     print(f"Applied colormap in {time.time()-t0:.5f} seconds")
     
+    CmapTests.run()
+    
+    def present_tests(n: int = 50, cmap: str = "Spectral") -> None:
+        """ Compare the previous show_frame conversions to FramePresenter. """
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication([])
+        frame = sample_array(channels=1, dtype="uint8")
+        
+        # Previous path: apply_cmap, copy of the frame, copy in 
+        # ndarray_to_qimage and conversion to QPixmap (3 copies)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            mapped = cmapy.colorize(frame, cmap, rgb_order=True)
+            stored = mapped.copy()
+            qimage = QImage(mapped.copy().data, mapped.shape[1], mapped.shape[0], 
+                            mapped.strides[0], QImage.Format_RGB888)
+            QPixmap(qimage)
+        print(f"Previous path: {(time.perf_counter() - t0) / n * 1e3:.2f} ms/frame, "
+              "3.00 copies/frame")
+        
+        for mode in ("rgb", "indexed"):
+            presenter = FramePresenter()
+            t0 = time.perf_counter()
+            for _ in range(n):
+                if mode == "rgb":
+                    presenter.to_qpixmap(presenter.colorize(frame, cmap))
+                else:
+                    presenter.to_qpixmap(frame, cmap)
+            print(f"FramePresenter ({mode}): {(time.perf_counter() - t0) / n * 1e3:.2f} "
+                  f"ms/frame, {presenter.copies_per_frame:.2f} copies/frame")
+    
+    present_tests()
+    
+    def window_tests(n: int = 50, cmap: str = "Spectral") -> None:
+        """ Compare normalize to the window/level path for 12-bit frames. """
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication([])
+        frame = (sample_array(channels=1, dtype="float32") * 16).astype(np.uint16)
+        low, high = 100, 3500
+        
+        # Conversion to uint8 only
+        lut = window_level_lut(low, high)
+        out = np.empty(frame.shape, dtype=np.uint8)
+        for name, func in (("normalize", lambda: normalize(frame)),
+                           ("np.take(lut)", lambda: np.take(lut, frame, out=out)),
+                           ("apply_window_level", lambda: apply_window_level(frame, low, high, out))):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                func()
+            print(f"{name}: {(time.perf_counter() - t0) / n * 1e3:.2f} ms per loop")
+        
+        # Including the conversion to an Indexed8 QPixmap
+        presenter = FramePresenter()
+        for name, func in (("normalize", lambda: presenter.to_qpixmap(frame, cmap)),
+                           ("window path", lambda: presenter.to_qpixmap(
+                               presenter.window(frame, low, high), cmap))):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                func()
+            print(f"uint16 -> display ({name}): {(time.perf_counter() - t0) / n * 1e3:.2f} ms/frame")
+    
+    window_tests()
+    
+    def normalize_tests(n: int = 50) -> None:
+        """ Compare the integer and float normalize paths. """
+        frame = (sample_array(channels=1, dtype="float32") * 16).astype(np.uint16)
+        frame_float32 = frame.astype(np.float32)
+        out = np.empty(frame.shape, dtype=np.uint8)
+        
+        # Previous float path (truncates, so results differ by at most 1)
+        def float_path(arr: np.ndarray) -> np.ndarray:
+            arr = arr.astype(np.float32, copy=True)
+            arr *= 255 / arr.max()
+            return arr.astype(np.uint8, copy=True)
+        
+        # Percentiles on the subsampled grid are close to the full image
+        full = np.percentile(frame, (1, 99))
+        sub = contrast_limits(frame, (1, 99))
+        print(f"Percentiles (1, 99): full image {full}, every {PERCENTILE_STEP}th pixel {sub}")
+        
+        for name, func in (("uint16 (float path)", lambda: float_path(frame)),
+                           ("uint16 (integer path)", lambda: normalize(frame, out)),
+                           ("uint16, percentiles=(1, 99)", 
+                            lambda: normalize(frame, out, percentiles=(1, 99))),
+                           ("float32", lambda: normalize(frame_float32, out))):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                func()
+            print(f"normalize {name}: {(time.perf_counter() - t0) / n * 1e3:.2f} ms per loop")
+    
+    normalize_tests()
+    
+    def resize_tests(n: int = 50, shape: Tuple[int, int] = (1080, 1920)) -> None:
+        """ Per-stage timing of the previous and current live view resizing. """
+        frame = cv2.merge([sample_array(channels=1, dtype="uint8")] * 3)
+        frame = cv2.resize(frame, shape[::-1])
+        presenter = FramePresenter()
+        
+        def timed(func, *args) -> Tuple[np.ndarray, float]:
+            t0 = time.perf_counter()
+            for _ in range(n):
+                result = func(*args)
+            return result, (time.perf_counter() - t0) / n * 1e3
+        
+        for zoom in (0.5, 1., 1.5):
+            dsize = (int(shape[1] * zoom), int(shape[0] * zoom))
+            
+            # Previous: cubic resize of the color frame, then grayscale
+            resized, t_resize = timed(cv2.resize, frame, dsize, None, 0, 0, cv2.INTER_CUBIC)
+            _, t_gray = timed(to_grayscale, resized)
+            print(f"zoom {zoom:.1f} previous: resize {t_resize:.2f} ms + grayscale "
+                  f"{t_gray:.2f} ms = {t_resize + t_gray:.2f} ms")
+            
+            # Current: grayscale, then area/linear resize into stage buffers
+            gray, t_gray = timed(presenter.grayscale, frame)
+            _, t_resize = timed(presenter.resize, gray, dsize)
+            print(f"zoom {zoom:.1f} current:  grayscale {t_gray:.2f} ms + resize "
+                  f"{t_resize:.2f} ms = {t_resize + t_gray:.2f} ms")
+    
+    resize_tests()
+    
     print(get_valid_colormaps())
@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+"""
+Regions of interest (ROIs) and the pixel masks used to analyze them.
+"""
+
+from typing import Optional, Sequence, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import cv2
+
+
+# (x1, y1, x2, y2) with inclusive end coordinates, like QRect.getCoords()
+Coords = Tuple[int, int, int, int]
+
+# Kinds of regions that masks can be generated for
+REGION_KINDS = ("rectangle", "ellipse", "line")
+
+# Maximum number of region masks to keep in memory (see Region.mask)
+MASK_CACHE_SIZE = 64
+
+# Statistics computed for each region by RegionAnalyzer
+STATS_DTYPE = np.dtype([
+    ("sum",     np.float64),
+    ("mean",    np.float64),
+    ("min",     np.float64),
+    ("max",     np.float64),
+    ("count",   np.int64),
+    ])
+
+# Rectangles are summed from an integral image when they cover at least this 
+# fraction of the frame, since computing the integral image touches every
+# pixel once while gathering the rectangles touches each of their pixels
+INTEGRAL_IMAGE_FRACTION = 0.25
+
+
+class RegionMask:
+    """
+    The pixels of a region within a frame, stored as a bounding box plus
+    either a small boolean mask local to the bounding box (ellipses), a list
+    of pixel coordinates (lines) or nothing at all (rectangles, where the
+    bounding box is the region). Extracting the region from a frame only
+    touches the pixels inside the bounding box instead of the full frame.
+    """
+
+    __slots__ = ("frame_shape", "rows", "cols", "local", "points", "key", "_count")
+
+    def __init__(
+            self,
+            frame_shape: Tuple[int, int],
+            rows: slice,
+            cols: slice,
+            local: Optional[np.ndarray] = None,
+            points: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+            key: Optional[tuple] = None
+            ):
+        """
+        Parameters
+        ----------
+        frame_shape : Tuple[int, int]
+            (height, width) of the frames this mask applies to.
+        rows : slice
+            Rows of the bounding box.
+        cols : slice
+            Columns of the bounding box.
+        local : Optional[np.ndarray], optional
+            Boolean mask with the shape of the bounding box. If the default
+            of None is used, every pixel in the bounding box is included.
+        points : Optional[Tuple[np.ndarray, np.ndarray]], optional
+            (rows, cols) arrays of pixel coordinates in the frame. Takes
+            precedence over 'local' if provided.
+        key : Optional[tuple], optional
+            Geometry the mask was generated from, used for caching.
+        """
+        self.frame_shape = tuple(frame_shape[:2])
+        self.rows = rows
+        self.cols = cols
+        self.local = local
+        self.points = points
+        self.key = key
+        self._count = None
+
+    @property
+    def is_box(self) -> bool:
+        """ Whether the region is its entire bounding box (rectangles). """
+        return self.points is None and self.local is None
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        """ (row start, col start, row stop, col stop) of the bounding box. """
+        return (self.rows.start, self.cols.start, self.rows.stop, self.cols.stop)
+
+    @property
+    def bbox_shape(self) -> Tuple[int, int]:
+        """ (height, width) of the bounding box. """
+        return (self.rows.stop - self.rows.start, self.cols.stop - self.cols.start)
+
+    @property
+    def count(self) -> int:
+        """ Number of pixels in the region. """
+        if self._count is None:
+            if self.points is not None:
+                self._count = int(self.points[0].size)
+            elif self.local is not None:
+                self._count = int(np.count_nonzero(self.local))
+            else:
+                h, w = self.bbox_shape
+                self._count = max(h, 0) * max(w, 0)
+        return self._count
+
+    @property
+    def indices(self) -> np.ndarray:
+        """ Flat (row-major) indices of the region pixels in the frame. """
+        return np.ravel_multi_index(self.coordinates, self.frame_shape)
+
+    @property
+    def coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (rows, cols) arrays of the region pixels in row-major order. """
+        if self.points is not None:
+            return self.points
+        if self.local is not None:
+            ys, xs = np.nonzero(self.local)
+        else:
+            ys, xs = np.nonzero(np.ones(self.bbox_shape, dtype=bool))
+        return (ys + self.rows.start, xs + self.cols.start)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """ Zero-copy view of the bounding box of a frame. """
+        return frame[self.rows, self.cols]
+
+    def extract(self, frame: np.ndarray) -> np.ndarray:
+        """ Get the region pixels as a 1D array (same order as frame[mask]). """
+        if self.points is not None:
+            return frame[self.points]
+        elif self.local is not None:
+            return frame[self.rows, self.cols][self.local]
+        else:
+            return frame[self.rows, self.cols].ravel()
+
+    def sum(self, frame: np.ndarray) -> float:
+        """ Sum of the region pixels. """
+        if self.is_box:
+            return frame[self.rows, self.cols].sum()
+        return self.extract(frame).sum()
+
+    def to_full(self) -> np.ndarray:
+        """ Get a boolean mask with the shape of the full frame. """
+        mask = np.zeros(self.frame_shape, dtype=bool)
+        if self.points is not None:
+            mask[self.points] = True
+        elif self.local is not None:
+            mask[self.rows, self.cols] = self.local
+        else:
+            mask[self.rows, self.cols] = True
+        return mask
+
+
+def _clip(start: int, stop: int, size: int) -> slice:
+    """ Clip a slice to [0, size) and make sure start <= stop. """
+    start = min(max(int(start), 0), size)
+    stop = min(max(int(stop), start), size)
+    return slice(start, stop)
+
+
+def rectangle_mask(coords: Coords, frame_shape: Tuple[int, int]) -> RegionMask:
+    """ Mask of the pixels inside a rectangle. """
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = coords
+    rows = _clip(y1, y2 + 1, height)
+    cols = _clip(x1, x2 + 1, width)
+    return RegionMask(frame_shape, rows, cols, key=("rectangle", coords, frame_shape))
+
+
+def ellipse_mask(coords: Coords, frame_shape: Tuple[int, int]) -> RegionMask:
+    """
+    Mask of the pixels inside an ellipse inscribed in a rectangle.
+    https://stackoverflow.com/a/44874588/10342097
+    """
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = coords
+
+    # Get the center (same as QRect.center()) and horizontal/vertical radii
+    h, k = int((x1 + x2) / 2), int((y1 + y2) / 2)
+    a = max(abs(x2 - x1) / 2, 1)  # avoid divide by 0
+    b = max(abs(y2 - y1) / 2, 1)  # avoid divide by 0
+
+    # Only pixels within the radii of the center can be inside the ellipse
+    rows = _clip(np.floor(k - b), np.floor(k + b) + 1, height)
+    cols = _clip(np.floor(h - a), np.floor(h + a) + 1, width)
+
+    # Equation for ellipse: ((x - h)^2 / a^2) + ((y - k)^2 / b^2) = 1
+    Y, X = np.ogrid[rows, cols]
+    local = ((((X - h)**2 / (a**2)) + ((Y - k)**2 / (b**2))) <= 1)
+    return RegionMask(frame_shape, rows, cols, local=local,
+                      key=("ellipse", coords, frame_shape))
+
+
+def line_mask(coords: Coords, frame_shape: Tuple[int, int]) -> RegionMask:
+    """ Mask of the pixels along a line, one pixel per step along its major axis. """
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = coords
+
+    # Sample the line once per pixel along the longest dimension
+    num = max(abs(x2 - x1), abs(y2 - y1)) + 1
+    xs = np.clip(np.rint(np.linspace(x1, x2, num)), 0, max(width - 1, 0)).astype(np.intp)
+    ys = np.clip(np.rint(np.linspace(y1, y2, num)), 0, max(height - 1, 0)).astype(np.intp)
+
+    # Sort the pixels in row-major order (same as indexing with a full mask)
+    flat = np.unique(ys * max(width, 1) + xs)
+    ys, xs = np.divmod(flat, max(width, 1))
+
+    rows = _clip(ys.min(), ys.max() + 1, height)
+    cols = _clip(xs.min(), xs.max() + 1, width)
+    return RegionMask(frame_shape, rows, cols, points=(ys, xs),
+                      key=("line", coords, frame_shape))
+
+
+def get_region_mask(
+        kind: str,
+        coords: Coords,
+        frame_shape: Tuple[int, int]
+        ) -> RegionMask:
+    """ Generate the mask of a "rectangle", "ellipse" or "line" region. """
+    frame_shape = tuple(int(n) for n in frame_shape[:2])
+    coords = tuple(int(c) for c in coords)
+    if kind == "rectangle":
+        return rectangle_mask(coords, frame_shape)
+    elif kind == "ellipse":
+        return ellipse_mask(coords, frame_shape)
+    elif kind == "line":
+        return line_mask(coords, frame_shape)
+    raise ValueError(f"Unknown region type '{kind}'")
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _cached_region_mask(kind: str, coords: Coords, frame_shape: Tuple[int, int]) -> RegionMask:
+    return get_region_mask(kind, coords, frame_shape)
+
+
+@dataclass(frozen=True)
+class Region:
+    """
+    A region of interest as plain data: a name (e.g. the color it is 
+    plotted in), its kind and its coordinates in the pixels of the raw 
+    camera frame. Unlike the canvas shapes, regions do not depend on Qt, so
+    they can be used to analyze frames without a GUI (see frheed.engine).
+    """
+    name: str
+    kind: str
+    coords: Coords
+
+    def __post_init__(self):
+        if self.kind not in REGION_KINDS:
+            raise ValueError(f"Unknown region type '{self.kind}'")
+        object.__setattr__(self, "coords", tuple(int(c) for c in self.coords))
+
+    def mask(self, frame_shape: Tuple[int, ...]) -> RegionMask:
+        """ Mask of the region in a frame (cached, see MASK_CACHE_SIZE). """
+        return _cached_region_mask(self.kind, self.coords, tuple(int(n) for n in frame_shape[:2]))
+
+
+class IntegralImage:
+    """
+    Summed-area table of a frame, which gives the sum of any box of pixels
+    in O(1) regardless of its size.
+    """
+    
+    def __init__(self, frame: np.ndarray):
+        """
+        Parameters
+        ----------
+        frame : np.ndarray
+            Single-channel frame to integrate.
+        """
+        frame = np.ascontiguousarray(frame)
+        
+        # 32-bit sums are faster but can only be used if they cannot overflow
+        if frame.dtype == np.uint8 and frame.size * 255 < 2 ** 31:
+            sdepth = cv2.CV_32S
+        else:
+            sdepth = cv2.CV_64F
+        
+        # table[r, c] is the sum of frame[:r, :c]
+        self.table = cv2.integral(frame, sdepth=sdepth)
+        
+    @property
+    def frame_shape(self) -> Tuple[int, int]:
+        return (self.table.shape[0] - 1, self.table.shape[1] - 1)
+        
+    def box_sum(self, rows: slice, cols: slice) -> float:
+        """ Sum of frame[rows, cols] for slices without a step. """
+        r0, r1, _ = rows.indices(self.frame_shape[0])
+        c0, c1, _ = cols.indices(self.frame_shape[1])
+        r1, c1 = max(r0, r1), max(c0, c1)
+        t = self.table
+        return float(t[r1, c1]) - float(t[r0, c1]) - float(t[r1, c0]) + float(t[r0, c0])
+    
+    def box_sums(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        Sums of many boxes at once.
+
+        Parameters
+        ----------
+        boxes : np.ndarray
+            (N x 4) array of (row start, col start, row stop, col stop) for 
+            each box, with exclusive stops like RegionMask.bbox.
+
+        Returns
+        -------
+        np.ndarray
+            float64 array of N box sums.
+
+        """
+        boxes = np.asarray(boxes, dtype=np.intp).reshape(-1, 4)
+        r0, c0, r1, c1 = boxes.T
+        t = self.table
+        return (t[r1, c1].astype(np.float64) - t[r0, c1] - t[r1, c0] + t[r0, c0])
+
+
+class RegionAnalyzer:
+    """
+    Computes statistics of many regions in a single vectorized pass.
+    
+    The flat pixel indices of all regions are concatenated into one index
+    array (with the offset of each region), which is only rebuilt when the
+    geometry of a region changes. Each frame is then analyzed with a single
+    gather of the region pixels followed by np.add/minimum/maximum.reduceat,
+    instead of one masked reduction per region. Unlike a label image, this 
+    also handles overlapping regions.
+    
+    If extrema are not needed and the rectangles cover a large part of the
+    frame (see INTEGRAL_IMAGE_FRACTION), the rectangles are instead summed 
+    from an IntegralImage of the frame.
+    """
+    
+    def __init__(self):
+        self._key: Optional[tuple] = None
+        self._counts = np.empty(0, dtype=np.int64)
+        self._integral = False
+        
+        # Regions whose pixels are gathered
+        self._gather = np.empty(0, dtype=np.intp)
+        self._indices = np.empty(0, dtype=np.intp)
+        self._offsets = np.empty(0, dtype=np.intp)
+        
+        # Regions that are summed from an integral image
+        self._box_regions = np.empty(0, dtype=np.intp)
+        self._boxes = np.empty((0, 4), dtype=np.intp)
+        
+    @property
+    def counts(self) -> np.ndarray:
+        """ Number of pixels in each region. """
+        return self._counts
+    
+    @property
+    def uses_integral_image(self) -> bool:
+        """ Whether rectangles are summed from an integral image. """
+        return self._integral
+        
+    def update(self, masks: Sequence[RegionMask], extrema: bool = True) -> None:
+        """ Rebuild the index arrays if the regions have changed. """
+        key = (extrema,) + tuple(mask.key for mask in masks)
+        if key == self._key and None not in key:
+            return
+        self._counts = np.array([mask.count for mask in masks], dtype=np.int64)
+        
+        # Use the integral image if the rectangles are large enough
+        boxes = [i for i, mask in enumerate(masks) if mask.is_box]
+        frame_size = np.prod(masks[0].frame_shape) if masks else 0
+        box_pixels = self._counts[boxes].sum() if boxes else 0
+        self._integral = (not extrema and bool(boxes) 
+                          and box_pixels >= INTEGRAL_IMAGE_FRACTION * frame_size)
+        if self._integral:
+            self._box_regions = np.array(boxes, dtype=np.intp)
+            self._boxes = np.array([masks[i].bbox for i in boxes], dtype=np.intp)
+            gather = [i for i in range(len(masks)) if not masks[i].is_box]
+        else:
+            gather = list(range(len(masks)))
+        
+        # Concatenate the flat indices of every other region
+        self._gather = np.array(gather, dtype=np.intp)
+        self._offsets = np.zeros(len(gather), dtype=np.intp)
+        np.cumsum(self._counts[self._gather][:-1], out=self._offsets[1:])
+        indices = [masks[i].indices for i in gather]
+        self._indices = (np.concatenate(indices).astype(np.intp, copy=False)
+                         if indices else np.empty(0, dtype=np.intp))
+        self._key = key
+        
+    def analyze(
+            self, 
+            frame: np.ndarray, 
+            masks: Sequence[RegionMask], 
+            extrema: bool = True
+            ) -> np.ndarray:
+        """
+        Compute the statistics of each region in a frame.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Single-channel frame to analyze.
+        masks : Sequence[RegionMask]
+            Masks of the regions, which must match the frame shape.
+        extrema : bool, optional
+            Whether to compute the min and max of each region. If False, 
+            the extrema are NaN and rectangles may be summed from an 
+            integral image. The default is True.
+
+        Returns
+        -------
+        np.ndarray
+            Structured array with dtype STATS_DTYPE and one entry per region.
+            Regions without any pixels have a count of 0 and NaN statistics.
+
+        """
+        self.update(masks, extrema)
+        stats = np.empty(len(masks), dtype=STATS_DTYPE)
+        stats["count"] = self._counts
+        for name in ("sum", "mean", "min", "max"):
+            stats[name] = np.nan
+            
+        # Sum the rectangles from the integral image
+        if self._integral:
+            sums = IntegralImage(frame).box_sums(self._boxes)
+            counts = self._counts[self._box_regions]
+            nonempty = self._box_regions[counts > 0]
+            stats["sum"][nonempty] = sums[counts > 0]
+            stats["mean"][nonempty] = sums[counts > 0] / counts[counts > 0]
+        
+        # Empty regions would break reduceat, so only reduce the others
+        counts = self._counts[self._gather]
+        nonempty = self._gather[counts > 0]
+        if nonempty.size == 0:
+            return stats
+        offsets = self._offsets[counts > 0]
+        
+        # Gather the pixels of every region at once
+        pixels = np.take(frame.reshape(-1), self._indices)
+        
+        # Reduce each region
+        sums = np.add.reduceat(pixels, offsets, dtype=np.float64)
+        stats["sum"][nonempty] = sums
+        stats["mean"][nonempty] = sums / self._counts[nonempty]
+        if extrema:
+            stats["min"][nonempty] = np.minimum.reduceat(pixels, offsets)
+            stats["max"][nonempty] = np.maximum.reduceat(pixels, offsets)
+        return stats
+
+
+if __name__ == "__main__":
+
+    import time
+
+    def full_frame_mask(kind: str, coords: Coords, shape: Tuple[int, int]) -> np.ndarray:
+        """ Full-frame masks as previously computed by CanvasShape.mask """
+        height, width = shape
+        x1, y1, x2, y2 = coords
+        if kind == "rectangle":
+            mask = np.full((height, width), False, dtype=bool)
+            mask[y1:y2+1, x1:x2+1] = True
+        else:
+            h, k = int((x1 + x2) / 2), int((y1 + y2) / 2)
+            a, b = max(abs(x2 - x1) / 2, 1), max(abs(y2 - y1) / 2, 1)
+            Y, X = np.ogrid[:height, :width]
+            mask = ((((X - h)**2 / (a**2)) + ((Y - k)**2 / (b**2))) <= 1)
+        return mask
+
+    def benchmark(shape: Tuple[int, int] = (1536, 2048), n: int = 50) -> None:
+        frame = (np.random.rand(*shape) * 255).astype(np.uint8)
+        coords = (400, 300, 600, 450)
+        for kind in ("rectangle", "ellipse"):
+            t0 = time.perf_counter()
+            for _ in range(n):
+                mask = full_frame_mask(kind, coords, shape)
+                expected = frame[mask].sum()
+            t_full = (time.perf_counter() - t0) / n
+
+            region = get_region_mask(kind, coords, shape)
+            t0 = time.perf_counter()
+            for _ in range(n):
+                result = region.sum(frame)
+            t_cached = (time.perf_counter() - t0) / n
+            print(f"{kind:>9}: full-frame mask {t_full * 1e3:7.3f} ms, "
+                  f"cached bounding box {t_cached * 1e3:7.3f} ms")
+
+    def benchmark_multi(shape: Tuple[int, int] = (1536, 2048), n: int = 20) -> None:
+        """ Compare RegionAnalyzer with a loop over regions for 1-50 regions. """
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, shape, dtype=np.uint8)
+        height, width = shape
+        for num_regions in (1, 5, 10, 20, 50):
+            masks = []
+            for i in range(num_regions):
+                x1, y1 = rng.integers(0, width - 100), rng.integers(0, height - 100)
+                x2, y2 = x1 + rng.integers(10, 100), y1 + rng.integers(10, 100)
+                kind = ("rectangle", "ellipse")[i % 2]
+                masks.append(get_region_mask(kind, (x1, y1, x2, y2), shape))
+            
+            # Loop over the regions (full-frame masks are created once)
+            full_masks = [mask.to_full() for mask in masks]
+            t0 = time.perf_counter()
+            for _ in range(n):
+                expected = [(frame[m].sum(), frame[m].mean(), frame[m].min(), 
+                             frame[m].max(), m.sum()) for m in full_masks]
+            t_loop = (time.perf_counter() - t0) / n
+            
+            # Single pass over all regions
+            analyzer = RegionAnalyzer()
+            t0 = time.perf_counter()
+            for _ in range(n):
+                stats = analyzer.analyze(frame, masks)
+            t_multi = (time.perf_counter() - t0) / n
+            print(f"{num_regions:>3} regions: loop {t_loop * 1e3:7.3f} ms, "
+                  f"RegionAnalyzer {t_multi * 1e3:7.3f} ms")
+
+    def integral_tests(shape: Tuple[int, int] = (1536, 2048), n: int = 20) -> None:
+        """ Time the integral image against the gathered sums. """
+        rng = np.random.default_rng(1)
+        height, width = shape
+        
+        # Many rectangles select the integral image automatically
+        frame = rng.integers(0, 256, shape, dtype=np.uint8)
+        masks = []
+        for i in range(30):
+            x1, y1 = rng.integers(0, width - 300), rng.integers(0, height - 300)
+            kind = "ellipse" if i % 10 == 0 else "rectangle"
+            masks.append(get_region_mask(kind, (x1, y1, x1 + 250, y1 + 250), shape))
+        masks.append(get_region_mask("rectangle", (width, height, width, height), shape))
+        analyzer = RegionAnalyzer()
+        t0 = time.perf_counter()
+        for _ in range(n):
+            analyzer.analyze(frame, masks, extrema=False)
+        t_integral = (time.perf_counter() - t0) / n
+        
+        t0 = time.perf_counter()
+        for _ in range(n):
+            analyzer.analyze(frame, masks, extrema=True)
+        t_gather = (time.perf_counter() - t0) / n
+        
+        print(f"{len(masks)} regions: integral image {t_integral * 1e3:7.3f} ms, "
+              f"gather {t_gather * 1e3:7.3f} ms")
+
+    benchmark()
+    benchmark_multi()
+    integral_tests()
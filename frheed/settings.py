@@ -3,3 +3,50 @@
 # PyQt window styling
 APP_STYLE = "Fusion"  # Options are 'windowsvista', 'Windows', or 'Fusion'
 
+# Approximate memory limit (in bytes) for stored region data. Once it is
+# exceeded, the oldest samples are discarded. Use None to keep everything.
+DATA_MEMORY_LIMIT = 1024 ** 3
+
+# Maximum refresh rate (in Hz) of the live camera view. Frames that arrive
+# faster are still analyzed but not displayed. Use None for the monitor rate.
+DISPLAY_RATE = 30
+
+# Number of camera frames kept in memory for display and analysis. Frames that
+# are not analyzed before this many newer frames arrive are skipped.
+FRAME_RING_SLOTS = 16
+
+# Stream buffer settings of FLIR cameras. "OldestFirst" returns every frame unless
+# the buffers overflow, "NewestOnly" always returns the newest frame. Use None
+# for the number of buffers to keep the driver default.
+FLIR_BUFFER_HANDLING_MODE = "OldestFirst"
+FLIR_BUFFER_COUNT = 10
+
+# Run the camera in a separate process that passes frames through shared memory,
+# so acquisition is not slowed down by the display and analysis. Camera settings
+# cannot be edited from the GUI while the camera runs in a separate process.
+ACQUISITION_PROCESS = False
+
+# Show a simulated RHEED camera in the camera selection, for testing and
+# benchmarking without camera hardware.
+SIMULATED_CAMERA = False
+
+# Range of camera values (low, high) shown from black to white in the live
+# view. Use None to scale every frame from 0 to its maximum value.
+DISPLAY_WINDOW = None
+
+# Pixel format of GigE cameras, "Mono8", "Mono12" or "Mono16"
+GIGE_PIXEL_FORMAT = "Mono12"
+
+# Record how long each stage of the pipeline takes (acquisition, display,
+# analysis, plotting, saving). The statistics are shown in the tooltip of the
+# camera status bar and can be saved from the "File" menu. Timing can also be
+# switched on from the "View" menu.
+STAGE_TIMING = False
+
+# Also store the minimum and maximum of area regions. Large rectangles can then
+# no longer be summed from an integral image, so the analysis is slower.
+REGION_EXTREMA = False
+
+# Replay recordings opened from the GUI at the recorded frame rate. Otherwise
+# they are replayed as fast as they can be analyzed.
+REPLAY_REALTIME = True
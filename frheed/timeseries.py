@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar storage for region intensity time series.
+"""
+
+from typing import Dict, Iterator, Optional, Tuple, Union
+import threading
+
+import numpy as np
+
+from frheed.buffers import LineScanBuffer
+
+
+# Scalar values stored for every region
+FIELDS = ("average", "sum")
+
+# Additional values stored for every region if extrema are enabled
+EXTREMA_FIELDS = ("min", "max")
+
+# Number of samples allocated when a store is first created
+_INITIAL_CAPACITY = 1024
+
+# Fraction of the memory cap that is kept after trimming old samples
+_TRIM_FRACTION = 0.75
+
+
+class TimeSeriesStore:
+    """
+    Time series of region data backed by growable float64 arrays.
+
+    Every call to append() adds one sample (row) to a time column that is
+    shared by all regions. Each region has one float64 column per field
+    (FIELDS by default), starting at the row where the region first
+    appeared, and line regions additionally keep a 2D block of their
+    profiles (one row per sample) in a LineScanBuffer. If the length of the
+    profiles changes, the line region restarts at that sample. Arrays grow
+    by doubling, so appending is O(1) amortized, and all accessors return
+    zero-copy views that stay valid after later appends.
+
+    If max_bytes is given, the oldest samples are discarded once the stored
+    data exceeds that many bytes, so long acquisitions have a bounded
+    memory footprint and constant per-frame cost.
+
+    Regions can be added and removed (e.g. from the GUI thread) while 
+    samples are appended by the analysis thread. Changes to the set of 
+    regions are serialized with a lock.
+
+    """
+
+    def __init__(
+            self,
+            max_bytes: Optional[int] = None,
+            capacity: int = _INITIAL_CAPACITY,
+            fields: Tuple[str, ...] = FIELDS
+            ):
+        """
+        Parameters
+        ----------
+        max_bytes : Optional[int], optional
+            Approximate upper limit on the memory used by stored samples.
+            If the default of None is used, samples are never discarded.
+        capacity : int, optional
+            Number of samples to preallocate. The default is 1024.
+        fields : Tuple[str, ...], optional
+            Scalar values stored for every region. The default is FIELDS.
+        """
+        self.max_bytes = max_bytes
+        self.fields = tuple(fields)
+        self._lock = threading.RLock()
+        self._reset(capacity)
+
+    def _reset(self, capacity: int) -> None:
+        self._capacity = max(int(capacity), 1)
+        self._length = 0
+        self._time = np.empty(self._capacity, dtype=np.float64)
+        self._columns: Dict[str, Dict[str, np.ndarray]] = {}
+        self._regions: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._regions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._regions))
+
+    def __bool__(self) -> bool:
+        return bool(self._regions)
+
+    @property
+    def time(self) -> np.ndarray:
+        """ Shared time column for all samples. """
+        return self._time[:self._length]
+
+    @property
+    def regions(self) -> Tuple[str, ...]:
+        return tuple(self._regions)
+
+    @property
+    def row_nbytes(self) -> int:
+        """ Number of bytes used by a single sample across all columns. """
+        with self._lock:
+            nbytes = self._time.itemsize * (1 + len(self.fields) * len(self._regions))
+            for region in self._regions.values():
+                profile = region["profile"]
+                if profile is not None:
+                    nbytes += profile.nbytes // max(profile.capacity, 1)
+            return nbytes
+
+    @property
+    def nbytes(self) -> int:
+        """ Number of bytes currently allocated. """
+        with self._lock:
+            nbytes = self._time.nbytes
+            for name, columns in self._columns.items():
+                nbytes += sum(col.nbytes for col in columns.values())
+                profile = self._regions[name]["profile"]
+                nbytes += profile.nbytes if profile is not None else 0
+            return nbytes
+
+    def kind(self, name: str) -> str:
+        return self._regions[name]["kind"]
+
+    def start(self, name: str) -> int:
+        """ Index of the first sample that contains data for a region. """
+        return self._regions[name]["start"]
+
+    def get(self, name: str, field: str = "average") -> np.ndarray:
+        """ Zero-copy view of one field of a region. """
+        return self._columns[name][field][self.start(name):self._length]
+
+    def series(self, name: str, field: str = "average") -> Tuple[np.ndarray, np.ndarray]:
+        """ Get (time, values) views of one field of a region for plotting. """
+        start = self.start(name)
+        return (self._time[start:self._length],
+                self._columns[name][field][start:self._length])
+
+    def profiles(self, name: str) -> np.ndarray:
+        """ Zero-copy (samples x pixels) view of the line profiles of a region. """
+        profile = self._regions[name]["profile"]
+        if profile is None:
+            return np.empty((0, 0))
+        return profile.columns
+
+    def line_scan(self, name: str) -> Union[np.ndarray, None]:
+        """ Zero-copy line scan image (pixels x samples) of a line region. """
+        profile = self._regions[name]["profile"]
+        return None if profile is None else profile.image
+
+    def add_region(self, name: str, kind: str) -> None:
+        """ Start storing data for a region beginning at the next sample. """
+        with self._lock:
+            if name in self._regions:
+                return
+            self._regions[name] = {
+                "kind":     kind,
+                "start":    self._length,
+                "profile":  LineScanBuffer() if kind == "line" else None,
+                }
+            self._columns[name] = {
+                field: np.full(self._capacity, np.nan, dtype=np.float64) for field in self.fields
+                }
+
+    def remove_region(self, name: str) -> None:
+        with self._lock:
+            self._regions.pop(name, None)
+            self._columns.pop(name, None)
+
+    def pop(self, name: str, default: object = None) -> object:
+        """ Remove a region and return its last snapshot (dict-like API). """
+        with self._lock:
+            if name not in self._regions:
+                return default
+            data = self._region_snapshot(name)
+            self.remove_region(name)
+            return data
+
+    def clear(self) -> None:
+        """ Remove all regions and samples. """
+        with self._lock:
+            self._reset(_INITIAL_CAPACITY)
+
+    def append(self, t: float, regions: Dict[str, dict]) -> None:
+        """
+        Add a sample to the store.
+
+        Parameters
+        ----------
+        t : float
+            Time of the sample.
+        regions : Dict[str, dict]
+            Dictionary of {name: values} for each region in this sample.
+            The values are a dictionary containing "kind" and any of the
+            fields, plus "profile" for line regions. Regions not seen before
+            are added automatically. Missing fields are stored as NaN, and
+            missing profiles repeat the previous profile.
+
+        """
+        with self._lock:
+            self._append(t, regions)
+
+    def _append(self, t: float, regions: Dict[str, dict]) -> None:
+
+        # Register new regions
+        for name, values in regions.items():
+            if name not in self._regions:
+                self.add_region(name, values.get("kind", "rectangle"))
+
+        # Make room for the new sample
+        if self._length == self._capacity:
+            self._grow(2 * self._capacity)
+        row = self._length
+
+        # Store the values before the sample is made visible
+        self._time[row] = t
+        for name, columns in self._columns.items():
+            values = regions.get(name, {})
+            for field, column in columns.items():
+                column[row] = values.get(field, np.nan)
+
+            # Store line profiles
+            profile = self._regions[name]["profile"]
+            if profile is None:
+                continue
+            elif values.get("profile") is not None:
+
+                # A profile of a different length (e.g. the line was resized)
+                # restarts the line scan, so the region restarts with it
+                if profile.append(values["profile"]):
+                    self._regions[name]["start"] = row
+            elif profile.width:
+                profile.append(profile.last_column)
+            else:
+                # Region has no data yet, so it starts at the next sample
+                self._regions[name]["start"] = row + 1
+
+        self._length += 1
+
+        # Discard the oldest samples if the memory cap is exceeded
+        if self.max_bytes is not None:
+            max_rows = max(self.max_bytes // max(self.row_nbytes, 1), 1)
+            if self._length > max_rows:
+                self._trim(int(max_rows * _TRIM_FRACTION))
+
+    def trim(self, keep: int) -> None:
+        """ Discard the oldest samples so that at most 'keep' remain. """
+        with self._lock:
+            self._trim(keep)
+
+    def _trim(self, keep: int) -> None:
+        drop = self._length - max(int(keep), 0)
+        if drop <= 0:
+            return
+        keep = self._length - drop
+
+        # Copy into new arrays so views handed out earlier are not modified
+        time = np.empty_like(self._time)
+        time[:keep] = self._time[drop:self._length]
+        self._time = time
+        for name, columns in self._columns.items():
+            for field, column in columns.items():
+                new_column = np.full_like(column, np.nan)
+                new_column[:keep] = column[drop:self._length]
+                columns[field] = new_column
+
+            # Shift the start of each region
+            region = self._regions[name]
+            region["start"] = max(region["start"] - drop, 0)
+            if region["profile"] is not None:
+                region["profile"].trim(keep - region["start"])
+
+        self._length = keep
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Get the data of every region as a dictionary of views with keys
+        "time", "average", "sum", "y" (profiles), "image" (line scan)
+        and "kind". This is the format consumed by the plotting widgets.
+        """
+        with self._lock:
+            return {name: self._region_snapshot(name) for name in self._regions}
+
+    def _region_snapshot(self, name: str) -> dict:
+        start = self.start(name)
+        data = {"time": self._time[start:self._length]}
+        for field, column in self._columns[name].items():
+            data[field] = column[start:self._length]
+        data["y"] = self.profiles(name)
+        data["image"] = self.line_scan(name)
+        data["kind"] = self.kind(name)
+        return data
+
+    def _grow(self, capacity: int) -> None:
+        # Limit the allocation to the memory cap (plus the new sample)
+        if self.max_bytes is not None:
+            max_rows = max(self.max_bytes // max(self.row_nbytes, 1), 1)
+            capacity = max(min(capacity, max_rows + 1), self._length + 1)
+
+        # NOTE: The previous arrays are not modified, so views remain valid
+        time = np.empty(capacity, dtype=np.float64)
+        time[:self._length] = self._time[:self._length]
+        self._time = time
+        for columns in self._columns.values():
+            for field, column in columns.items():
+                new_column = np.full(capacity, np.nan, dtype=np.float64)
+                new_column[:self._length] = column[:self._length]
+                columns[field] = new_column
+        self._capacity = capacity
+
+
+if __name__ == "__main__":
+
+    import time
+
+    def benchmark(num_samples: int = 200_000, every: int = 20_000) -> None:
+        """ Show that the per-sample cost does not grow with the number of samples. """
+        store = TimeSeriesStore()
+        profile = np.arange(256, dtype=np.uint8)
+        regions = {color: {"kind": "rectangle", "average": 1., "sum": 1.}
+                   for color in ("blue", "orange", "green", "red", "purple")}
+        regions["brown"] = {"kind": "line", "profile": profile}
+
+        t0 = time.perf_counter()
+        for i in range(1, num_samples + 1):
+            store.append(i / 30, regions)
+            if i % every == 0:
+                t1 = time.perf_counter()
+                print(f"{i:>8,} samples: {(t1 - t0) / every * 1e6:6.2f} µs/sample, "
+                      f"{store.nbytes / 1e6:7.2f} MB allocated")
+                t0 = t1
+
+        # Check the memory cap
+        capped = TimeSeriesStore(max_bytes=1_000_000)
+        for i in range(1, num_samples + 1):
+            capped.append(i / 30, regions)
+        print(f"Capped store kept {len(capped):,} samples using {capped.nbytes / 1e6:.2f} MB")
+
+    benchmark()
@@ -5,7 +5,7 @@ https://stackoverflow.com/a/33453124/10342097
 """
 
 import os
-from typing import Union
+from typing import Union, Optional, List
 import time
 import traceback
 from pprint import pprint
@@ -47,6 +47,7 @@ from PyQt5.QtCore import (
     QThread, 
     QSize, 
     Qt,
+    QTimer,
     
     )
 
@@ -56,11 +57,16 @@ from frheed.cameras import CameraError
 from frheed.cameras.flir import FlirCamera
 from frheed.cameras.usb import UsbCamera
 from frheed.image_processing import (
-    apply_cmap, to_grayscale, ndarray_to_qpixmap, extend_image, column_to_image,
-    get_valid_colormaps,
+    apply_cmap, to_grayscale, get_valid_colormaps, FramePresenter,
     )
+from frheed.timeseries import TimeSeriesStore
+from frheed.buffers import LatestFrameBuffer, FrameRing
+from frheed.roi import Region
+from frheed.engine import AcquisitionEngine, FrameAnalyzer
 from frheed.constants import DATA_DIR
-from frheed.utils import load_settings, save_settings
+from frheed.utils import load_settings, save_settings, get_logger
+from frheed.instrumentation import span, get_timer
+from frheed import settings
     
 
 MIN_ZOOM = 0.20
@@ -70,14 +76,23 @@ MIN_H = 348
 MAX_W = 2560
 MAX_H = 2560
 DEFAULT_CMAP = "Spectral"
-DEFAULT_INTERPOLATION = cv2.INTER_CUBIC
+
+# "indexed" hands the grayscale frame to Qt with the colormap as its color 
+# table, "rgb" applies the colormap in numpy/cv2 before display
+DISPLAY_MODES = ("indexed", "rgb")
+DEFAULT_DISPLAY_MODE = "indexed"
+# None picks INTER_AREA when shrinking and INTER_LINEAR when enlarging
+DEFAULT_INTERPOLATION = None
+
+# Minimum time (s) between updates of the stage timing statistics in the status bar
+TIMING_TOOLTIP_INTERVAL = 1.
+logger = get_logger()
 
 
 class VideoWidget(QWidget):
     """ Holds the camera frame and toolbar buttons """
     
     frame_changed = pyqtSignal()
-    frame_ready = pyqtSignal(np.ndarray)
     _min_w = 480
     _min_h = 348
     _max_w = MAX_W
@@ -88,6 +103,11 @@ class VideoWidget(QWidget):
         # Store colormap
         self._colormap = DEFAULT_CMAP
         
+        # Converts frames to QPixmaps and counts the copies per frame
+        self.presenter = FramePresenter()
+        self._display_mode = DEFAULT_DISPLAY_MODE
+        self._display_window = settings.DISPLAY_WINDOW
+        
         # Store camera reference and start the camera
         #self.set_camera(camera)
         
@@ -182,11 +202,13 @@ class VideoWidget(QWidget):
         self.region_data:   dict = {}
         self.analyze_frames = True
         
+        # Acquisition and analysis pipeline, run by the worker threads
+        self.engine = AcquisitionEngine()
+        
         # Set up the camera streaming thread
         self.camera_worker = CameraWorker(self)
         self.camera_thread = QThread()
         self.camera_worker.moveToThread(self.camera_thread)
-        self.camera_worker.frame_ready.connect(self.show_frame)
         self.camera_thread.start()
         
         # Set up plotting thread
@@ -196,8 +218,18 @@ class VideoWidget(QWidget):
         self.analysis_thread.started.connect(self.analysis_worker.start)
         self.analysis_thread.start()
         
-        # Connect other signals
-        self.frame_ready.connect(self.analysis_worker.analyze_frame)
+        # Analyze every acquired frame
+        self.camera_worker.frame_acquired.connect(self.analysis_worker.analyze_sequence)
+        self.camera_worker.camera_ready.connect(self.analysis_worker.reset_counters)
+        self.camera_worker.camera_ready.connect(self.analysis_worker.reset_clock)
+        
+        # Show only the newest frame and plot only the newest data at the 
+        # display rate, so the GUI thread cannot fall behind the camera
+        # (the data is emitted from the GUI thread, not the busy analysis thread)
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.show_latest_frame)
+        self.display_timer.timeout.connect(self.analysis_worker.emit_latest_data, Qt.DirectConnection)
+        self.display_timer.start(int(1000 / self.display_rate))
         
         # Variables to be used in properties
         self.workers = (self.camera_worker, self.analysis_worker)
@@ -259,27 +291,45 @@ class VideoWidget(QWidget):
     def show_frame(self, frame: np.ndarray) -> None:
         """ Show the next camera frame """
         # Store raw frame
-        self.raw_frame = frame.copy()
+        # NOTE: Not copied, so this may be a stage buffer that is 
+        # overwritten by the next frame (only its shape is used)
+        self.raw_frame = frame
+        
+        # Convert to grayscale first, so color frames are not resized 3 times
+        with span("grayscale"):
+            frame = self.presenter.grayscale(frame)
         
-        # Resize to display size and get dimensions
-        frame = self._resize_frame(frame)
+        # Resize to display size (skipped at 100% zoom) and get dimensions
+        with span("resize"):
+            frame = self._resize_frame(frame)
         shape = frame.shape
         h, w = shape[0:2]
         
-        # Convert to grayscale
-        frame = to_grayscale(frame)
-            
-        # Emit the frame if analysis is needed
-        self.frame_ready.emit(frame) if self.analyze_frames else None
-        
-        # Apply colormap
-        frame = apply_cmap(frame, self.colormap)
+        # Map high bit depth frames (or a custom window) to 8 bits for display
+        low, high = self.display_window
+        if frame.dtype != np.uint8 or low is not None or high is not None:
+            with span("window"):
+                frame = self.presenter.window(frame, low, high)
         
-        # Store the processed frame
-        self.frame = frame.copy()
+        # Let Qt apply the colormap using a color table
+        if self.display_mode == "indexed":
+            # NOTE: This may be a stage buffer, which is why save_image 
+            # copies it
+            self.frame = frame
+            with span("pixmap"):
+                qpix = self.presenter.to_qpixmap(frame, self.colormap)
         
-        # Create QPixmap from numpy array
-        qpix = ndarray_to_qpixmap(frame)
+        else:
+            # Apply colormap into the next display buffer
+            with span("colormap"):
+                frame = self.presenter.colorize(frame, self.colormap)
+            
+            # Store the processed frame
+            self.frame = frame
+            
+            # Create QPixmap from numpy array (without copying it)
+            with span("pixmap"):
+                qpix = self.presenter.to_qpixmap(frame)
         
         # Show the QPixmap
         self.display.label.setPixmap(qpix)
@@ -287,11 +337,31 @@ class VideoWidget(QWidget):
         # Emit frame_changed signal
         self.frame_changed.emit()
         
+    @pyqtSlot()
+    def show_latest_frame(self) -> None:
+        """ Show the newest acquired frame, if there is a new one """
+        seq = self.camera_worker.latest_frame.take()
+        frames = self.camera_worker.frames
+        frame = frames.get(seq) if seq is not None else None
+        if frame is None:
+            return
+        
+        # Copy the frame out of the ring, since the camera may overwrite the 
+        # slot while it is converted or saved, and skip it if it was being 
+        # overwritten while it was copied
+        frame = self.presenter.copy(frame)
+        if frames.is_valid(seq):
+            self.show_frame(frame)
+        
     @pyqtSlot()
     def save_image(self) -> None:
         """ Save the currently displayed frame """
         frame = self.frame.copy()
         
+        # Apply the colormap if only the grayscale frame is stored
+        if frame.ndim == 2:
+            frame = apply_cmap(frame, self.colormap)
+        
         # Generate filename
         tstamp = datetime.now().strftime("%d-%b-%Y_%H%M%S")
         filename = f"{tstamp}.png"
@@ -335,6 +405,51 @@ class VideoWidget(QWidget):
             self._colormap = colormap
             # TODO: Update label that shows current colormap
     
+    @property
+    def display_rate(self) -> float:
+        """ Maximum display refresh rate in Hz (monitor rate if not set) """
+        if settings.DISPLAY_RATE:
+            return float(settings.DISPLAY_RATE)
+        screen = QApplication.primaryScreen()
+        return max(screen.refreshRate() if screen is not None else 0., 1.)
+    
+    @property
+    def frame_counters(self) -> dict:
+        """
+        Number of frames acquired, analyzed, missed by the analysis (because
+        they were overwritten first), displayed and dropped by the display
+        """
+        latest_frame = self.camera_worker.latest_frame
+        return {
+            "acquired":     latest_frame.count,
+            "analyzed":     self.analysis_worker.frames_analyzed,
+            "missed":       self.analysis_worker.frames_missed,
+            "displayed":    latest_frame.taken,
+            "dropped":      latest_frame.dropped,
+            }
+    
+    @property
+    def display_window(self) -> tuple:
+        """ Range of values (low, high) that is shown, where None is automatic. """
+        return self._display_window or (None, None)
+    
+    @display_window.setter
+    def display_window(self, window: Union[tuple, None]) -> None:
+        self._display_window = window
+    
+    @property
+    def display_mode(self) -> str:
+        return self._display_mode
+    
+    @display_mode.setter
+    def display_mode(self, mode: str) -> None:
+        if mode in DISPLAY_MODES:
+            self._display_mode = mode
+            
+    @pyqtSlot(bool)
+    def set_indexed_display(self, indexed: bool) -> None:
+        self.display_mode = "indexed" if indexed else "rgb"
+    
  
     
     def set_camera(self, camera):
@@ -374,10 +489,10 @@ class VideoWidget(QWidget):
     def stop_analyzing_frames(self) -> None:
         self.analyze_frames = False
         
-    def _resize_frame(self, frame: np.ndarray, interp: int = DEFAULT_INTERPOLATION) -> np.ndarray:
+    def _resize_frame(self, frame: np.ndarray, interp: Optional[int] = DEFAULT_INTERPOLATION) -> np.ndarray:
         size = self.display.sizeHint()
         w, h = size.width(), size.height()
-        return cv2.resize(frame, dsize=(w, h), interpolation=interp)
+        return self.presenter.resize(frame, (w, h), interpolation=interp)
     
 
 class CameraDisplay(QWidget):
@@ -472,6 +587,7 @@ class CameraSettingsWidget(QWidget):
     """ A popup widget that shows camera settings """
     
     def __init__(self, parent: VideoWidget = None, popup: bool = True):
+        t0 = time.perf_counter()
         super().__init__(parent)
         self._parent = parent
         
@@ -559,6 +675,8 @@ class CameraSettingsWidget(QWidget):
         width = int(self.sizeHint().width() * 1.5)
         height = self.sizeHint().height()
         self.setFixedSize(width, height)
+        logger.info(f"Created camera settings for {len(self._settings_widgets)} settings "
+                    f"in {(time.perf_counter() - t0) * 1e3:.1f} ms")
         
     @pyqtSlot()
     def show(self) -> None:
@@ -919,14 +1037,25 @@ class CameraStatusBar(QStatusBar):
         self.incomplete_frames_label = QLabel()
         self.incomplete_frames_label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
         
+        # Add widget for displaying frame counters
+        self.frame_counters_label = QLabel()
+        self.frame_counters_label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        
         # Add widget for displaying errors
         self.error_label = QLabel()
         self.error_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
         
+        # Time when the stage timing tooltip was last updated
+        self._timing_updated = 0.
+        
+        # Whether the tooltip shows the stage timing statistics
+        self._timing_shown = False
+        
         # Add widgets
         self.insertWidget(0, self.fps_label, 0)
-        self.insertWidget(1, self.incomplete_frames_label, 1)
-        self.insertWidget(2, self.error_label, 0)
+        self.insertWidget(1, self.incomplete_frames_label, 0)
+        self.insertWidget(2, self.frame_counters_label, 1)
+        self.insertWidget(3, self.error_label, 0)
         
         # Display status
         
@@ -948,6 +1077,11 @@ class CameraStatusBar(QStatusBar):
     def incomplete_image_count(self) -> str:
         return str(getattr(self.camera, "incomplete_image_count", ""))
     
+    @property
+    def frame_counters(self) -> str:
+        counters = getattr(self._parent, "frame_counters", {})
+        return "  ".join(f"{k.capitalize()}: {v}" for k, v in counters.items())
+    
     @property
     def error_status(self) -> str:
         return str(getattr(self.camera, "error_status", "No errors"))
@@ -962,7 +1096,30 @@ class CameraStatusBar(QStatusBar):
         self.incomplete_frames_label.setText(
             f"Incomplete images: {self.incomplete_image_count}"
             )
+        self.frame_counters_label.setText(self.frame_counters)
         self.error_label.setText(self.error_status)
+        self.update_timing_tooltip()
+        
+    def update_timing_tooltip(self) -> None:
+        """ Show the stage timing statistics as the tooltip (at most once per second) """
+        timer = get_timer()
+        
+        # Remove the statistics once timing is switched off (but keep other 
+        # messages, e.g. from changing a camera setting)
+        if not timer.enabled:
+            if self._timing_shown:
+                self.setToolTip("")
+                self._timing_shown = False
+            return
+        
+        now = time.monotonic()
+        if now - self._timing_updated < TIMING_TOOLTIP_INTERVAL:
+            return
+        self._timing_updated = now
+        
+        # Use a monospace font so the table columns line up
+        self.setToolTip(f"<pre>{timer.report()}</pre>")
+        self._timing_shown = True
 
 
 class Worker(QObject):
@@ -972,7 +1129,6 @@ class Worker(QObject):
     """
     
     finished = pyqtSignal()
-    frame_ready = pyqtSignal(np.ndarray)
     data_ready = pyqtSignal(np.ndarray)
     exception = pyqtSignal()
     camera = None #Will be set by the VideoWidget object
@@ -987,15 +1143,22 @@ class Worker(QObject):
     
     def canvas(self) -> Union[CanvasWidget, None]:
         return getattr(self.display(), "canvas", None)
+    
+    @property
+    def engine(self) -> AcquisitionEngine:
+        return self._parent.engine
         
 class CameraWorker(Worker):
     """ 
     A worker object to control frame acquisition.
     
+    Frames are acquired by the VideoWidget's AcquisitionEngine, in the 
+    thread of this worker, and its callbacks are forwarded as signals.
     """
     
     start_camera = pyqtSignal()
     camera_ready = pyqtSignal()
+    frame_acquired = pyqtSignal(object)
     
     def __init__(self, *args, **kwargs):
         # We have to use a pyQtSignal to start the camera from the VideoWidget object
@@ -1003,107 +1166,127 @@ class CameraWorker(Worker):
         # the VideoWidget instance runs will block.
         super().__init__(*args, **kwargs)
         self.start_camera.connect(self.start)
-        self.camera_online = False
+        self.engine.ready_callbacks.append(self.camera_ready.emit)
+        self.engine.frame_callbacks.append(self.frame_acquired.emit)
+        self.engine.error_callbacks.append(lambda ex: self.exception.emit())
+        
+    @property
+    def running(self) -> bool:
+        return self.engine.acquiring
+    
+    @running.setter
+    def running(self, running: bool) -> None:
+        self.engine.acquiring = running
+        
+    @property
+    def camera_online(self) -> bool:
+        return self.engine.camera_online
+    
+    @property
+    def frames(self) -> FrameRing:
+        """ Preallocated frames that consumers read by sequence number """
+        return self.engine.frames
+    
+    @property
+    def latest_frame(self) -> LatestFrameBuffer:
+        """ Sequence number of the newest frame for the display, which may be slower than the camera """
+        return self.engine.latest_frame
     
     @pyqtSlot()
     def start(self) -> None:
-        with self.camera as camera:
-            self.camera_ready.emit()
-            self.camera_online = True
-            self.running = True
-            while self.running:
-                try:
-                    frame = camera.get_array()
-                    self.frame_ready.emit(frame)
-                except Exception as ex:
-                    self.exception.emit()
-        self.camera_online = False
+        self.engine.camera = self.camera
+        self.engine.acquire()
         
     @pyqtSlot()
     def stop(self) -> None:
-        self.running = False
+        self.engine.stop_acquisition()
 
 class AnalysisWorker(Worker):
     """
     A worker object to analyze region intensities.
+    
+    Frames are analyzed by the VideoWidget's AcquisitionEngine, using the 
+    shapes on the canvas as regions.
     """
     data_ready = pyqtSignal(dict)
     
-    data = {}
-    start_time = None
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # Newest snapshot of the data, which is plotted at the display rate
+        self.latest_data = LatestFrameBuffer()
+    
+    @property
+    def data(self) -> TimeSeriesStore:
+        """ Columnar storage for the region time series """
+        return self.engine.data
+    
+    @property
+    def analyzer(self) -> FrameAnalyzer:
+        return self.engine.analyzer
+    
+    @property
+    def frames_analyzed(self) -> int:
+        return self.engine.frames_analyzed
+    
+    @property
+    def frames_missed(self) -> int:
+        return self.engine.frames_missed
+    
+    @property
+    def last_sequence(self) -> int:
+        """ Sequence number of the last frame that was handled """
+        return self.engine.last_sequence
+    
+    @property
+    def clock_offset(self) -> Union[float, None]:
+        """ Offset (s) from the camera clock to the system clock """
+        return self.analyzer.clock_offset
+    
+    @property
+    def start_time(self) -> Union[float, None]:
+        return self.analyzer.start_time
+    
+    @start_time.setter
+    def start_time(self, start_time: Union[float, None]) -> None:
+        self.analyzer.start_time = start_time
     
     @property
     def shapes(self) -> Union[list, tuple]:
         return getattr(self.canvas(), "shapes", ())
     
     @property
-    def raw_frame(self) -> Union[np.ndarray, None]:
-        return getattr(self._parent, "raw_frame", None)
+    def frames(self) -> Union[FrameRing, None]:
+        return self.engine.frames
     
-    @pyqtSlot(np.ndarray)
-    def analyze_frame(self, frame: np.ndarray) -> None:
-        if not self.running:
+    @property
+    def analyzing(self) -> bool:
+        return self.running and getattr(self._parent, "analyze_frames", True)
+    
+    def regions(self, frame_shape: tuple) -> List[Region]:
+        """ The shapes on the canvas as regions in the raw frame """
+        return [shape.region(frame_shape) for shape in self.shapes]
+    
+    @pyqtSlot(object)
+    def analyze_sequence(self, seq: int) -> None:
+        """ Analyze a frame from the camera's FrameRing by sequence number. """
+        if not self.analyzing:
+            self.engine.last_sequence = seq
             return
-        
-        # Get time of data collection relative to start
-        if self.start_time is None or len(self.shapes) == 0:
-            self.reset_timer()
-        t = time.time() - self.start_time
-        
-        # Get pixel intensities under regions of interest
-        for shape in self.shapes:
-
-            # Get the mask
-            mask = shape.mask
-
-            # Make sure the mask and frame have the same shape
-            if mask.shape != frame.shape:
-                continue
-            
-            # Extract the data based on the mask region
-            data = frame[mask]
-            
-            # Store the data
-            color = shape.color_name
-            if color not in self.data:
-                self.data[color] = {
-                    "time":     [],
-                    "sum":      [],
-                    "average":  [],
-                    "x":        [],
-                    "y":        [],
-                    "image":    None,
-                    "kind":     shape.kind,
-                    }
-                
-            # Store time value
-            self.data[color]["time"].append(t)
+        shape = self.frames.shape
+        if self.engine.analyze_sequence(seq, self.regions(shape or (0, 0))) is not None:
             
-            # Store line profile
-            if shape.kind == "line":
-                # self.data[color]["x"].append(np.arange(0, data.size, 1))
-                ydata = data.flatten()
-                self.data[color]["y"].append(ydata)
-                
-                # Make sure line scan image exists
-                img = self.data[color]["image"]
-                if img is None:
-                    # Turn single column into 2D array where 0 is in the bottom left
-                    # (assuming starting array like [1, 2, 3, 4, 5, ...])
-                    # https://stackoverflow.com/a/44772452/10342097
-                    self.data[color]["image"] = column_to_image(ydata)
-                    
-                # Update line scan data
-                else:
-                    self.data[color]["image"] = extend_image(img, ydata)
-                
-            else:
-                # Make sure sum is non-zero to avoid divide-by-zero
-                mask_sum = mask.sum()
-                if mask_sum != 0:
-                    self.data[color]["average"].append(data.sum() / mask_sum)
-            
-        self.data_ready.emit(self.data.copy())
+            # Keep only zero-copy views of the newest data for plotting
+            self.latest_data.put(self.data.snapshot())
+    
+    def emit_latest_data(self) -> None:
+        """ 
+        Emit the newest analyzed data if it has not been emitted yet. Called
+        at the display rate, so the plots are not redrawn for every frame.
+        """
+        data = self.latest_data.take()
+        if data is not None:
+            self.data_ready.emit(data)
                 
     @pyqtSlot()
     def start(self) -> None:
@@ -1118,9 +1301,18 @@ class AnalysisWorker(Worker):
         
     @pyqtSlot()
     def reset(self) -> None:
-        self.data = {}
+        self.data.clear()
         self.reset_timer()
         
+    @pyqtSlot()
+    def reset_counters(self) -> None:
+        self.engine.reset_counters()
+        
+    @pyqtSlot()
+    def reset_clock(self) -> None:
+        """ Forget the camera clock offset (e.g. when the camera restarts). """
+        self.analyzer.reset_clock()
+        
     @pyqtSlot()
     def reset_timer(self) -> None:
         self.start_time = time.time()
@@ -38,6 +38,7 @@ from PyQt5.QtCore import (
 
 from frheed.constants import COLOR_DICT
 from frheed.utils import get_qcolor
+from frheed.roi import Region
 
 
 SHAPE_TYPES = (
@@ -747,41 +748,42 @@ class CanvasShape(QRect):
             return sorted(seps, key=lambda i: i[1])[0][0]
     
     @property
-    def mask(self) -> np.ndarray:
-        """ 
-        Get a numpy mask where pixels inside the shape = True.
-        https://stackoverflow.com/a/44874588/10342097
+    def frame_shape(self) -> tuple:
+        """ (height, width) of the canvas if it exists, otherwise of the shape """
+        if self.canvas is None:
+            return (self.height(), self.width())
+        size = self.canvas.size()
+        return (size.height(), size.width())
+    
+    def sensor_coords(self, frame_shape: tuple) -> tuple:
+        """
+        Map the canvas coordinates of the shape to the pixels of a frame 
+        that is displayed (scaled) on the canvas, e.g. the raw camera frame.
         """
+        canvas_h, canvas_w = self.frame_shape
+        frame_h, frame_w = frame_shape[:2]
+        sx, sy = frame_w / max(canvas_w, 1), frame_h / max(canvas_h, 1)
+        x1, y1, x2, y2 = self.getCoords()
         
-        # Get dimensions of canvas if it exists, otherwise the shape dimensions
-        if self.canvas is None:
-            width, height = self.width(), self.height()
-        else:
-            size = self.canvas.size()
-            width, height = size.width(), size.height()
-            
-        # Get the center of the shape
-        center: QPoint = self.center()
-        h, k = center.x(), center.y()
+        # Lines are mapped from pixel centers to keep their endpoints
+        if self.kind == "line":
+            return (int((x1 + 0.5) * sx), int((y1 + 0.5) * sy),
+                    int((x2 + 0.5) * sx), int((y2 + 0.5) * sy))
         
-        # Get the shape dimensions
-        x1, y1, x2, y2 = self.getCoords()
-        a = max(abs(x2 - x1) / 2, 1)  # avoid divide by 0
-        b = max(abs(y2 - y1) / 2, 1)  # avoid divide by 0
-        
-        # Create the mask by calculating which pixels fall inside the shape
-        # For a rectangle, this is simple
-        if self.kind == "rectangle":
-            mask = np.full((height, width), False, dtype=bool)
-            mask[y1:y2+1, x1:x2+1] = True
-            
-        # Equation for ellipse: ((x - h)^2 / a^2) + ((y - k)^2 / b^2) = 1
-        # with center (h, k) and horizontal/vertical radii (a, b)
-        else:
-            Y, X = np.ogrid[:height, :width]
-            mask = ((((X - h)**2 / (a**2)) + ((Y - k)**2 / (b**2))) <= 1)
-            
-        return mask
+        # Other shapes cover every frame pixel under their canvas pixels
+        x1_new, y1_new = int(x1 * sx), int(y1 * sy)
+        x2_new = max(int((x2 + 1) * sx) - 1, x1_new)
+        y2_new = max(int((y2 + 1) * sy) - 1, y1_new)
+        return (x1_new, y1_new, x2_new, y2_new)
+    
+    def region(self, frame_shape: tuple) -> Region:
+        """ 
+        The shape as a Region in a frame that is displayed (scaled) on the 
+        canvas. The mask of the region is cached by its geometry (see 
+        Region.mask), so it is only regenerated when the shape, canvas or
+        frame size changes.
+        """
+        return Region(self.color_name, self.kind, self.sensor_coords(frame_shape))
             
     def rescale(self, old: QSize, new: QSize) -> None:
         """ Scale the shape when the canvas changes """
@@ -881,6 +883,9 @@ class CanvasLine(QLine):
     delete = CanvasShape.delete
     activate = CanvasShape.activate
     deactivate = CanvasShape.deactivate
+    frame_shape = CanvasShape.frame_shape
+    sensor_coords = CanvasShape.sensor_coords
+    region = CanvasShape.region
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1032,37 +1037,6 @@ class CanvasLine(QLine):
             # Get the name of the nearest region
             return sorted(seps, key=lambda i: i[1])[0][0]
         
-    @property
-    def mask(self) -> np.ndarray:
-        """ 
-        Get a numpy mask where pixels on the line = True.
-        https://stackoverflow.com/a/44874588/10342097
-        """
-        
-        # Get dimensions of canvas if it exists, otherwise line dimensions
-        if self.canvas is None:
-            width, height = self.width(), self.height()
-        else:
-            size = self.canvas.size()
-            width, height = size.width(), size.height()
-        
-        # Create full array of False values with the proper size
-        mask = np.full((height, width), False, dtype=bool)
-        
-        # Get endpoints
-        x1, y1, x2, y2 = self.getCoords()
-        x1, x2 = sorted([x1, x2])
-        y1, y2 = sorted([y1, y2])
-        
-        # Create linspace of points along the X and Y dimensions
-        num = max(self.width(), self.height()) * 10  # this can probably be optimized
-        x = np.linspace(min(x1, width - 1), min(x2, width - 1), num, endpoint=False)
-        y = np.linspace(min(y1, height - 1), min(y2, height - 1), num, endpoint=False)
-        
-        # Mask values along the line
-        mask[y.astype(np.int), x.astype(np.int)] = True
-        return mask
-        
     def rescale(self, old: QSize, new: QSize) -> None:
         """ Scale the line when the canvas changes """
         
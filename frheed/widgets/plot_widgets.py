@@ -612,7 +612,10 @@ class LineScanPlotWidget(PlotWidget):
         self.pixmap_item = pixmap
         
     def set_image(self, image: np.ndarray) -> None:
-        """ Set the current image. """
+        """ 
+        Set the current image. The image can be a (non-contiguous) view 
+        such as LineScanBuffer.image; it is not copied until it is colormapped.
+        """
         # Use property setter to update the item and pixmap
         self.image = image
         
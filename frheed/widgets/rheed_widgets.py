@@ -6,6 +6,7 @@ Widgets for RHEED analysis.
 from typing import Union
 from functools import partial
 
+import numpy as np
 from PyQt5.QtWidgets import (
     QWidget,
     QGridLayout,
@@ -28,9 +29,10 @@ from PyQt5.QtCore import (
 from frheed.widgets.camera_widget import VideoWidget
 from frheed.widgets.plot_widgets import PlotGridWidget
 from frheed.widgets.canvas_widget import CanvasShape, CanvasLine
-from frheed.widgets.selection_widgets import CameraSelection
+from frheed.widgets.selection_widgets import CameraSelection, open_camera, select_recording
+from frheed.cameras import CameraError
 from frheed.widgets.common_widgets import HSpacer, VSpacer
-from frheed.utils import snip_lists
+from frheed.instrumentation import span, get_timer
 from os.path  import exists
 from json import dumps
 from pprint import pprint
@@ -97,6 +99,8 @@ class RHEEDWidget(QWidget):
         self.file_menu = self.menubar.addMenu("&File")
         self.file_menu.addAction("&Save to file", self.get_file_name)
         self.file_menu.addAction("&Change camera", self.change_camera)
+        self.file_menu.addAction("&Open recording...", self.open_recording)
+        self.file_menu.addAction("Save stage &timings", self.save_stage_timings)
         
         # "View" menu
         self.view_menu = self.menubar.addMenu("&View")
@@ -104,6 +108,14 @@ class RHEEDWidget(QWidget):
         self.show_live_plots_item.setCheckable(True)
         self.show_live_plots_item.setChecked(True)
         self.show_live_plots_item.toggled.connect(self.show_live_plots)
+        self.indexed_display_item = self.view_menu.addAction("&Indexed color display")
+        self.indexed_display_item.setCheckable(True)
+        self.indexed_display_item.setChecked(self.camera_widget.display_mode == "indexed")
+        self.indexed_display_item.toggled.connect(self.camera_widget.set_indexed_display)
+        self.stage_timing_item = self.view_menu.addAction("&Stage timing")
+        self.stage_timing_item.setCheckable(True)
+        self.stage_timing_item.setChecked(get_timer().enabled)
+        self.stage_timing_item.toggled.connect(self.set_stage_timing)
         
         # "Tools" menu
         #self.tools_menu = self.menubar.addMenu("&Tools")
@@ -145,36 +157,52 @@ class RHEEDWidget(QWidget):
     @pyqtSlot(dict)
     def plot_data(self, data: dict) -> None:
         """ Plot data from the camera """
-        # Get data for each color in the data dictionary
-        for color, color_data in data.items():
-            # Add region data to the region plot
-            if color_data["kind"] in ["rectangle", "ellipse"]:
-                curve = self.region_plot.get_or_add_curve(color)
-                # Catch RuntimeError if widget has been closed
-                try:
-                    curve.setData(*snip_lists(color_data["time"], color_data["average"]))
-                except RuntimeError:
-                    pass
-                
-            # Add line profile data to the profile plot and update line scan
-            elif color_data["kind"] == "line":
-                curve = self.profile_plot.get_or_add_curve(color)
-                try:
-                    curve.setData(color_data["y"][-1])
-                except RuntimeError:
-                    pass
-                
-                # Update 2D line scan image
-                self.line_scan_plot.set_image(color_data["image"])
-                
-            # Update region window
-            if self.region_plot.auto_fft_max:
-                self.region_plot.set_fft_max(color_data["time"][-1])
-        
+        # Update the plots with the data of each region
+        with span("plotting"):
+            # Get data for each color in the data dictionary
+            for color, color_data in data.items():
+                # Add region data to the region plot
+                if color_data["kind"] in ["rectangle", "ellipse"]:
+                    curve = self.region_plot.get_or_add_curve(color)
+                    # Catch RuntimeError if widget has been closed
+                    try:
+                        curve.setData(color_data["time"], color_data["average"])
+                    except RuntimeError:
+                        pass
+                    
+                # Add line profile data to the profile plot and update line scan
+                elif color_data["kind"] == "line":
+                    curve = self.profile_plot.get_or_add_curve(color)
+                    try:
+                        curve.setData(color_data["y"][-1])
+                    except RuntimeError:
+                        pass
+                    
+                    # Update 2D line scan image
+                    self.line_scan_plot.set_image(color_data["image"])
+                    
+                # Update region window
+                if self.region_plot.auto_fft_max:
+                    self.region_plot.set_fft_max(color_data["time"][-1])
+            
         #Send the data over to the FileSaveWorker object for saving to file
         if self.write_to_file and data != {}:
-            self.file_save_worker.save_to_file(data)
+            with span("file save"):
+                self.file_save_worker.save_to_file(data)
             
+    @pyqtSlot(bool)
+    def set_stage_timing(self, enabled: bool) -> None:
+        """ Start or stop recording how long each pipeline stage takes """
+        get_timer().enabled = enabled
+        
+    @pyqtSlot()
+    def save_stage_timings(self) -> None:
+        """ Save the recorded stage timings to a .csv file """
+        path, _ = QFileDialog.getSaveFileName(parent=None, caption="Save stage timings",
+                                              filter="CSV file (*.csv)")
+        if path:
+            get_timer().dump(path)
+        
     @pyqtSlot(object)
     def remove_line(self, shape: Union["CanvasShape", "CanvasLine"]) -> None:
         """ Remove a line from the plot it is part of """
@@ -211,6 +239,22 @@ class RHEEDWidget(QWidget):
             self.camera_widget.set_camera(self.camera_selected.the_camera)
         
         self.camera_selected.is_camera_selected.connect(partial(_finish_changing_camera, self))
+    
+    @pyqtSlot()
+    def open_recording(self) -> None:
+        """ Replace the current camera by a recording. """
+        recording = select_recording(self)
+        if recording is None:
+            return
+        try:
+            camera = open_camera(recording)
+        except CameraError as ex:
+            print(f"Unable to open {recording.name}: {ex}")
+            return
+        
+        self.camera_widget.camera_worker.stop()
+        sleep(0.1) #Finish IO operations
+        self.camera_widget.set_camera(camera)
             
             
     def get_file_name(self):
@@ -235,6 +279,10 @@ class FileSaveWorker():
     def __init__(self, file_name: str) -> None:
         self.change_file_name(file_name)
         
+        # Time of the last sample that was saved (data arrives at the plot 
+        # rate, so every call can contain several new samples)
+        self._saved_time = -np.inf
+        
         #Write the header
         self.file.write('Shape ID,Time,Average,Shape type\n')
         
@@ -248,13 +296,23 @@ class FileSaveWorker():
         self.change_file_name(self.file_name)
     
     def save_to_file(self, data: dict) -> None:
-        write_string = []
-        for shape_id, shape_data in data.items():
-            curr_time = str(shape_data['time'][-1])
-            curr_ave = str(shape_data['average'][-1])
-            curr_kind = str(shape_data['kind'][-1]) 
-            write_string.append(','.join((shape_id, curr_time, curr_ave, curr_kind)))
-        self.file.write(','.join(write_string) + '\n')
+        """ Write one line for every sample after the last saved one. """
+        num_new = max((int(np.count_nonzero(shape_data['time'] > self._saved_time))
+                       for shape_data in data.values()), default=0)
+        
+        # Samples are written from oldest to newest, each with every region 
+        # that has data at that time
+        for i in range(num_new, 0, -1):
+            write_string = []
+            for shape_id, shape_data in data.items():
+                if len(shape_data['time']) < i:
+                    continue
+                curr_time = str(shape_data['time'][-i])
+                curr_ave = str(shape_data['average'][-i])
+                curr_kind = str(shape_data['kind'][-1]) 
+                write_string.append(','.join((shape_id, curr_time, curr_ave, curr_kind)))
+                self._saved_time = max(self._saved_time, shape_data['time'][-i])
+            self.file.write(','.join(write_string) + '\n')
         
     def change_file_name(self, file_name: str) -> None:
         if hasattr(self, 'file'):
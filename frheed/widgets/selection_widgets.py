@@ -3,6 +3,7 @@
 Widgets for selecting things, including the source camera to use.
 """
 
+import os
 from typing import Optional, Union, List
 from dataclasses import dataclass
 from functools import partial
@@ -10,15 +11,43 @@ from functools import partial
 from PyQt5.QtWidgets import (
     QWidget,
     QPushButton,
-    QGridLayout
+    QGridLayout,
+    QFileDialog
     )
 from PyQt5.QtCore import (
     Qt,
     pyqtSignal
     )
     
-from frheed.cameras import CameraObject, CameraError, find_available_cameras
+from frheed.cameras import CameraObject, CameraError, CameraInfo, discover_cameras
+from frheed.cameras.simulated import SimulatedCamera  # register with discover_cameras
+from frheed.cameras.replay import ReplayCamera
+from frheed.engine import CameraProcess
 from frheed.utils import get_icon
+from frheed import settings
+
+# File types that can be replayed as a camera
+RECORDING_FILTER = "Recordings (*.npy *.avi *.mp4 *.mkv *.mov);;All files (*)"
+
+
+def open_camera(cam: CameraInfo) -> Union[CameraObject, CameraProcess]:
+    """ Create the camera, in a separate process if ACQUISITION_PROCESS is set. """
+    
+    # A camera in a separate process is only opened when it starts
+    if settings.ACQUISITION_PROCESS:
+        return CameraProcess(cam.backend, cam.src)
+    return cam.open()
+
+def select_recording(parent: Optional[QWidget] = None) -> Optional[CameraInfo]:
+    """ Ask for a recording to replay as a camera (None if cancelled). """
+    path, _ = QFileDialog.getOpenFileName(parent, "Open recording", filter=RECORDING_FILTER)
+    if not path:
+        return None
+    
+    # The backend has to be picklable to open it in a separate process
+    replay = partial(ReplayCamera, realtime=settings.REPLAY_REALTIME)
+    return CameraInfo(replay, path, f"Recording {os.path.basename(path)}")
+
 
 class CameraSelection(QWidget):
     
@@ -28,9 +57,6 @@ class CameraSelection(QWidget):
     
         super().__init__(None)
         
-        # Check for available cameras
-        cams = find_available_cameras()
-        
         # Set window properties
         self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.Window)
         self.setWindowTitle("Select Camera")
@@ -41,27 +67,63 @@ class CameraSelection(QWidget):
         self.layout = QGridLayout()
         self.setLayout(self.layout)
         
+        # Create button for looking for cameras again
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.setToolTip("Look for cameras again.")
+        self.refresh_button.clicked.connect(partial(self._add_camera_buttons, True))
+        
+        # Create button for replaying a recording instead of using a camera
+        self.recording_button = QPushButton("Open recording...")
+        self.recording_button.setToolTip("Replay a recorded frame stack (.npy) or video.")
+        self.recording_button.clicked.connect(self._open_recording)
+        self._camera_buttons = []
+        
+        # Check for available cameras (reuses recently found cameras)
+        self._add_camera_buttons()
+        
+        self.setVisible(True)
+        self.raise_()
+        
+    def _add_camera_buttons(self, refresh: bool = False) -> None:
+        # Remove the previous buttons
+        for btn in self._camera_buttons:
+            self.layout.removeWidget(btn)
+            btn.deleteLater()
+        self._camera_buttons = []
+        
+        # Cameras are only opened once they are selected
+        cams = discover_cameras(refresh=refresh)
+        
         # If there are no cameras, no buttons need to be added
         if not cams:
             btn = QPushButton("No cameras found")
             btn.setEnabled(False)
-            self.layout.addWidget(btn, 0, 0)
+            self._camera_buttons.append(btn)
         
         # Create buttons for each camera
-        for i, cam in enumerate(cams):
-            btn = QPushButton(str(cam[1]))
+        for cam in cams:
+            btn = QPushButton(str(cam.name))
             
             #Use partial() to make a function of no arguments
-            btn.clicked.connect(partial(self._set_camera, cam[0]))
+            btn.clicked.connect(partial(self._set_camera, cam))
+            self._camera_buttons.append(btn)
             
+        for i, btn in enumerate(self._camera_buttons):
             self.layout.addWidget(btn, i, 0)
-            
-        
-        self.setVisible(True)
-        self.raise_()
+        self.layout.addWidget(self.refresh_button, len(self._camera_buttons), 0)
+        self.layout.addWidget(self.recording_button, len(self._camera_buttons) + 1, 0)
+    
+    def _open_recording(self) -> None:
+        recording = select_recording(self)
+        if recording is not None:
+            self._set_camera(recording)
     
-    def _set_camera(self, cam:CameraObject) -> None:
-        self.the_camera = cam
+    def _set_camera(self, cam: CameraInfo) -> None:
+        try:
+            self.the_camera = open_camera(cam)
+        except CameraError as ex:
+            print(f"Unable to open {cam.name}: {ex}")
+            return
         
         # Hide the selection widget
         self.setVisible(False)
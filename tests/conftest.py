@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Shared test fixtures.
+"""
+
+import os
+import sys
+
+import pytest
+
+
+# Fake camera drivers (PySpin, vimba) for testing the camera backends
+FAKES_DIR = os.path.join(os.path.dirname(__file__), "fakes")
+
+# Camera backends that import the drivers
+_DRIVER_BACKENDS = ("frheed.cameras.flir", "frheed.cameras.gige")
+
+
+@pytest.fixture
+def fake_drivers(monkeypatch):
+    """ Import the fake camera drivers in tests/fakes instead of the real ones. """
+    monkeypatch.syspath_prepend(FAKES_DIR)
+    for name in list(sys.modules):
+        if (name.split(".")[0] in ("PySpin", "vimba")
+                or name.startswith(_DRIVER_BACKENDS)):
+            monkeypatch.delitem(sys.modules, name)
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """ QApplication for tests of widgets (without a display). """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+A fake PySpin (Spinnaker SDK) module for testing FlirCamera without a camera.
+
+Only the parts of the API that frheed uses are implemented. Every pixel of a
+frame is its frame number (1, 2, ...), every INCOMPLETE_EVERY-th frame is
+incomplete, and images remember whether they have been released, so tests
+can check that the driver buffers are given back.
+
+Tests replace the cameras that are found by changing CAMERAS. Like the
+real System, the cameras found by the last search are kept, and SEARCHES
+counts how often the interfaces were searched for cameras.
+"""
+
+import sys
+
+import numpy as np
+
+
+# Annotations in frheed refer to e.g. PySpin.PySpin.ChunkData
+PySpin = sys.modules[__name__]
+
+# Access modes
+NA, RO, WO, RW = 0, 1, 2, 3
+
+# Principal interface types of nodes
+intfIFloat, intfIBoolean, intfIInteger, intfIEnumeration, intfIString, intfICommand = range(10, 16)
+
+EVENT_TIMEOUT_INFINITE = -1
+EVENT_TIMEOUT_NONE = 0
+
+# Every n-th frame is incomplete
+INCOMPLETE_EVERY = 5
+
+# Frame shape (height, width)
+FRAME_SHAPE = (4, 5)
+
+
+class SpinnakerException(Exception):
+    pass
+
+
+class Node:
+    """ A GenICam node. """
+
+    def __init__(self, name, interface=intfIInteger, value=0, entries=(),
+                 minimum=0, maximum=100, access=RW):
+        self.name = name
+        self.interface = interface
+        self.value = value
+        self.entries = list(entries)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.access = access
+
+    def GetName(self):
+        return self.name
+
+    def GetPrincipalInterfaceType(self):
+        return self.interface
+
+
+class EnumEntry:
+
+    def __init__(self, node, name, value):
+        self.node = node
+        self.name = name
+        self.value = value
+        self.access = RO
+
+    def GetName(self):
+        return f"EnumEntry_{self.node.name}_{self.name}"
+
+    def GetDescription(self):
+        return ""
+
+    def GetValue(self):
+        return self.value
+
+
+class _Ptr:
+    """ Typed pointer to a node (None if the node does not exist). """
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def access(self):
+        return self.node.access
+
+    def GetAccessMode(self):
+        return self.node.access
+
+    def GetDescription(self):
+        return f"Description of {self.node.name}"
+
+    def GetUnit(self):
+        return ""
+
+    def GetValue(self):
+        return self.node.value
+
+    def SetValue(self, value):
+        if self.node.access not in (WO, RW):
+            raise RuntimeError(f"{self.node.name} is not writable")
+        self.node.value = value
+
+    def GetMin(self):
+        return self.node.minimum
+
+    def GetMax(self):
+        return self.node.maximum
+
+    def Execute(self):
+        self.node.value += 1
+
+
+class CFloatPtr(_Ptr):
+    pass
+
+class CBooleanPtr(_Ptr):
+    pass
+
+class CIntegerPtr(_Ptr):
+    pass
+
+class CStringPtr(_Ptr):
+    pass
+
+class CCommandPtr(_Ptr):
+    pass
+
+
+class CEnumerationPtr(_Ptr):
+
+    def GetEntries(self):
+        return [EnumEntry(self.node, name, i) for i, name in enumerate(self.node.entries)]
+
+    def GetEntryByName(self, name):
+        if name not in self.node.entries:
+            return None
+        return EnumEntry(self.node, name, self.node.entries.index(name))
+
+    def GetIntValue(self):
+        return self.node.value
+
+    def SetIntValue(self, value):
+        self.SetValue(value)
+
+    def ToString(self):
+        return self.node.entries[self.node.value]
+
+
+def IsAvailable(obj) -> bool:
+    return obj is not None and getattr(obj, "node", obj) is not None
+
+def IsReadable(obj) -> bool:
+    return IsAvailable(obj) and obj.access in (RO, RW)
+
+def IsWritable(obj) -> bool:
+    return IsAvailable(obj) and obj.access in (WO, RW)
+
+
+class NodeMap:
+
+    def __init__(self, nodes):
+        self.nodes = {node.name: node for node in nodes}
+
+    def GetNode(self, name):
+        return self.nodes.get(name)
+
+    def GetNodes(self):
+        return list(self.nodes.values())
+
+
+class ChunkData:
+    """ Chunk data, which is only valid until its image is released. """
+
+    def __init__(self, image):
+        self.image = image
+
+    def _check(self):
+        if self.image.released:
+            raise RuntimeError("Chunk data of a released image")
+
+    def GetTimestamp(self):
+        self._check()
+        return self.image.timestamp
+
+    def GetFrameID(self):
+        self._check()
+        return self.image.frame_id
+
+    def GetExposureTime(self):
+        self._check()
+        return 1000.
+
+    def GetGain(self):
+        raise SpinnakerException("Chunk Gain is not enabled")
+
+
+class ImagePtr:
+
+    def __init__(self, array, timestamp, incomplete=False, frame_id=0):
+        self.array = array
+        self.timestamp = timestamp
+        self.frame_id = frame_id
+        self.incomplete = incomplete
+        self.released = False
+
+    def IsIncomplete(self):
+        return self.incomplete
+
+    def GetNDArray(self):
+        if self.released:
+            raise RuntimeError("Image has been released")
+        return self.array
+
+    def GetTimeStamp(self):
+        return self.timestamp
+
+    def GetChunkData(self):
+        return ChunkData(self)
+
+    def Release(self):
+        if self.released:
+            raise RuntimeError("Image was released twice")
+        self.released = True
+
+
+class Camera:
+    """
+    A fake camera.
+
+    Parameters
+    ----------
+    stream_nodes : bool
+        Whether the stream node map has the buffer handling nodes (older
+        cameras and drivers do not).
+    fps : float
+        Frame rate used for the image timestamps.
+    """
+
+    def __init__(self, stream_nodes: bool = True, fps: float = 100.):
+        self.fps = fps
+        self.initialized = False
+        self.streaming = False
+        self.frame_number = 0
+        self.images = []
+        self.node_map = NodeMap([
+            Node("Width", value=FRAME_SHAPE[1], access=RO),
+            Node("Height", value=FRAME_SHAPE[0], access=RO),
+            Node("DeviceSerialNumber", intfIString, "12345678", access=RO),
+            Node("DeviceModelName", intfIString, "Fake", access=RO),
+            Node("AcquisitionMode", intfIEnumeration, 0, ["Continuous", "SingleFrame"]),
+            Node("ExposureTime", intfIFloat, 1000., minimum=10., maximum=1e6),
+            Node("AcquisitionStart", intfICommand),
+            ])
+        nodes = [
+            Node("StreamBufferCountMode", intfIEnumeration, 0, ["Auto", "Manual"]),
+            Node("StreamTotalBufferCount", value=10, access=RO),
+            Node("StreamDroppedFrameCount", value=0, access=RO),
+            ]
+        if stream_nodes:
+            nodes += [
+                Node("StreamBufferHandlingMode", intfIEnumeration, 2,
+                     ["OldestFirst", "OldestFirstOverwrite", "NewestOnly", "NewestFirst"]),
+                Node("StreamBufferCountManual", value=3, minimum=1, maximum=50),
+                ]
+        self.stream_node_map = NodeMap(nodes)
+
+    @property
+    def unreleased(self) -> int:
+        """ Number of images that have not been released. """
+        return sum(not image.released for image in self.images)
+
+    def IsValid(self):
+        return True
+
+    def Init(self):
+        self.initialized = True
+
+    def DeInit(self):
+        self.initialized = False
+
+    def GetNodeMap(self):
+        return self.node_map
+
+    def GetTLStreamNodeMap(self):
+        return self.stream_node_map
+
+    def IsStreaming(self):
+        return self.streaming
+
+    def BeginAcquisition(self):
+        self.streaming = True
+
+    def EndAcquisition(self):
+        self.streaming = False
+
+    def GetNextImage(self, timeout=EVENT_TIMEOUT_INFINITE):
+        if not self.streaming:
+            raise RuntimeError("Camera is not streaming")
+        self.frame_number += 1
+        n = self.frame_number
+        image = ImagePtr(np.full(FRAME_SHAPE, n, dtype=np.uint8),
+                         timestamp=int(n / self.fps * 1e9),
+                         incomplete=(n % INCOMPLETE_EVERY == 0),
+                         frame_id=n)
+        self.images.append(image)
+        return image
+
+
+CameraPtr = Camera
+
+# Cameras that are found by System.GetCameras()
+CAMERAS = [Camera()]
+
+# Cameras found by the last search and the number of searches
+DETECTED = []
+SEARCHES = 0
+
+
+class _NullCamera:
+    """ Returned for cameras that are not in a CameraList. """
+
+    def IsValid(self):
+        return False
+
+
+class CameraList:
+
+    def __init__(self, cameras):
+        self.cameras = list(cameras)
+
+    def GetSize(self):
+        return len(self.cameras)
+
+    def GetByIndex(self, index):
+        if not 0 <= index < len(self.cameras):
+            raise SpinnakerException(f"Camera index {index} is out of range")
+        return self.cameras[index]
+
+    def GetBySerial(self, serial):
+        for camera in self.cameras:
+            if camera.node_map.GetNode("DeviceSerialNumber").value == serial:
+                return camera
+        return _NullCamera()
+
+    def Clear(self):
+        self.cameras = []
+
+
+class System:
+
+    @staticmethod
+    def GetInstance():
+        return System()
+
+    def GetCameras(self, updateInterfaces=True, updateCameras=True):
+        global SEARCHES
+        if updateCameras:
+            SEARCHES += 1
+            DETECTED[:] = CAMERAS
+        return CameraList(DETECTED)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+A fake vimba (Vimba Python API) module for testing GigECamera without a camera.
+
+Only the parts of the API that frheed uses are implemented. While streaming,
+a camera thread calls the frame handler every FRAME_PERIOD seconds until
+NUM_FRAMES frame IDs have been used. Every SKIP_EVERY-th frame ID is lost by
+the "camera" (never delivered), every INCOMPLETE_EVERY-th frame is incomplete,
+and every pixel of a frame is its frame ID. Timestamps are in ticks of
+TICK_FREQUENCY.
+
+Tests change the module constants before opening the camera.
+"""
+
+import enum
+import threading
+import time
+
+import numpy as np
+
+from . import c_binding, error, frame
+
+
+# Time (s) between frames while streaming
+FRAME_PERIOD = 0.002
+
+# Number of frame IDs used per stream (None streams until stopped)
+NUM_FRAMES = None
+
+# Every n-th frame ID is dropped or incomplete (0 never)
+SKIP_EVERY = 0
+INCOMPLETE_EVERY = 0
+
+# Camera timestamp clock frequency (Hz)
+TICK_FREQUENCY = 1e8
+
+# Frame shape (height, width)
+FRAME_SHAPE = (48, 64)
+
+
+class FrameStatus(enum.IntEnum):
+    Complete = 0
+    Incomplete = -1
+    TooSmall = -2
+    Invalid = -3
+
+
+class Frame:
+
+    def __init__(self, frame_id: int, timestamp: int, status: FrameStatus, array: np.ndarray):
+        self._id = frame_id
+        self._timestamp = timestamp
+        self._status = status
+        self._array = array
+
+    def get_id(self) -> int:
+        return self._id
+
+    def get_timestamp(self) -> int:
+        return self._timestamp
+
+    def get_status(self) -> FrameStatus:
+        return self._status
+
+    def as_numpy_ndarray(self) -> np.ndarray:
+        return self._array
+
+
+class _Feature:
+
+    def __init__(self, name: str, value):
+        self.name = name
+        self.value = value
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get(self):
+        return self.value
+
+
+class Camera:
+    """
+    A fake camera.
+
+    Attributes
+    ----------
+    sent : list
+        Frames passed to the frame handler.
+    queued : int
+        Number of frames given back with queue_frame().
+    """
+
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.pixel_format = frame.PixelFormat.Mono8
+        self.sent = []
+        self.queued = 0
+        self.Width = _Feature("Width", FRAME_SHAPE[1])
+        self.Height = _Feature("Height", FRAME_SHAPE[0])
+        self.GevTimestampTickFrequency = _Feature("GevTimestampTickFrequency", TICK_FREQUENCY)
+        self._streaming = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "Camera":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def get_id(self) -> str:
+        return self.camera_id
+
+    def get_all_features(self) -> list:
+        return [self.Width, self.Height, self.GevTimestampTickFrequency]
+
+    def set_pixel_format(self, pixel_format) -> None:
+        self.pixel_format = pixel_format
+
+    def is_streaming(self) -> bool:
+        return self._streaming
+
+    def start_streaming(self, handler, buffer_count: int = 5) -> None:
+        if self._streaming:
+            raise RuntimeError("Camera is already streaming")
+        self._streaming = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._stream, args=(handler,), daemon=True)
+        self._thread.start()
+
+    def stop_streaming(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._streaming = False
+
+    def wait_until_done(self, timeout: float = 10.) -> None:
+        """ Wait until the camera has used NUM_FRAMES frame IDs (test helper). """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("The camera is still streaming")
+
+    def queue_frame(self, frame: Frame) -> None:
+        self.queued += 1
+
+    def get_frame(self) -> Frame:
+        return self._make_frame(len(self.sent) + 1)
+
+    def _make_frame(self, frame_id: int) -> Frame:
+        dtype = np.uint8 if self.pixel_format == frame.PixelFormat.Mono8 else np.uint16
+        array = np.full((*FRAME_SHAPE, 1), frame_id % np.iinfo(dtype).max, dtype=dtype)
+        status = (FrameStatus.Incomplete if INCOMPLETE_EVERY and frame_id % INCOMPLETE_EVERY == 0
+                  else FrameStatus.Complete)
+        return Frame(frame_id, int(frame_id * FRAME_PERIOD * TICK_FREQUENCY), status, array)
+
+    def _stream(self, handler) -> None:
+        frame_id = 0
+        while not self._stop.is_set() and (NUM_FRAMES is None or frame_id < NUM_FRAMES):
+            frame_id += 1
+            if SKIP_EVERY and frame_id % SKIP_EVERY == 0:
+                continue
+            new_frame = self._make_frame(frame_id)
+            self.sent.append(new_frame)
+            handler(self, new_frame)
+            time.sleep(FRAME_PERIOD)
+
+
+class Vimba:
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls) -> "Vimba":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __enter__(self) -> "Vimba":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def get_all_cameras(self) -> list:
+        return [Camera("DEV_000F31000001")]
+
+    def get_camera_by_id(self, camera_id: str) -> Camera:
+        return Camera(camera_id)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+""" Fake vimba.c_binding (the C API is not used by the tests). """
+
+VmbCameraInfo = call_vimba_c = byref = sizeof = None
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+""" Fake vimba.error. """
+
+
+class VimbaFeatureError(Exception):
+    pass
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+""" Fake vimba.frame. """
+
+import enum
+
+
+class PixelFormat(enum.Enum):
+    Mono8 = "Mono8"
+    Mono12 = "Mono12"
+    Mono16 = "Mono16"
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the headless benchmark suite.
+"""
+
+from frheed import bench
+
+
+def _run(**kwargs) -> dict:
+    return bench.run(resolutions=((64, 48),), lengths=(100,), min_time=0., verbose=False, **kwargs)
+
+
+def test_results_have_unique_keys():
+    results = _run()
+    keys = [r["key"] for r in results["results"]]
+    assert len(keys) == len(set(keys))
+    assert "calc_fft/100" in keys
+    assert all(r["runs"] >= bench.MIN_RUNS for r in results["results"])
+
+
+def test_normalize_is_only_timed_on_deep_frames():
+    results = _run(select="normalize")
+    keys = {r["key"] for r in results["results"]}
+    assert keys == {"normalize/64x48/12", "normalize_percentiles/64x48/8",
+                    "normalize_percentiles/64x48/12"}
+
+
+def test_compare_reports_regressions():
+    baseline = {"results": [{"key": "a", "median_ms": 1.}, {"key": "b", "median_ms": 1.}]}
+    results = {"results": [{"key": "a", "median_ms": 1.1}, {"key": "b", "median_ms": 2.},
+                           {"key": "c", "median_ms": 5.}]}
+    regressions = bench.compare(results, baseline, tolerance=0.2)
+    assert [r["key"] for r in regressions] == ["b"]
+    assert regressions[0]["ratio"] == 2.
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the line scan buffer and of the frame ring that the camera, 
+display and analysis share.
+"""
+
+import numpy as np
+
+from frheed.buffers import FrameRing, LatestFrameBuffer, LineScanBuffer, SharedFrameRing
+from frheed.image_processing import column_to_image, extend_image
+
+
+def test_line_scan_grows_by_doubling():
+    buf = LineScanBuffer(dtype=np.uint8, capacity=4)
+    columns = [np.full(3, i, dtype=np.uint8) for i in range(10)]
+    views, restarted = [], []
+    for column in columns:
+        restarted.append(buf.append(column))
+        views.append(buf.image)
+
+    # Only the first column starts the image
+    assert restarted == [True] + [False] * 9
+    assert buf.width == len(buf) == 10
+    assert buf.capacity == 16
+    assert buf.image.shape == (3, 10)
+
+    # Views handed out before the buffer grew are not modified
+    assert all(view.shape == (3, i + 1) for i, view in enumerate(views))
+    assert np.array_equal(views[3], buf.image[:, :4])
+
+
+def test_line_scan_matches_extend_image():
+    rng = np.random.default_rng(0)
+    columns = rng.integers(0, 256, (50, 8), dtype=np.uint8)
+    buf = LineScanBuffer(capacity=1)
+    image = column_to_image(columns[0])
+    buf.append(columns[0])
+    for column in columns[1:]:
+        buf.append(column)
+        image = extend_image(image, column)
+    assert np.array_equal(buf.image, image)
+    assert np.array_equal(buf.columns, columns)
+    assert np.array_equal(buf.last_column, columns[-1])
+
+
+def test_line_scan_trim_keeps_newest_columns():
+    buf = LineScanBuffer()
+    for i in range(10):
+        buf.append([i, i])
+    old = buf.columns
+    buf.trim(3)
+    assert np.array_equal(buf.columns[:, 0], [7, 8, 9])
+    assert np.array_equal(old[:, 0], np.arange(10))
+
+
+def test_line_scan_restarts_when_height_changes(capsys):
+    buf = LineScanBuffer()
+    assert buf.append([1, 2, 3])
+    assert not buf.append([4, 5, 6])
+    assert buf.append([7, 8])
+    assert buf.width == 1 and buf.height == 2
+    assert np.array_equal(buf.last_column, [7, 8])
+    assert capsys.readouterr().out == ""
+
+
+def test_claimed_slot_is_invalidated():
+    ring = FrameRing(num_slots=2)
+    first = ring.commit(np.zeros((4, 5), np.uint8))
+    second = ring.commit(np.ones((4, 5), np.uint8))
+    assert ring.is_valid(first) and ring.is_valid(second)
+
+    # The slot of the oldest frame is about to be overwritten
+    slot = ring.claim()
+    assert not ring.is_valid(first)
+    assert ring.get(first) is None
+    assert ring.is_valid(second)
+
+    # The new frame is only readable once it has been committed
+    slot[...] = 2
+    third = ring.commit(slot)
+    assert ring.is_valid(third)
+    assert np.all(ring.get(third) == 2)
+
+
+def test_copied_frame_invalidates_slot():
+    ring = FrameRing(num_slots=2)
+    first = ring.commit(np.zeros((4, 5), np.uint8))
+    view = ring.get(first)
+    ring.commit(np.ones((4, 5), np.uint8))
+    ring.commit(np.full((4, 5), 2, np.uint8))
+
+    # A reader of the overwritten frame can tell that it changed
+    assert np.all(view == 2)
+    assert not ring.is_valid(first)
+
+
+def test_shared_ring_is_read_by_name():
+    producer = SharedFrameRing((4, 5), np.uint16, num_slots=4)
+    consumer = SharedFrameRing((4, 5), np.uint16, num_slots=4, name=producer.name)
+    try:
+        seq = producer.commit(np.full((4, 5), 7, np.uint16), timestamp=1.5)
+        assert consumer.latest == seq
+        assert np.all(consumer.get(seq) == 7)
+        assert consumer.timestamp(seq) == 1.5
+
+        # Claiming the slot in the producer invalidates the frame for the consumer
+        for _ in range(3):
+            producer.commit(np.zeros((4, 5), np.uint16))
+        producer.claim()
+        assert not consumer.is_valid(seq)
+
+        consumer.consumed = 3
+        assert producer.consumed == 3
+    finally:
+        consumer.close()
+        producer.close()
+        producer.unlink()
+
+
+def test_closed_shared_ring_has_no_frames():
+    ring = SharedFrameRing((4, 5), np.uint8, num_slots=2)
+    try:
+        seq = ring.commit(np.ones((4, 5), np.uint8))
+        view = ring.get(seq)
+        ring.close()
+        assert ring.closed
+        assert not ring.is_valid(seq)
+        assert ring.get(seq) is None
+        assert ring.timestamp(seq) is None
+        assert ring.latest == 0
+
+        # Frames that were handed out stay readable
+        assert np.all(view == 1)
+    finally:
+        ring.unlink()
+
+
+def test_latest_frame_buffer_keeps_only_the_newest_frame():
+    latest = LatestFrameBuffer()
+    assert latest.take() is None
+    for seq in (1, 2, 3):
+        latest.put(seq)
+
+    # Frames replaced before they were taken are dropped
+    assert latest.take() == 3
+    assert latest.take() is None
+    latest.put(4)
+    assert latest.take() == 4
+    assert (latest.count, latest.taken, latest.dropped) == (4, 2, 2)
+
+    latest.clear()
+    assert latest.take() is None
+    assert (latest.count, latest.taken, latest.dropped) == (0, 0, 0)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the Qt workers that forward the engine to the camera widget.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from frheed.engine import AcquisitionEngine, Region
+
+
+REGIONS = [Region("all", "rectangle", (0, 0, 4, 3))]
+
+
+@pytest.fixture
+def worker(qapp, fake_drivers):
+    from frheed.widgets.camera_widget import AnalysisWorker
+    parent = SimpleNamespace(engine=AcquisitionEngine(num_slots=8, max_bytes=None))
+    worker = AnalysisWorker(parent)
+    worker.regions = lambda frame_shape: REGIONS
+    worker.start()
+    return worker
+
+
+def test_only_the_newest_data_is_plotted(worker):
+    emitted = []
+    worker.data_ready.connect(emitted.append)
+    for value in (1, 2, 3):
+        worker.analyze_sequence(worker.frames.commit(np.full((4, 5), value, np.uint8)))
+    assert emitted == []
+
+    # The display timer emits the newest data once, with every sample in it
+    worker.emit_latest_data()
+    worker.emit_latest_data()
+    assert len(emitted) == 1
+    assert np.allclose(emitted[0]["all"]["average"], [1, 2, 3])
+    assert worker.latest_data.dropped == 2
+
+
+def test_nothing_is_plotted_while_not_analyzing(worker):
+    emitted = []
+    worker.data_ready.connect(emitted.append)
+    worker.stop()
+    seq = worker.frames.commit(np.full((4, 5), 1, np.uint8))
+    worker.analyze_sequence(seq)
+    worker.emit_latest_data()
+    assert emitted == []
+    assert worker.last_sequence == seq
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of mapping the shapes drawn on the canvas to the raw camera frame.
+"""
+
+import numpy as np
+import pytest
+
+from frheed.engine.analysis import FrameAnalyzer
+
+
+# (height, width) of the raw frame, twice the size of the canvas
+FRAME_SHAPE = (100, 200)
+
+
+@pytest.fixture
+def canvas(qapp):
+    from frheed.widgets.canvas_widget import CanvasWidget
+    canvas = CanvasWidget()
+    canvas.resize(100, 50)
+    return canvas
+
+
+def _add(shape, canvas, color: str):
+    shape.canvas = canvas
+    shape.color = color
+    return shape
+
+
+def test_shapes_cover_every_frame_pixel_under_them(canvas):
+    from frheed.widgets.canvas_widget import CanvasShape
+    shape = _add(CanvasShape(10, 10, 10, 10), canvas, "blue")
+    assert shape.getCoords() == (10, 10, 19, 19)
+    assert shape.sensor_coords(FRAME_SHAPE) == (20, 20, 39, 39)
+    assert shape.region(FRAME_SHAPE).mask(FRAME_SHAPE).count == 4 * 10 * 10
+
+    # The same shape on a larger canvas (e.g. zoomed in) covers the same pixels
+    canvas.resize(200, 100)
+    assert shape.sensor_coords(FRAME_SHAPE) == (10, 10, 19, 19)
+
+
+def test_line_endpoints_are_mapped_from_pixel_centers(canvas):
+    from frheed.widgets.canvas_widget import CanvasLine
+    line = _add(CanvasLine(0, 0, 99, 49), canvas, "red")
+    assert line.sensor_coords(FRAME_SHAPE) == (1, 1, 199, 99)
+
+    # Line profiles have one sample per frame pixel along the line
+    region = line.region(FRAME_SHAPE)
+    assert region.kind == "line"
+    assert region.mask(FRAME_SHAPE).count == 199
+
+
+def test_raw_frames_are_analyzed_at_full_resolution(canvas):
+    from frheed.widgets.canvas_widget import CanvasShape
+    shape = _add(CanvasShape(10, 10, 10, 10), canvas, "blue")
+    frame = np.random.default_rng(0).integers(0, 4096, FRAME_SHAPE, dtype=np.uint16)
+    region = shape.region(FRAME_SHAPE)
+
+    results = FrameAnalyzer().measure(frame, [region])
+    assert results[region.name]["average"] == frame[20:40, 20:40].mean()
+
+    # Color frames are converted to grayscale before they are analyzed
+    gray = (frame >> 4).astype(np.uint8)
+    color = np.repeat(gray[..., None], 3, axis=2)
+    results = FrameAnalyzer().measure(color, [region])
+    assert results[region.name]["average"] == gray[20:40, 20:40].mean()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of CameraDiscovery with stand-in camera backends.
+"""
+
+import threading
+import time
+
+from frheed.cameras import CameraDiscovery, CameraInfo, CameraObject
+
+
+class _Backend(CameraObject):
+    """
+    Stand-in camera backend that counts how often it is probed, and answers
+    after a delay or once it is released.
+    """
+    cameras = {0: "Camera 0"}
+    delay = 0.
+    release = None
+    probes = 0
+
+    def __init__(self, src):
+        super().__init__()
+        self.src = src
+
+    @classmethod
+    def get_available_cameras(cls) -> dict:
+        cls.probes += 1
+        cameras = dict(cls.cameras)
+        if cls.release is not None:
+            cls.release.wait(5)
+        time.sleep(cls.delay)
+        return cameras
+
+
+def _backend(name: str, **attrs) -> type:
+    return type(name, (_Backend,), {"probes": 0, **attrs})
+
+
+class _Broken(_Backend):
+    @classmethod
+    def get_available_cameras(cls) -> dict:
+        raise RuntimeError("driver not installed")
+
+
+def _discovery(monkeypatch, backends, **kwargs) -> CameraDiscovery:
+    # Only probe the stand-in backends, not every imported CameraObject
+    monkeypatch.setattr(CameraDiscovery, "backends", property(lambda self: list(backends)))
+    return CameraDiscovery(**kwargs)
+
+
+def test_cameras_are_listed_in_backend_order(monkeypatch):
+    first = _backend("First", cameras={0: "A", 1: "B"})
+    second = _backend("Second", cameras={"x": "C"})
+    discovery = _discovery(monkeypatch, [first, second])
+    cameras = discovery.discover()
+    assert cameras == [CameraInfo(first, 0, "A"), CameraInfo(first, 1, "B"),
+                       CameraInfo(second, "x", "C")]
+
+    # Cameras are only opened when they are used
+    camera = cameras[2].open()
+    assert isinstance(camera, second) and camera.src == "x"
+
+
+def test_backends_are_probed_concurrently(monkeypatch):
+    backends = [_backend(f"Slow{i}", delay=0.3) for i in range(4)]
+    discovery = _discovery(monkeypatch, backends)
+    t0 = time.monotonic()
+    assert len(discovery.discover()) == 4
+    assert time.monotonic() - t0 < 0.3 * 3
+
+
+def test_results_are_cached_until_they_expire(monkeypatch):
+    backend = _backend("Cached")
+    discovery = _discovery(monkeypatch, [backend], ttl=0.2)
+    cameras = discovery.discover()
+    assert discovery.discover() == cameras and backend.probes == 1
+    assert not discovery.expired
+
+    time.sleep(0.25)
+    assert discovery.expired
+    assert discovery.discover() == cameras and backend.probes == 2
+
+
+def test_invalidate_and_refresh_probe_again(monkeypatch):
+    backend = _backend("Changing")
+    discovery = _discovery(monkeypatch, [backend])
+    assert [info.name for info in discovery.discover()] == ["Camera 0"]
+
+    backend.cameras = {0: "Camera 0", 1: "Camera 1"}
+    assert len(discovery.discover()) == 1
+    assert len(discovery.discover(refresh=True)) == 2 and backend.probes == 2
+
+    backend.cameras = {}
+    discovery.invalidate()
+    assert discovery.expired
+    assert discovery.discover() == [] and backend.probes == 3
+
+
+def test_broken_backends_are_skipped(monkeypatch):
+    working = _backend("Working")
+    discovery = _discovery(monkeypatch, [_Broken, working])
+    assert discovery.discover() == [CameraInfo(working, 0, "Camera 0")]
+
+
+def test_late_backends_are_added_when_they_answer(monkeypatch):
+    late = _backend("Late", cameras={"late": "Late camera"}, release=threading.Event())
+    fast = _backend("Fast")
+    discovery = _discovery(monkeypatch, [late, fast], timeout=0.1)
+
+    # The discovery does not wait for the late backend
+    t0 = time.monotonic()
+    assert discovery.discover() == [CameraInfo(fast, 0, "Camera 0")]
+    assert time.monotonic() - t0 < 1
+
+    # Its cameras are cached once it answers
+    late.release.set()
+    deadline = time.monotonic() + 5
+    while len(discovery.cameras) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert discovery.cameras == [CameraInfo(late, "late", "Late camera"),
+                                 CameraInfo(fast, 0, "Camera 0")]
+    assert discovery.discover() == discovery.cameras
+
+
+def test_late_answers_of_replaced_discoveries_are_ignored(monkeypatch):
+    late = _backend("Late", cameras={"old": "Old camera"}, release=threading.Event())
+    discovery = _discovery(monkeypatch, [late], timeout=0.05)
+    assert discovery.discover() == []
+
+    # A refresh replaces the pending discovery, so only the new answer is stored
+    late.cameras = {"new": "New camera"}
+    assert discovery.discover(refresh=True) == []
+    late.release.set()
+    deadline = time.monotonic() + 5
+    while not discovery.cameras and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    assert discovery.cameras == [CameraInfo(late, "new", "New camera")]
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the headless acquisition and analysis engine.
+"""
+
+import numpy as np
+import pytest
+
+from frheed.engine import AcquisitionEngine, Region
+
+
+REGIONS = [Region("all", "rectangle", (0, 0, 4, 3))]
+
+
+def _engine(num_slots: int = 4) -> AcquisitionEngine:
+    return AcquisitionEngine(regions=REGIONS, num_slots=num_slots, max_bytes=None)
+
+
+def test_frame_overwritten_during_analysis_is_not_stored():
+    engine = _engine()
+    seq = engine.frames.commit(np.full((4, 5), 1, np.uint8))
+    measure = engine.analyzer.measure
+
+    # The camera overwrites the frame while it is being analyzed
+    def overwritten(frame, regions):
+        results = measure(frame, regions)
+        for _ in range(engine.frames.num_slots):
+            engine.frames.commit(np.full((4, 5), 2, np.uint8))
+        return results
+
+    engine.analyzer.measure = overwritten
+    assert engine.analyze_sequence(seq) is None
+    assert engine.frames_analyzed == 0
+    assert engine.frames_missed == 1
+    assert len(engine.data) == 0
+
+
+def test_analyzed_frames_are_stored():
+    engine = _engine(num_slots=8)
+    for value in (1, 2, 3):
+        engine.frames.commit(np.full((4, 5), value, np.uint8), timestamp=float(value))
+    assert engine.analyze_pending() == 3
+    assert engine.counters == {"acquired": 0, "analyzed": 3, "missed": 0}
+    assert np.allclose(engine.data.get("all"), [1, 2, 3])
+
+
+def test_live_analysis_skips_frames_about_to_be_overwritten():
+    engine = _engine(num_slots=8)
+    for value in range(20):
+        engine.frames.commit(np.full((4, 5), value, np.uint8))
+
+    # Only the newer half of the ring is analyzed
+    assert engine.oldest_safe == 20 - 8 // 2 + 1
+    engine.analyze_pending()
+    assert engine.frames_analyzed == 4
+    assert engine.frames_missed == 16
+    assert np.allclose(engine.data.get("all"), [16, 17, 18, 19])
+    assert len(engine.data.get("all")) == engine.frames_analyzed
+
+
+def test_recordings_are_not_skipped():
+    engine = _engine(num_slots=8)
+    engine.live = False
+    for value in range(8):
+        engine.frames.commit(np.full((4, 5), value, np.uint8))
+    assert engine.oldest_safe == engine.frames.oldest
+    engine.analyze_pending()
+    assert engine.frames_analyzed == 8
+    assert engine.frames_missed == 0
+
+
+def test_extrema_are_stored_on_request():
+    regions = REGIONS + [Region("spot", "ellipse", (1, 0, 3, 2))]
+    engine = AcquisitionEngine(regions=regions, num_slots=4, max_bytes=None, extrema=True)
+    frame = np.arange(20, dtype=np.uint8).reshape(4, 5)
+    engine.frames.commit(frame)
+    engine.analyze_pending()
+
+    data = engine.data.snapshot()
+    for region in regions:
+        pixels = frame[region.mask(frame.shape).to_full()]
+        assert data[region.name]["min"] == [pixels.min()]
+        assert data[region.name]["max"] == [pixels.max()]
+        assert data[region.name]["sum"] == [pixels.sum()]
+
+
+def test_extrema_are_not_stored_by_default():
+    engine = _engine()
+    engine.frames.commit(np.full((4, 5), 1, np.uint8))
+    engine.analyze_pending()
+    assert set(engine.data.snapshot()["all"]) == {"time", "average", "sum", "y", "image", "kind"}
+
+
+def test_samples_are_timed_by_the_camera_clock():
+    engine = _engine(num_slots=8)
+    for timestamp in (100., 100.5, 102.):
+        engine.frames.commit(np.full((4, 5), 1, np.uint8), timestamp=timestamp)
+
+    # The frames are analyzed at once, but keep the times they were taken
+    engine.analyze_pending()
+    assert np.allclose(engine.data.time, [0., 0.5, 2.])
+    offset = engine.analyzer.clock_offset
+    assert engine.analyzer.frame_time(103.) == 103. + offset
+
+    # A restarted camera clock is mapped to the time of its first frame
+    engine.analyzer.reset_clock()
+    engine.frames.commit(np.full((4, 5), 1, np.uint8), timestamp=1.)
+    engine.analyze_pending()
+    assert engine.analyzer.clock_offset == pytest.approx(offset + 100. - 1., abs=1.)
+    assert len(engine.data) == 4
+
+
+def test_frames_without_timestamps_use_the_system_clock(monkeypatch):
+    from frheed.engine import analysis
+    analyzer = analysis.FrameAnalyzer()
+    monkeypatch.setattr(analysis.time, "time", lambda: 50.)
+    analyzer.analyze(np.ones((4, 5), np.uint8), REGIONS)
+    monkeypatch.setattr(analysis.time, "time", lambda: 51.5)
+    analyzer.analyze(np.ones((4, 5), np.uint8), REGIONS)
+    assert analyzer.start_time == 50.
+    assert analyzer.clock_offset is None
+    assert np.allclose(analyzer.data.time, [0., 1.5])
+
+
+def test_recordings_are_replayed_without_skipping_frames():
+    from frheed.cameras.replay import ReplayCamera
+    num_frames = 200
+    frames = np.random.default_rng(0).integers(0, 4096, (num_frames, 48, 64), dtype=np.uint16)
+    engine = AcquisitionEngine(ReplayCamera(frames), [Region("all", "rectangle", (0, 0, 63, 47))],
+                               num_slots=8)
+    engine.run()
+    assert engine.counters == {"acquired": num_frames, "analyzed": num_frames, "missed": 0}
+    assert np.allclose(engine.data.get("all"), frames.mean(axis=(1, 2)))
+
+
+def test_live_frames_are_analyzed_or_missed():
+    from frheed.cameras.simulated import SimulatedCamera
+    camera = SimulatedCamera(width=640, height=480, fps=None, seed=0)
+    regions = [Region("spot", "rectangle", (300, 140, 340, 180)),
+               Region("profile", "line", (320, 0, 320, 479))]
+    engine = AcquisitionEngine(camera, regions, num_slots=4)
+    engine.run(0.5)
+
+    # Frames that were overwritten while being analyzed are not stored
+    counters = engine.counters
+    assert counters["acquired"] > 0
+    assert counters["analyzed"] + counters["missed"] == counters["acquired"]
+    assert len(engine.data.get("spot")) == counters["analyzed"]
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of FlirCamera against the fake PySpin module in tests/fakes.
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def pyspin(fake_drivers):
+    import PySpin
+    PySpin.CAMERAS[:] = [PySpin.Camera()]
+    return PySpin
+
+
+@pytest.fixture
+def flir(pyspin):
+    import frheed.cameras.flir as flir
+    return flir
+
+
+def _stream_value(camera, name: str):
+    node = camera.GetTLStreamNodeMap().GetNode(name)
+    return node.entries[node.value] if node.entries else node.value
+
+
+def test_stream_buffers_are_configured(pyspin, flir):
+    with flir.FlirCamera(buffer_handling_mode="OldestFirst", buffer_count=10) as cam:
+        assert cam.initialized
+    camera = pyspin.CAMERAS[0]
+    assert _stream_value(camera, "StreamBufferHandlingMode") == "OldestFirst"
+    assert _stream_value(camera, "StreamBufferCountMode") == "Manual"
+    assert _stream_value(camera, "StreamBufferCountManual") == 10
+
+
+def test_buffer_count_is_clamped(pyspin, flir):
+    with flir.FlirCamera(buffer_count=1000):
+        pass
+    assert _stream_value(pyspin.CAMERAS[0], "StreamBufferCountManual") == 50
+
+
+def test_missing_stream_nodes_only_warn(pyspin, flir, caplog):
+    pyspin.CAMERAS[:] = [pyspin.Camera(stream_nodes=False)]
+    with caplog.at_level(logging.WARNING, logger="flir"):
+        with flir.FlirCamera(buffer_handling_mode="OldestFirst", buffer_count=10) as cam:
+            assert cam.initialized
+            assert cam.get_array().shape == pyspin.FRAME_SHAPE
+    messages = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert any("handling mode" in m for m in messages)
+    assert any("number of stream buffers" in m for m in messages)
+
+
+def test_unknown_handling_mode_only_warns(pyspin, flir, caplog):
+    with caplog.at_level(logging.WARNING, logger="flir"):
+        with flir.FlirCamera(buffer_handling_mode="Bogus") as cam:
+            assert cam.initialized
+    assert _stream_value(pyspin.CAMERAS[0], "StreamBufferHandlingMode") == "NewestOnly"
+    assert any("Bogus" in r.getMessage() for r in caplog.records)
+
+
+def test_get_array_releases_images(pyspin, flir):
+    with flir.FlirCamera() as cam:
+        frames = [cam.get_array() for _ in range(12)]
+        camera = pyspin.CAMERAS[0]
+        assert camera.unreleased == 0
+
+        # Frames are copied out of the released driver buffers
+        assert [int(f[0, 0]) for f in frames] == list(range(1, 13))
+        assert cam.last_timestamp == pytest.approx(12 / camera.fps)
+        assert cam.incomplete_image_count == 2
+
+
+def test_get_array_writes_into_out(pyspin, flir):
+    with flir.FlirCamera() as cam:
+        out = np.zeros(pyspin.FRAME_SHAPE, np.uint8)
+        assert cam.get_array(out=out) is out
+        assert np.all(out == 1)
+
+        # Arrays that don't fit are not used
+        wrong = np.zeros((2, 2), np.uint8)
+        assert cam.get_array(out=wrong) is not wrong
+    assert pyspin.CAMERAS[0].unreleased == 0
+
+
+def test_chunk_data_is_copied_before_release(pyspin, flir):
+    with flir.FlirCamera() as cam:
+        frame, chunk = cam.get_array(get_chunk=True)
+        camera = pyspin.CAMERAS[0]
+        assert camera.images[-1].released
+
+        # The values can be read after the image is released
+        assert chunk == {"timestamp": int(1 / camera.fps * 1e9), "frame_id": 1,
+                         "exposure_time": 1000., "gain": None}
+        assert int(frame[0, 0]) == 1
+
+
+def test_complete_frames_only_releases_skipped_images(pyspin, flir):
+    with flir.FlirCamera() as cam:
+        frames = [cam.get_array(complete_frames_only=True) for _ in range(5)]
+    assert [int(f[0, 0]) for f in frames] == [1, 2, 3, 4, 6]
+    assert pyspin.CAMERAS[0].unreleased == 0
+
+
+def test_image_is_released_when_copy_fails(pyspin, flir, monkeypatch):
+    with flir.FlirCamera() as cam:
+        def fail(self):
+            raise RuntimeError("Transfer failed")
+
+        monkeypatch.setattr(pyspin.ImagePtr, "GetNDArray", fail)
+        with pytest.raises(RuntimeError):
+            cam.get_array()
+        assert pyspin.CAMERAS[0].images[-1].released
+
+
+def test_camera_is_looked_up_in_the_last_search(pyspin, flir):
+    # The camera discovery searches for cameras, opening one doesn't
+    flir.list_cameras()
+    assert pyspin.SEARCHES == 1
+    with flir.FlirCamera(0) as cam:
+        assert cam.cam is pyspin.CAMERAS[0]
+    with flir.FlirCamera("12345678") as cam:
+        assert cam.cam is pyspin.CAMERAS[0]
+    assert pyspin.SEARCHES == 1
+
+
+def test_cameras_are_searched_if_not_found(pyspin, flir):
+    with flir.FlirCamera(0) as cam:
+        assert cam.initialized
+    assert pyspin.SEARCHES == 1
+
+    with pytest.raises(flir.CameraError):
+        flir.FlirCamera("87654321")
+    with pytest.raises(flir.CameraError):
+        flir.FlirCamera(1)
+    assert pyspin.SEARCHES == 3
+
+
+@pytest.fixture
+def node_calls(pyspin, monkeypatch):
+    """ Count the node lookups and node map walks of the camera node maps. """
+    calls = {"GetNode": [], "GetNodes": 0, "GetEntries": 0}
+    get_node, get_nodes = pyspin.NodeMap.GetNode, pyspin.NodeMap.GetNodes
+    get_entries = pyspin.CEnumerationPtr.GetEntries
+
+    def GetNode(self, name):
+        calls["GetNode"].append(name)
+        return get_node(self, name)
+
+    def GetNodes(self):
+        calls["GetNodes"] += 1
+        return get_nodes(self)
+
+    def GetEntries(self):
+        calls["GetEntries"] += 1
+        return get_entries(self)
+
+    monkeypatch.setattr(pyspin.NodeMap, "GetNode", GetNode)
+    monkeypatch.setattr(pyspin.NodeMap, "GetNodes", GetNodes)
+    monkeypatch.setattr(pyspin.CEnumerationPtr, "GetEntries", GetEntries)
+    return calls
+
+
+def test_nodes_are_resolved_on_first_access(pyspin, flir, node_calls):
+    cache = flir.NodeCache(pyspin.CAMERAS[0].GetNodeMap())
+    assert len(cache) == 0 and node_calls["GetNode"] == []
+
+    # Nodes and names that are not nodes are only looked up once
+    for _ in range(3):
+        assert cache.attributes["ExposureTime"].GetValue() == 1000.
+        assert "Bogus" not in cache.attributes
+    assert node_calls["GetNode"] == ["ExposureTime", "Bogus"]
+
+    # Private names are never looked up
+    assert "_src" not in cache.attributes
+    assert node_calls["GetNode"] == ["ExposureTime", "Bogus"]
+    assert node_calls["GetNodes"] == 0
+
+
+def test_node_views_are_separated_by_kind(pyspin, flir, node_calls):
+    cache = flir.NodeCache(pyspin.CAMERAS[0].GetNodeMap())
+    assert "AcquisitionStart" in cache.methods
+    assert "AcquisitionStart" not in cache.attributes
+    assert "ExposureTime" not in cache.methods
+    assert cache.types["ExposureTime"] == "float"
+    assert cache.types["AcquisitionStart"] == "command"
+    with pytest.raises(KeyError):
+        cache.attributes["AcquisitionStart"]
+
+    # Iterating walks the node map once
+    names = [node.GetName() for node in pyspin.CAMERAS[0].GetNodeMap().GetNodes()]
+    node_calls["GetNodes"] = 0
+    assert list(cache.attributes) == [n for n in names if n != "AcquisitionStart"]
+    assert list(cache.methods) == ["AcquisitionStart"]
+    assert len(cache.types) == len(names)
+    assert node_calls["GetNodes"] == 1
+
+
+def test_node_metadata_is_cached(pyspin, flir, node_calls):
+    with flir.FlirCamera() as cam:
+        info = cam.get_info("AcquisitionMode")
+        assert info["entries"] == ["Continuous", "SingleFrame"]
+        assert info["description"] == "Description of AcquisitionMode"
+        assert info["value"] == 0
+
+        # Volatile values are read again, the metadata is not
+        cam.AcquisitionMode = 1
+        info = cam.get_info("AcquisitionMode")
+        assert info["value"] == 1
+        assert node_calls["GetEntries"] == 1
+
+        # Getting one node does not walk the node map
+        assert cam.get_info("ExposureTime")["max"] == 1e6
+        assert node_calls["GetNodes"] == 0
+
+
+def test_camera_nodes_are_reset_when_closed(pyspin, flir):
+    cam = flir.FlirCamera()
+    cam.init()
+    assert cam.ExposureTime == 1000.
+    assert "ExposureTime" in cam.camera_attributes
+    cam.close()
+    assert "ExposureTime" not in cam.camera_attributes
+    with pytest.raises(AttributeError):
+        cam.ExposureTime
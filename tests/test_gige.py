@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of GigECamera streaming against the fake vimba module in tests/fakes.
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def vimba(fake_drivers, monkeypatch):
+    import vimba
+    monkeypatch.setattr(vimba, "FRAME_PERIOD", 0.001)
+    return vimba
+
+
+@pytest.fixture
+def gige(vimba, monkeypatch):
+    import frheed.cameras.gige as gige
+
+    # Don't wait long for frames after the fake camera has stopped
+    monkeypatch.setattr(gige, "_FRAME_TIMEOUT", 0.2)
+    return gige
+
+
+def _frame_id(array: np.ndarray) -> int:
+    return int(array.flat[0])
+
+
+def test_dropped_and_incomplete_frames_are_counted(vimba, gige, monkeypatch):
+    monkeypatch.setattr(vimba, "NUM_FRAMES", 60)
+    monkeypatch.setattr(vimba, "SKIP_EVERY", 10)
+    monkeypatch.setattr(vimba, "INCOMPLETE_EVERY", 7)
+    with gige.GigECamera("DEV_1") as cam:
+        cam.vim_cam.wait_until_done()
+        sent = cam.vim_cam.sent
+        incomplete = sum(frame.get_status() != vimba.FrameStatus.Complete for frame in sent)
+
+        # Frame IDs that never arrived are dropped, incomplete frames are not,
+        # and complete frames are dropped if they are not read in time
+        lost = sent[-1].get_id() - len(sent)
+        assert lost == 5 and cam.incomplete_image_count == incomplete == 8
+        assert len(cam._pending) == cam.buffer_count - 1
+        assert cam.dropped_frame_count == lost + len(sent) - incomplete - len(cam._pending)
+
+        # Every other buffer is given back to the driver, complete or not
+        assert cam.vim_cam.queued == len(sent) - len(cam._pending)
+
+
+def test_frames_are_read_from_the_driver_buffers(vimba, gige, monkeypatch):
+    monkeypatch.setattr(vimba, "NUM_FRAMES", 30)
+    with gige.GigECamera("DEV_1", pixel_format="Mono16") as cam:
+        cam.vim_cam.wait_until_done()
+
+        # Only the newest frames are kept in their buffers, the older frames
+        # are dropped
+        first = 30 - (cam.buffer_count - 1) + 1
+        queued = cam.vim_cam.queued
+        array = cam.get_array()
+        assert array.dtype == np.uint16
+        assert _frame_id(array) == first
+        assert cam.dropped_frame_count == first - 1
+        assert cam.last_timestamp == pytest.approx(first * vimba.FRAME_PERIOD)
+
+        # The buffer is given back once the frame has been copied out
+        assert cam.vim_cam.queued == queued + 1
+
+        # The remaining frames are returned in order, also into an output array
+        out = np.empty_like(array)
+        for frame_id in range(first + 1, 31):
+            assert cam.get_array(out=out) is out
+            assert _frame_id(out) == frame_id
+        assert cam.dropped_frame_count == first - 1
+
+        # The returned frames are copies that the driver can't overwrite
+        assert _frame_id(array) == first
+        assert cam.vim_cam.queued == len(cam.vim_cam.sent)
+
+        with pytest.raises(gige.CameraError):
+            cam.get_array()
+
+
+def test_every_frame_is_read_or_counted_while_streaming(vimba, gige, monkeypatch):
+    monkeypatch.setattr(vimba, "NUM_FRAMES", 200)
+    monkeypatch.setattr(vimba, "SKIP_EVERY", 10)
+    monkeypatch.setattr(vimba, "INCOMPLETE_EVERY", 7)
+    with gige.GigECamera("DEV_1", pixel_format="Mono16") as cam:
+        frame_ids = []
+        while True:
+            try:
+                frame_ids.append(_frame_id(cam.get_array()))
+            except gige.CameraError:
+                break
+        last_id = cam.vim_cam.sent[-1].get_id()
+
+        assert frame_ids == sorted(set(frame_ids))
+        assert len(frame_ids) + cam.dropped_frame_count + cam.incomplete_image_count == last_id
+
+
+def test_real_fps_uses_camera_timestamps(vimba, gige, monkeypatch):
+    monkeypatch.setattr(vimba, "NUM_FRAMES", gige._FPS_FRAMES + 10)
+    with gige.GigECamera("DEV_1") as cam:
+        cam.vim_cam.wait_until_done()
+        assert cam.real_fps == pytest.approx(1 / vimba.FRAME_PERIOD)
+
+
+def test_real_fps_needs_two_frames(vimba, gige, monkeypatch):
+    monkeypatch.setattr(vimba, "NUM_FRAMES", 1)
+    with gige.GigECamera("DEV_1") as cam:
+        cam.vim_cam.wait_until_done()
+        assert cam.real_fps == 0.
+
+    monkeypatch.setattr(vimba, "NUM_FRAMES", 2)
+    with gige.GigECamera("DEV_1") as cam:
+        cam.vim_cam.wait_until_done()
+        assert cam.real_fps == pytest.approx(1 / vimba.FRAME_PERIOD)
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the display conversions and the display buffers of FramePresenter.
+"""
+
+import cmapy
+import cv2
+import numpy as np
+import pytest
+from PyQt5.QtGui import QImage
+
+from frheed.image_processing import (
+    FramePresenter, DISPLAY_POOL_TYPES, apply_cmap, apply_window_level,
+    contrast_limits, get_cmap_lut, normalize, ndarray_to_indexed_qimage, resize,
+    resize_interpolation, to_grayscale, window_level_lut,
+    )
+
+
+def _frame(dtype=np.uint8, shape=(48, 64), maxval=255) -> np.ndarray:
+    return np.random.default_rng(0).integers(0, maxval, shape, dtype=dtype, endpoint=True)
+
+
+def test_apply_cmap_matches_cmapy():
+    frame = _frame()
+    out = np.empty(frame.shape + (3,), dtype=np.uint8)
+    expected = cmapy.colorize(frame, "Spectral", rgb_order=True)
+    assert np.array_equal(apply_cmap(frame, "Spectral"), expected)
+    assert apply_cmap(frame, "Spectral", out=out) is out
+    assert np.array_equal(out, expected)
+
+    # Output buffers that don't fit are not used
+    wrong = np.empty(frame.shape, dtype=np.uint8)
+    assert apply_cmap(frame, "Spectral", out=wrong) is not wrong
+
+
+def _float_normalize(arr: np.ndarray) -> np.ndarray:
+    """ Previous float32 path of normalize (truncates to uint8). """
+    arr = arr.astype(np.float32, copy=True)
+    arr *= 255 / arr.max()
+    return arr.astype(np.uint8)
+
+
+@pytest.mark.parametrize("maxval", [4095, 65535, 300])
+def test_integer_normalize_matches_the_float_path(maxval):
+    frame = _frame(np.uint16, maxval=maxval)
+    normed = normalize(frame)
+    assert normed.dtype == np.uint8 and normed.max() == 255
+    assert np.abs(normed.astype(int) - _float_normalize(frame)).max() <= 1
+
+    # Floating point frames still take the float path
+    assert np.array_equal(normalize(frame.astype(np.float32)), _float_normalize(frame))
+
+
+def test_normalize_writes_into_out():
+    frame = _frame(np.uint16, maxval=4095)
+    out = np.empty(frame.shape, dtype=np.uint8)
+    assert normalize(frame, out) is out
+    assert np.array_equal(out, normalize(frame))
+    assert normalize(frame.astype(np.float32), out) is out
+
+    # Output buffers that don't fit are not used
+    wrong = np.empty((2, 2), dtype=np.uint8)
+    assert normalize(frame, wrong) is not wrong
+
+
+def test_uint8_frames_are_only_normalized_with_percentiles():
+    frame = _frame(maxval=200)
+    assert normalize(frame) is frame
+
+    # The percentiles are stretched to the full range
+    stretched = normalize(frame, percentiles=(1, 99))
+    assert stretched is not frame
+    low, high = contrast_limits(frame, (1, 99))
+    assert stretched[frame <= low].max() == 0 and stretched[frame >= high].min() == 255
+
+
+@pytest.mark.parametrize("dtype", [np.uint16, np.float32])
+def test_percentiles_are_clipped(dtype):
+    frame = _frame(np.uint16, (512, 512), maxval=4095).astype(dtype)
+
+    # A few hot pixels don't change the contrast
+    frame[:4, :4] = 60000
+    normed = normalize(frame, percentiles=(1, 99))
+    low, high = contrast_limits(frame, (1, 99))
+    assert high < 4096
+    assert np.all(normed[frame >= high] == 255)
+    assert np.all(normed[frame <= low] == 0)
+    inside = (frame > low) & (frame < high)
+    expected = (frame[inside].astype(np.float64) - low) * 255 / (high - low)
+    assert np.abs(normed[inside] - expected).max() <= 1
+
+
+def test_contrast_limits_are_close_to_the_full_image():
+    frame = _frame(np.uint16, (1024, 1024), maxval=4095)
+    low, high = contrast_limits(frame, (1, 99))
+    assert isinstance(low, int) and isinstance(high, int)
+    full = np.percentile(frame, (1, 99))
+    assert np.allclose((low, high), full, atol=4095 * 0.01)
+
+    # Small images are sampled more densely, so every pixel is used
+    small = _frame(np.uint16, (64, 64), maxval=4095)
+    assert contrast_limits(small, (0, 100)) == (small.min(), small.max())
+    assert contrast_limits(frame, (0, 100), step=1) == (frame.min(), frame.max())
+
+
+def test_cmap_lookup_tables_are_cached():
+    lut = get_cmap_lut("Spectral")
+    assert get_cmap_lut("Spectral") is lut
+    assert lut.shape == (256, 1, 3)
+
+    # The shared table can't be modified
+    with pytest.raises(ValueError):
+        lut[0] = 0
+
+
+def _rgb888(image: QImage) -> np.ndarray:
+    """ Copy of the pixels of a QImage converted to RGB888. """
+    image = image.convertToFormat(QImage.Format_RGB888)
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    rows = np.frombuffer(bits, np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width() * 3].reshape(image.height(), image.width(), 3).copy()
+
+
+@pytest.mark.parametrize("dtype, maxval", [(np.uint8, 255), (np.uint16, 4095)])
+def test_indexed_images_show_the_colormap(dtype, maxval):
+    frame = _frame(dtype, maxval=maxval)
+    image = ndarray_to_indexed_qimage(frame, "Spectral")
+    assert image.format() == QImage.Format_Indexed8
+    assert image.colorCount() == 256
+
+    # Qt applies the colormap like apply_cmap (deeper frames are normalized)
+    assert np.array_equal(_rgb888(image), apply_cmap(normalize(frame), "Spectral"))
+
+
+@pytest.mark.parametrize("dtype, maxval, low, high", [
+    (np.uint8, 255, 20, 200), (np.uint16, 4095, 100, 3500), (np.uint16, 4095, 0, 4095)])
+def test_window_level_matches_its_lookup_table(dtype, maxval, low, high):
+    frame = _frame(dtype, maxval=maxval)
+    bit_depth = 8 if dtype == np.uint8 else 16
+    lut = window_level_lut(low, high, bit_depth)
+    assert lut.shape == (2 ** bit_depth,) and not lut.flags.writeable
+    assert np.array_equal(apply_window_level(frame, low, high), lut[frame])
+
+    # Values outside the window saturate
+    assert lut[low] == 0 and lut[high] == 255 and lut[-1] == 255
+
+    out = np.empty(frame.shape, dtype=np.uint8)
+    assert apply_window_level(frame, low, high, out) is out
+    assert np.array_equal(out, lut[frame])
+
+
+def test_window_level_defaults_to_the_image_range():
+    frame = _frame(np.uint16, maxval=4095)
+    expected = window_level_lut(0, int(frame.max()))[frame]
+    assert np.array_equal(apply_window_level(frame), expected)
+
+
+def test_window_and_colorize_keep_their_buffers():
+    presenter = FramePresenter(pool_size=3)
+    frame = np.arange(48 * 64, dtype=np.uint16).reshape(48, 64)
+
+    # Every frame is windowed (2D) and then colormapped (RGB)
+    windowed, colored = [], []
+    for _ in range(6):
+        gray = presenter.window(frame, 0, 4095)
+        windowed.append(gray)
+        colored.append(presenter.colorize(gray, "gray"))
+
+    # The buffers are only allocated for the first frames and then reused
+    assert len({id(a) for a in windowed}) == len({id(a) for a in colored}) == 3
+    assert all(a is b for a, b in zip(windowed, windowed[3:]))
+    assert all(a is b for a, b in zip(colored, colored[3:]))
+    assert windowed[-1].shape == (48, 64) and colored[-1].shape == (48, 64, 3)
+
+
+def test_pools_of_old_shapes_are_dropped():
+    presenter = FramePresenter(pool_size=2)
+    first = presenter.buffer((10, 10))
+    for size in range(11, 11 + DISPLAY_POOL_TYPES):
+        presenter.buffer((size, size))
+    assert presenter.buffer((10, 10)) is not first
+    assert len(presenter._pools) == DISPLAY_POOL_TYPES
+
+
+def test_contiguous_frames_are_wrapped_without_copying(qapp):
+    presenter = FramePresenter()
+    colored = presenter.colorize(_frame(), "Spectral")
+    image = presenter.to_qimage(colored)
+    assert image.ndarray is colored
+    assert np.array_equal(_rgb888(image), colored)
+
+    # Only Qt's conversion to a QPixmap copies the frame
+    for _ in range(3):
+        presenter.to_qpixmap(colored)
+        presenter.to_qpixmap(_frame(), "Spectral")
+    assert presenter.frames == 6
+    assert presenter.copies_per_frame == 1
+
+
+def test_strided_frames_are_copied_once(qapp):
+    presenter = FramePresenter()
+    colored = apply_cmap(_frame(shape=(48, 128)), "Spectral")[:, ::2]
+    image = presenter.to_qimage(colored)
+    assert image.ndarray is not colored and image.ndarray.flags.c_contiguous
+    assert np.array_equal(_rgb888(image), colored)
+
+    # The copy into a display buffer and Qt's conversion to a QPixmap
+    presenter.reset_counters()
+    presenter.to_qpixmap(colored)
+    assert presenter.copies_per_frame == 2
+
+
+@pytest.mark.parametrize("channels, code", [(3, cv2.COLOR_BGR2GRAY), (4, cv2.COLOR_RGBA2GRAY)])
+def test_to_grayscale_writes_into_out(channels, code):
+    frame = _frame(shape=(48, 64, channels))
+    out = np.empty((48, 64), dtype=np.uint8)
+    assert to_grayscale(frame, out) is out
+    assert np.array_equal(out, cv2.cvtColor(frame, code))
+
+    # Output buffers that don't fit are not used
+    wrong = np.empty((48, 64), dtype=np.uint16)
+    assert to_grayscale(frame, wrong) is not wrong
+
+
+def test_grayscale_frames_are_not_converted():
+    frame = _frame()
+    assert to_grayscale(frame) is frame
+
+    # The channel axis of single-channel frames is dropped without copying
+    single = frame[..., np.newaxis]
+    gray = to_grayscale(single)
+    assert gray.shape == (48, 64) and np.shares_memory(gray, single)
+
+
+def test_resize_interpolation_depends_on_the_scale():
+    assert resize_interpolation((480, 640), (320, 240)) == cv2.INTER_AREA
+    assert resize_interpolation((480, 640), (640, 240)) == cv2.INTER_AREA
+    assert resize_interpolation((480, 640), (960, 720)) == cv2.INTER_LINEAR
+    assert resize_interpolation((480, 640, 3), (640, 480)) == cv2.INTER_LINEAR
+
+
+def test_resize_skips_frames_of_the_right_size():
+    frame = _frame()
+    assert resize(frame, (64, 48)) is frame
+
+    out = np.empty((24, 32), dtype=np.uint8)
+    assert resize(frame, (32, 24), out) is out
+    assert np.array_equal(out, cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA))
+    assert np.array_equal(resize(frame, (128, 96), interpolation=cv2.INTER_NEAREST),
+                          np.repeat(np.repeat(frame, 2, axis=0), 2, axis=1))
+
+
+def test_grayscale_before_resize_matches_the_previous_order():
+    frame = cv2.merge([_frame()] * 3)
+    presenter = FramePresenter()
+    gray = presenter.resize(presenter.grayscale(frame), (32, 24))
+    expected = to_grayscale(cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA))
+    assert np.abs(gray.astype(int) - expected).max() <= 1
+
+
+def test_stage_buffers_are_reused():
+    presenter = FramePresenter()
+    frame = _frame(shape=(48, 64, 3))
+    gray = presenter.grayscale(frame)
+    small = presenter.resize(gray, (32, 24))
+    for _ in range(3):
+        assert presenter.grayscale(frame) is gray
+        assert presenter.resize(gray, (32, 24)) is small
+
+    # Stage buffers are reallocated when the shape changes
+    assert presenter.resize(gray, (16, 12)) is not small
+    assert presenter.resize(gray, (16, 12)).shape == (12, 16)
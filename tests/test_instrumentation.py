@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the pipeline stage timing.
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+from frheed.instrumentation import StageTimer
+
+
+def test_disabled_timer_records_nothing():
+    timer = StageTimer()
+    with timer.span("resize"):
+        pass
+    assert timer.count("resize") == 0 and timer.stages == []
+    assert timer.report() == "Stage timing is disabled"
+
+
+def test_only_the_newest_spans_are_kept():
+    timer = StageTimer(enabled=True, size=8)
+    for i in range(20):
+        timer.record("analysis", float(i), i / 1000)
+    assert timer.count("analysis") == 20
+    assert np.allclose(timer.durations("analysis"), np.arange(12, 20) / 1000)
+
+    stats = timer.stats("analysis")
+    assert stats["count"] == 20
+    assert stats["max"] == pytest.approx(19.)
+    assert stats["p50"] == pytest.approx(15.5)
+
+
+def test_spans_are_timed():
+    timer = StageTimer(enabled=True)
+    for _ in range(3):
+        with timer.span("colormap"):
+            sum(range(1000))
+    durations = timer.durations("colormap")
+    assert durations.size == 3 and np.all(durations > 0)
+    assert np.isnan(timer.stats("missing")["p50"])
+
+
+def test_stages_are_listed_in_pipeline_order():
+    timer = StageTimer(enabled=True)
+    for stage in ("custom", "analysis", "acquisition"):
+        timer.record(stage, 0., 0.001)
+    assert timer.stages == ["acquisition", "analysis", "custom"]
+    assert list(timer.summary()) == timer.stages
+    assert timer.report().splitlines()[1].startswith("acquisition")
+
+    timer.clear()
+    assert timer.stages == [] and timer.count("analysis") == 0
+
+
+def test_spans_are_dumped_in_start_order(tmp_path):
+    timer = StageTimer(enabled=True, size=4)
+    for i in range(6):
+        timer.record("resize", float(i), 0.002)
+    path = tmp_path / "timings.csv"
+    timer.dump(str(path))
+
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["stage", "start", "duration"]
+    assert [float(row[1]) for row in rows[1:5]] == [2., 3., 4., 5.]
+    assert all(float(row[2]) == 2. for row in rows[1:5])
+    assert rows[6] == ["stage", "count", "p50", "p95", "max"]
+    assert rows[7][:2] == ["resize", "6"]
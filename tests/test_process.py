@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of acquisition in a separate camera process.
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from frheed.cameras import CameraError
+from frheed.cameras.replay import ReplayCamera
+from frheed.cameras.simulated import SimulatedCamera
+from frheed.engine import AcquisitionEngine, CameraProcess, Region
+
+
+def test_recordings_replayed_from_a_process_are_not_skipped():
+    num_frames = 300
+    frames = np.random.default_rng(0).integers(0, 4096, (num_frames, 48, 64), dtype=np.uint16)
+    engine = AcquisitionEngine(CameraProcess(ReplayCamera, frames, num_slots=8),
+                               [Region("all", "rectangle", (0, 0, 63, 47))])
+    engine.run()
+    assert engine.counters == {"acquired": num_frames, "analyzed": num_frames, "missed": 0}
+    assert np.allclose(engine.data.get("all"), frames.mean(axis=(1, 2)))
+
+
+def test_live_frames_from_a_process_are_analyzed_or_missed():
+    camera = CameraProcess(SimulatedCamera, width=640, height=480, fps=None, seed=0)
+    engine = AcquisitionEngine(camera, [Region("spot", "rectangle", (300, 140, 340, 180))])
+    engine.start()
+    deadline = time.monotonic() + 30
+    while engine.counters["acquired"] < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    engine.stop()
+
+    counters = engine.counters
+    assert counters["acquired"] >= 50
+    assert counters["analyzed"] + counters["missed"] == counters["acquired"]
+    assert len(engine.data.get("spot")) == counters["analyzed"]
+
+
+def test_cameras_that_fail_to_open_raise():
+    camera = CameraProcess(ReplayCamera, "missing.npy")
+    with pytest.raises(CameraError, match="does not exist"):
+        camera.open()
+    assert not camera.running
+
+
+def test_only_received_frames_are_analyzed():
+    from frheed.buffers import SharedFrameRing
+    engine = AcquisitionEngine(regions=[Region("all", "rectangle", (0, 0, 4, 3))], max_bytes=None)
+    ring = SharedFrameRing((4, 5), np.uint8, num_slots=4)
+    try:
+        engine._use_frames(ring)
+
+        # The camera process has written frames that have not been received
+        for value in range(1, 11):
+            ring.commit(np.full((4, 5), value, np.uint8))
+        engine._received = 2
+        assert engine.latest_sequence == 2
+        assert engine.analyze_pending() == 0
+        assert engine.last_sequence == 2 and engine.frames_missed == 2
+
+        # Received frames that are still in the ring are analyzed
+        engine._received = 10
+        assert engine.analyze_pending() == 2
+        assert engine.frames_missed == 8
+        assert np.allclose(engine.data.get("all"), [9, 10])
+    finally:
+        engine._use_frames(engine._local_frames)
+        ring.unlink()
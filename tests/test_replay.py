@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of replaying recorded frames with ReplayCamera.
+"""
+
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from frheed.cameras import CameraError
+from frheed.cameras.replay import ReplayCamera, save_recording
+
+
+SHAPE = (48, 64)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """ Path of a saved recording with irregular timestamps, its frames and timestamps. """
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 255, (50, *SHAPE), dtype=np.uint8)
+    timestamps = np.cumsum(rng.uniform(0.009, 0.011, len(frames)))
+    path = str(tmp_path / "recording.npy")
+    save_recording(path, frames, timestamps)
+    return path, frames, timestamps
+
+
+def test_recording_replays_exactly(recording):
+    path, frames, timestamps = recording
+    with ReplayCamera(path) as cam:
+        assert len(cam) == len(frames) and cam.shape == SHAPE[::-1]
+        out = np.empty(SHAPE, dtype=np.uint8)
+        for i in range(len(frames)):
+            assert cam.get_array(out=out) is out
+            assert np.array_equal(out, frames[i])
+            assert cam.last_timestamp == timestamps[i]
+        assert cam.finished
+        with pytest.raises(CameraError):
+            cam.get_array()
+        del cam._frames  # release the memory map before cleanup
+
+
+def test_seek(recording):
+    path, frames, timestamps = recording
+    with ReplayCamera(path) as cam:
+        cam.seek_time(timestamps[10])
+        assert np.array_equal(cam.get_array(), frames[10])
+        cam.seek_time(timestamps[10] + 1e-6)
+        assert cam.position == 11
+        cam.seek(-1)
+        assert np.array_equal(cam.get_array(), frames[-1])
+        assert cam.finished
+        cam.seek(1000)
+        assert cam.finished
+        del cam._frames
+
+
+def test_loop_restarts_the_recording():
+    frames = np.arange(3, dtype=np.uint8).reshape(3, 1, 1) * np.ones((1, *SHAPE), np.uint8)
+    with ReplayCamera(frames, loop=True, fps=10.) as cam:
+        values = [int(cam.get_array()[0, 0]) for _ in range(7)]
+        assert values == [0, 1, 2, 0, 1, 2, 0]
+        assert not cam.finished
+
+        # Recordings without timestamps are timed by the frame rate
+        assert np.allclose(cam.timestamps, [0., 0.1, 0.2])
+
+
+def test_timestamps_must_match_frames(tmp_path):
+    frames = np.zeros((3, *SHAPE), np.uint8)
+    with pytest.raises(ValueError):
+        save_recording(str(tmp_path / "recording.npy"), frames, [0., 1.])
+    with pytest.raises(CameraError):
+        ReplayCamera(frames, timestamps=[0., 1.])
+    with pytest.raises(CameraError):
+        ReplayCamera(str(tmp_path / "missing.npy"))
+
+
+def test_realtime_replay_is_paced(recording):
+    path, frames, timestamps = recording
+    with ReplayCamera(path, realtime=True, speed=5.) as cam:
+        t0 = time.perf_counter()
+        for _ in range(20):
+            cam.get_array()
+        elapsed = time.perf_counter() - t0
+        assert elapsed >= (timestamps[19] - timestamps[0]) / 5 * 0.9
+        del cam._frames
+
+
+def test_video_timestamps_are_read(tmp_path):
+    path = str(tmp_path / "recording.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25., SHAPE[::-1])
+    for i in range(10):
+        writer.write(np.full((*SHAPE, 3), 20 * i, np.uint8))
+    writer.release()
+
+    with ReplayCamera(path) as cam:
+        assert len(cam) == 10
+        frames = [cam.get_array() for _ in range(10)]
+        assert cam.finished
+        assert np.allclose(cam.timestamps, np.arange(10) / 25.)
+        assert [int(np.round(f.mean() / 20)) for f in frames] == list(range(10))
+        cam.close()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the region masks against full-frame masks, and of the region
+statistics: the integral image against the gathered (reduceat) sums that
+RegionAnalyzer chooses between.
+"""
+
+import numpy as np
+import pytest
+
+from frheed.roi import IntegralImage, Region, RegionAnalyzer, get_region_mask
+
+
+SHAPE = (120, 160)
+
+# Frame types with the sums they are integrated with
+DTYPES = [(np.uint8, np.int32), (np.uint16, np.float64),
+          (np.float32, np.float64), (np.float64, np.float64)]
+
+
+def _frame(dtype, shape=SHAPE, seed=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if np.issubdtype(dtype, np.integer):
+        return rng.integers(0, np.iinfo(dtype).max, shape, dtype=dtype, endpoint=True)
+    return (rng.random(shape) * 4096).astype(dtype)
+
+
+def _boxes(shape=SHAPE, seed=0) -> list:
+    """ Random boxes plus boxes at the edges and boxes without pixels. """
+    height, width = shape
+    boxes = [
+        (0, 0, height, width),                  # full frame
+        (0, 0, 1, 1),                           # top left pixel
+        (height - 1, width - 1, height, width), # bottom right pixel
+        (height - 1, 0, height, width),         # last row
+        (0, width - 1, height, width),          # last column
+        (5, 5, 5, 9),                           # no rows
+        (5, 9, 20, 9),                          # no columns
+        (height, width, height, width),         # past the last pixel
+        ]
+    rng = np.random.default_rng(seed)
+    for _ in range(50):
+        r0, c0 = rng.integers(0, height), rng.integers(0, width)
+        boxes.append((r0, c0, rng.integers(r0, height + 1), rng.integers(c0, width + 1)))
+    return boxes
+
+
+def _masks(shape=SHAPE) -> list:
+    """ Large rectangles (clipped at the edges), an ellipse, a line and empty regions. """
+    height, width = shape
+    return [
+        get_region_mask("rectangle", (0, 0, width // 2, height // 2), shape),
+        get_region_mask("rectangle", (width // 3, height // 3, width + 10, height + 10), shape),
+        get_region_mask("rectangle", (-10, height - 5, width // 4, height - 1), shape),
+        get_region_mask("ellipse", (10, 10, 60, 40), shape),
+        get_region_mask("line", (0, height - 1, width - 1, 0), shape),
+        get_region_mask("rectangle", (width, height, width + 5, height + 5), shape),
+        get_region_mask("ellipse", (-20, -20, -10, -10), shape),
+        ]
+
+
+def _full_frame_mask(kind: str, coords: tuple, shape=SHAPE) -> np.ndarray:
+    """ Full-frame masks as previously computed by CanvasShape.mask """
+    height, width = shape
+    x1, y1, x2, y2 = coords
+    if kind == "rectangle":
+        mask = np.full((height, width), False, dtype=bool)
+        mask[max(y1, 0):max(y2 + 1, 0), max(x1, 0):max(x2 + 1, 0)] = True
+    else:
+        h, k = int((x1 + x2) / 2), int((y1 + y2) / 2)
+        a, b = max(abs(x2 - x1) / 2, 1), max(abs(y2 - y1) / 2, 1)
+        Y, X = np.ogrid[:height, :width]
+        mask = ((((X - h)**2 / (a**2)) + ((Y - k)**2 / (b**2))) <= 1)
+    return mask
+
+
+# Region coordinates inside the frame, at its edges and outside of it
+COORDS = [(40, 30, 90, 70), (0, 0, 0, 0), (-10, -5, 20, 15),
+          (150, 100, 170, 130), (200, 200, 220, 220)]
+
+
+@pytest.mark.parametrize("kind", ["rectangle", "ellipse"])
+@pytest.mark.parametrize("coords", COORDS)
+def test_masks_match_full_frame_masks(kind, coords):
+    frame = _frame(np.uint8)
+    expected = _full_frame_mask(kind, coords)
+    mask = get_region_mask(kind, coords, SHAPE)
+    assert np.array_equal(mask.to_full(), expected)
+    assert mask.count == np.count_nonzero(expected)
+    assert np.array_equal(mask.extract(frame), frame[expected])
+    assert mask.sum(frame) == frame[expected].sum()
+
+    # Only the bounding box of the region is touched
+    r0, c0, r1, c1 = mask.bbox
+    assert not expected[:r0].any() and not expected[r1:].any()
+    assert not expected[:, :c0].any() and not expected[:, c1:].any()
+
+
+def test_line_mask_follows_the_line():
+    frame = _frame(np.uint16)
+    mask = get_region_mask("line", (10, 100, 60, 20), SHAPE)
+
+    # One pixel per step along the major axis, in the order of frame[mask]
+    assert mask.count == 100 - 20 + 1
+    assert np.array_equal(mask.extract(frame), frame[mask.to_full()])
+    assert mask.coordinates[0][0] == 20 and mask.coordinates[0][-1] == 100
+
+
+def test_region_masks_are_cached():
+    region = Region("blue", "ellipse", (10.4, 10, 50, 30))
+    assert region.coords == (10, 10, 50, 30)
+    assert region.mask(SHAPE) is region.mask(SHAPE + (3,))
+    assert region.mask(SHAPE) is Region("red", "ellipse", (10, 10, 50, 30)).mask(SHAPE)
+    assert region.mask(SHAPE) is not region.mask((240, 320))
+
+    with pytest.raises(ValueError):
+        Region("blue", "triangle", (0, 0, 1, 1))
+    with pytest.raises(ValueError):
+        get_region_mask("triangle", (0, 0, 1, 1), SHAPE)
+
+
+def _assert_sums_equal(actual, expected, dtype) -> None:
+    # Integer sums are exact in float64, float sums depend on the order
+    if np.issubdtype(dtype, np.integer):
+        assert np.array_equal(actual, expected, equal_nan=True)
+    else:
+        assert np.allclose(actual, expected, rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("dtype, sum_dtype", DTYPES)
+def test_box_sums_match_numpy(dtype, sum_dtype):
+    frame = _frame(dtype)
+    integral = IntegralImage(frame)
+    assert integral.table.dtype == sum_dtype
+    assert integral.frame_shape == SHAPE
+
+    boxes = _boxes()
+    expected = [frame[r0:r1, c0:c1].sum(dtype=np.float64) for r0, c0, r1, c1 in boxes]
+    _assert_sums_equal(integral.box_sums(boxes), expected, dtype)
+    _assert_sums_equal([integral.box_sum(slice(r0, r1), slice(c0, c1))
+                        for r0, c0, r1, c1 in boxes], expected, dtype)
+
+
+def test_large_uint8_frames_do_not_overflow():
+    # The sum of all pixels does not fit in 32 bits
+    frame = np.full((3000, 3000), 255, dtype=np.uint8)
+    integral = IntegralImage(frame)
+    assert integral.table.dtype == np.float64
+    assert integral.box_sums([(0, 0, 3000, 3000)])[0] == 255 * 3000 * 3000
+
+
+@pytest.mark.parametrize("dtype", [dtype for dtype, _ in DTYPES])
+def test_integral_image_matches_reduceat(dtype):
+    frame = _frame(dtype, seed=1)
+    masks = _masks()
+    analyzer = RegionAnalyzer()
+
+    fast = analyzer.analyze(frame, masks, extrema=False)
+    assert analyzer.uses_integral_image
+    exact = analyzer.analyze(frame, masks, extrema=True)
+    assert not analyzer.uses_integral_image
+
+    expected = [frame[mask.to_full()].sum(dtype=np.float64) if mask.count else np.nan
+                for mask in masks]
+    for stats in (fast, exact):
+        _assert_sums_equal(stats["sum"], expected, dtype)
+        _assert_sums_equal(stats["mean"], np.array(expected) / stats["count"], dtype)
+    assert np.array_equal(fast["count"], exact["count"])
+    assert np.all(np.isnan(fast["min"])) and np.all(np.isnan(fast["max"]))
+
+
+def test_regions_without_pixels():
+    frame = _frame(np.uint16)
+    masks = _masks()
+    empty = [mask.count == 0 for mask in masks]
+    assert empty == [False] * 5 + [True] * 2
+
+    analyzer = RegionAnalyzer()
+    for extrema in (False, True):
+        stats = analyzer.analyze(frame, masks, extrema=extrema)
+        assert np.all(stats["count"][empty] == 0)
+        for name in ("sum", "mean", "min", "max"):
+            assert np.all(np.isnan(stats[name][empty]))
+
+    # Only regions without pixels
+    stats = analyzer.analyze(frame, masks[-2:], extrema=False)
+    assert not analyzer.uses_integral_image
+    assert np.all(np.isnan(stats["sum"]))
+
+
+def test_small_rectangles_are_gathered():
+    frame = _frame(np.uint8)
+    masks = [get_region_mask("rectangle", (10, 10, 20, 20), SHAPE)]
+    analyzer = RegionAnalyzer()
+    stats = analyzer.analyze(frame, masks, extrema=False)
+    assert not analyzer.uses_integral_image
+    assert stats["sum"][0] == frame[10:21, 10:21].sum()
+
+
+@pytest.mark.parametrize("dtype", [dtype for dtype, _ in DTYPES])
+def test_region_statistics_match_masked_values(dtype):
+    frame = _frame(dtype, seed=2)
+    masks = _masks()[:5]
+    stats = RegionAnalyzer().analyze(frame, masks, extrema=True)
+    for row, mask in zip(stats, masks):
+        pixels = frame[mask.to_full()]
+        assert row["count"] == pixels.size
+        _assert_sums_equal(row["sum"], pixels.sum(dtype=np.float64), dtype)
+        _assert_sums_equal(row["mean"], pixels.mean(dtype=np.float64), dtype)
+        assert row["min"] == pixels.min()
+        assert row["max"] == pixels.max()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the simulated RHEED camera.
+"""
+
+import numpy as np
+import pytest
+
+from frheed import settings
+from frheed.cameras import CameraError
+from frheed.cameras.simulated import SimulatedCamera
+
+
+@pytest.mark.parametrize("bit_depth, dtype", [(8, np.uint8), (12, np.uint16), (16, np.uint16)])
+def test_frames_have_the_bit_depth(bit_depth, dtype):
+    with SimulatedCamera(width=64, height=48, bit_depth=bit_depth, fps=None, seed=0) as cam:
+        frame = cam.get_array()
+        assert frame.shape == (48, 64) and frame.dtype == dtype
+        assert 0 < frame.max() <= cam.max_value
+
+        # Frames are written into an output array that fits
+        out = np.empty_like(frame)
+        assert cam.get_array(out=out) is out
+        assert cam.get_array(out=np.empty((2, 2), dtype)) is not out
+
+
+def test_unsupported_bit_depth():
+    with pytest.raises(CameraError):
+        SimulatedCamera(bit_depth=9)
+
+
+def test_spot_oscillates_with_the_period():
+    period, fps = 0.1, 1000.
+    with SimulatedCamera(width=160, height=120, fps=fps, period=period, seed=0) as cam:
+        rows, cols = cam._spot_bbox
+        means = [cam.get_array()[rows, cols].mean() for _ in range(int(4 * period * fps))]
+
+        # Frames are timestamped at the frame rate
+        assert cam.last_timestamp == pytest.approx((len(means) - 1) / fps)
+    spectrum = np.abs(np.fft.rfft(means - np.mean(means)))
+    freq = np.fft.rfftfreq(len(means), 1 / fps)[np.argmax(spectrum)]
+    assert freq == pytest.approx(1 / period)
+
+
+def test_only_listed_if_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "SIMULATED_CAMERA", False)
+    assert SimulatedCamera.get_available_cameras() == {}
+    monkeypatch.setattr(settings, "SIMULATED_CAMERA", True)
+    assert SimulatedCamera.get_available_cameras() == {0: "Simulated RHEED camera"}
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the columnar storage of region time series.
+"""
+
+import threading
+
+import numpy as np
+
+from frheed.timeseries import TimeSeriesStore
+
+
+def _sample(i: int) -> dict:
+    return {"blue": {"kind": "rectangle", "average": float(i), "sum": 10. * i},
+            "brown": {"kind": "line", "profile": np.full(4, i, dtype=np.uint8)}}
+
+
+def test_samples_are_stored_in_columns():
+    store = TimeSeriesStore(capacity=2)
+    views = []
+    for i in range(10):
+        store.append(i / 10, _sample(i))
+        views.append(store.get("blue"))
+    assert len(store) == 10
+    assert store.regions == ("blue", "brown")
+    assert np.array_equal(store.time, np.arange(10) / 10)
+    assert np.array_equal(store.get("blue"), np.arange(10))
+    assert np.array_equal(store.get("blue", "sum"), 10. * np.arange(10))
+    assert store.line_scan("brown").shape == (4, 10)
+    assert np.array_equal(store.profiles("brown")[:, 0], np.arange(10))
+
+    # Views handed out before the store grew are not modified
+    assert all(np.array_equal(view, np.arange(i + 1)) for i, view in enumerate(views))
+
+
+def test_regions_start_when_they_appear():
+    store = TimeSeriesStore()
+    store.append(0., {"blue": {"kind": "rectangle", "average": 1.}})
+    store.append(1., {"blue": {"kind": "rectangle", "average": 2.},
+                      "red": {"kind": "ellipse", "average": 3.}})
+    store.append(2., {"blue": {"kind": "rectangle"}})
+    assert store.start("red") == 1
+    t, average = store.series("red")
+    assert np.array_equal(t, [1., 2.])
+    assert np.array_equal(average, [3., np.nan], equal_nan=True)
+    assert np.isnan(store.get("blue", "sum")).all()
+
+
+def test_missing_profiles_repeat_the_previous_one():
+    store = TimeSeriesStore()
+    store.append(0., {"brown": {"kind": "line"}})
+    store.append(1., _sample(1))
+    store.append(2., {"brown": {"kind": "line"}})
+    assert store.start("brown") == 1
+    assert np.array_equal(store.profiles("brown")[:, 0], [1, 1])
+
+
+def test_line_restarts_when_its_length_changes():
+    store = TimeSeriesStore()
+    for i in range(5):
+        store.append(float(i), _sample(i))
+
+    # The line was resized
+    store.append(5., {"brown": {"kind": "line", "profile": np.arange(6, dtype=np.uint8)}})
+    store.append(6., {"brown": {"kind": "line"}})
+    data = store.snapshot()["brown"]
+    assert store.start("brown") == 5
+    assert np.array_equal(data["time"], [5., 6.])
+    assert data["y"].shape == (2, 6)
+    assert data["image"].shape == (6, 2)
+    assert len(data["average"]) == 2
+
+    # Other regions are not affected
+    assert len(store.get("blue")) == 7
+
+
+def test_trim_keeps_newest_samples():
+    store = TimeSeriesStore()
+    for i in range(10):
+        store.append(float(i), _sample(i))
+    old = store.get("blue")
+    store.trim(4)
+    assert np.array_equal(store.time, [6., 7., 8., 9.])
+    assert np.array_equal(store.get("blue"), [6., 7., 8., 9.])
+    assert np.array_equal(store.profiles("brown")[:, 0], [6, 7, 8, 9])
+    assert np.array_equal(old, np.arange(10))
+
+
+def test_memory_cap_discards_oldest_samples():
+    capped = TimeSeriesStore(max_bytes=20_000)
+    store = TimeSeriesStore()
+    for i in range(5000):
+        capped.append(i / 30, _sample(i % 256))
+        store.append(i / 30, _sample(i % 256))
+    assert 0 < len(capped) < len(store)
+    assert len(capped) * capped.row_nbytes <= 20_000
+    assert capped.time[-1] == store.time[-1]
+    assert np.array_equal(capped.get("blue"), store.get("blue")[-len(capped):])
+    assert capped.line_scan("brown").shape == (4, len(capped))
+
+
+def test_pop_returns_the_region_data():
+    store = TimeSeriesStore()
+    store.append(0., _sample(1))
+    data = store.pop("blue")
+    assert np.array_equal(data["average"], [1.])
+    assert "blue" not in store and store.regions == ("brown",)
+    assert store.pop("blue", "missing") == "missing"
+
+
+def test_regions_are_removed_while_appending():
+    store = TimeSeriesStore()
+    names = [f"region {i}" for i in range(50)]
+    errors = []
+
+    def append():
+        try:
+            for i in range(2000):
+                store.append(float(i), {name: {"kind": "rectangle", "average": 1.}
+                                        for name in names})
+        except Exception as ex:
+            errors.append(ex)
+
+    # Remove (and re-add) regions from another thread during acquisition
+    thread = threading.Thread(target=append)
+    thread.start()
+    while thread.is_alive():
+        for name in names:
+            store.pop(name)
+            store.snapshot()
+    thread.join()
+    assert not errors
+    assert len(store) == 2000